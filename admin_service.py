@@ -0,0 +1,133 @@
+"""Queries behind the admin dashboard.
+
+The dashboard renders the first page of each table and the JSON endpoints
+in routes.py serve further pages, newest first, with the same keyset
+cursors as ``/api/products``. Filters (name/email/username search,
+category, order status) are applied in SQL, so the browser only ever holds
+one page.
+
+``get_admin_stats`` computes every headline number in one statement and
+caches it for ``STATS_TIMEOUT`` seconds.
+"""
+from sqlalchemy.orm import contains_eager, load_only
+
+from analytics import total_revenue_query
+from cache import get_cache
+from images import image_url
+from models import db, Order, Product, User
+from pagination import keyset_page
+
+ADMIN_PAGE_SIZE = 25
+STATS_TIMEOUT = 60
+STATS_KEY = 'admin_stats'
+
+
+def admin_stats():
+    """Product, order and user counts plus paid revenue (from the rollups), in one query."""
+    row = db.session.execute(db.select(
+        db.select(db.func.count(Product.id)).scalar_subquery(),
+        db.select(db.func.count(Order.id)).scalar_subquery(),
+        db.select(db.func.count(User.id)).scalar_subquery(),
+        total_revenue_query().scalar_subquery(),
+    )).one()
+    return {
+        'total_products': row[0],
+        'total_orders': row[1],
+        'total_users': row[2],
+        'total_revenue': float(row[3]),
+    }
+
+
+def get_admin_stats():
+    """Cached ``admin_stats``."""
+    cache = get_cache()
+    stats = cache.get(STATS_KEY)
+    if stats is None:
+        stats = admin_stats()
+        cache.set(STATS_KEY, stats, timeout=STATS_TIMEOUT)
+    return stats
+
+
+def invalidate_admin_stats():
+    get_cache().delete(STATS_KEY)
+
+
+def _like(value):
+    escaped = value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    return f'%{escaped}%'
+
+
+# ──────────────── TABLES ────────────────
+
+PRODUCT_COLUMNS = (Product.id, Product.name, Product.category, Product.price,
+                   Product.stock, Product.featured, Product.image, Product.created_at)
+
+
+def product_page(search=None, category=None, limit=ADMIN_PAGE_SIZE, cursor=None):
+    query = Product.query.options(load_only(*PRODUCT_COLUMNS))
+    if category:
+        query = query.filter(Product.category == category)
+    if search:
+        query = query.filter(Product.name.ilike(_like(search), escape='\\'))
+    return keyset_page(query, Product.created_at, Product.id, limit, cursor)
+
+
+def order_page(search=None, status=None, limit=ADMIN_PAGE_SIZE, cursor=None):
+    """Orders with their user loaded by the same query."""
+    query = (
+        Order.query
+        .join(Order.user)
+        .options(contains_eager(Order.user).load_only(User.id, User.username))
+    )
+    if status:
+        query = query.filter(Order.status == status)
+    if search:
+        term = search.lstrip('#')
+        condition = User.username.ilike(_like(search), escape='\\')
+        if term.isdigit():
+            condition = db.or_(condition, Order.id == int(term))
+        query = query.filter(condition)
+    return keyset_page(query, Order.created_at, Order.id, limit, cursor)
+
+
+def user_page(search=None, limit=ADMIN_PAGE_SIZE, cursor=None):
+    query = User.query.options(load_only(User.id, User.username, User.email,
+                                         User.is_admin, User.created_at))
+    if search:
+        pattern = _like(search)
+        query = query.filter(db.or_(User.username.ilike(pattern, escape='\\'),
+                                    User.email.ilike(pattern, escape='\\')))
+    return keyset_page(query, User.created_at, User.id, limit, cursor)
+
+
+def product_row(product):
+    return {
+        'id': product.id,
+        'name': product.name,
+        'category': product.category,
+        'price': product.price,
+        'stock': product.stock,
+        'featured': product.featured,
+        'image': product.image,
+        'thumb_url': image_url(product.image, 'thumb'),
+    }
+
+
+def order_row(order):
+    return {
+        'id': order.id,
+        'username': order.user.username,
+        'total_amount': order.total_amount,
+        'status': order.status,
+        'created_at': order.created_at.isoformat(),
+    }
+
+
+def user_row(user):
+    return {
+        'id': user.id,
+        'username': user.username,
+        'email': user.email,
+        'is_admin': user.is_admin,
+        'created_at': user.created_at.isoformat(),
+    }
@@ -0,0 +1,253 @@
+"""Sales rollups.
+
+Paid sales are pre-aggregated into ``SalesRollup`` rows, one per
+``(period, period_start, dimension, dimension_key)``:
+
+* period ``day`` or ``week`` (weeks start on Monday, UTC);
+* dimension ``total`` (key ``''``), ``category`` (key = category name) or
+  ``product`` (key = product id).
+
+Each row carries revenue, order count and units. The ``order_paid`` job
+(payments.py) adds a paid order to its buckets with an additive upsert, in
+the transaction that completes the job, so dashboards read O(days) rows
+instead of scanning orders. ``backfill``
+rebuilds the rollups from ``Order``/``OrderItem`` in batches of order ids,
+e.g. after importing historical orders:
+
+    flask --app app analytics backfill [--since 2024-01-01] [--batch-size 5000]
+
+Run the backfill while checkout is quiet: orders paid during a backfill of
+the same range can be counted twice.
+"""
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+
+import click
+from flask.cli import AppGroup, with_appcontext
+from sqlalchemy.dialects import postgresql, sqlite
+
+from models import db, Order, OrderItem, Product, SalesRollup
+
+PERIODS = ('day', 'week')
+DIMENSIONS = ('total', 'category', 'product')
+PAID = 'Paid'
+BACKFILL_BATCH = 5000
+
+
+def week_start(day):
+    return day - timedelta(days=day.weekday())
+
+
+def _as_date(value):
+    """``func.date()`` returns a string on SQLite and a date on PostgreSQL."""
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return date.fromisoformat(str(value)[:10])
+
+
+class _Buckets:
+    """Sums keyed by rollup bucket; every day also feeds its week."""
+
+    def __init__(self):
+        self.data = defaultdict(lambda: [0.0, 0, 0])
+
+    def add(self, day, dimension, key, revenue, orders, units):
+        for period, start in (('day', day), ('week', week_start(day))):
+            bucket = self.data[(period, start, dimension, str(key))]
+            bucket[0] += revenue
+            bucket[1] += orders
+            bucket[2] += units
+
+    def rows(self):
+        return [
+            {'period': period, 'period_start': start, 'dimension': dimension,
+             'dimension_key': key, 'revenue': revenue, 'orders': orders, 'units': units}
+            for (period, start, dimension, key), (revenue, orders, units) in self.data.items()
+        ]
+
+
+def _upsert(executor, buckets):
+    """Add ``buckets`` onto the stored rows (INSERT ... ON CONFLICT DO UPDATE)."""
+    rows = buckets.rows()
+    if not rows:
+        return
+    dialect = getattr(executor, 'dialect', None) or db.engine.dialect
+    insert = postgresql.insert if dialect.name == 'postgresql' else sqlite.insert
+    table = SalesRollup.__table__
+    stmt = insert(table)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=['period', 'period_start', 'dimension', 'dimension_key'],
+        set_={
+            'revenue': table.c.revenue + stmt.excluded.revenue,
+            'orders': table.c.orders + stmt.excluded.orders,
+            'units': table.c.units + stmt.excluded.units,
+        },
+    )
+    executor.execute(stmt, rows)
+
+
+# ──────────────── WRITES ────────────────
+
+def record_order(order, lines):
+    """Add a paid order to the rollups, inside the caller's transaction.
+
+    ``lines`` is an iterable of ``(product_id, category, quantity, price)``.
+    """
+    day = (order.created_at or datetime.utcnow()).date()
+    products = defaultdict(lambda: [0.0, 0])
+    categories = defaultdict(lambda: [0.0, 0])
+    for product_id, category, quantity, price in lines:
+        for totals, key in ((products, product_id), (categories, category or '')):
+            totals[key][0] += price * quantity
+            totals[key][1] += quantity
+
+    buckets = _Buckets()
+    buckets.add(day, 'total', '', order.total_amount, 1, sum(units for _, units in products.values()))
+    for dimension, totals in (('product', products), ('category', categories)):
+        for key, (revenue, units) in totals.items():
+            buckets.add(day, dimension, key, revenue, 1, units)
+    _upsert(db.session, buckets)
+
+
+def _batch_buckets(conn, first_id, last_id, since):
+    day = db.func.date(Order.created_at)
+    paid = [Order.status == PAID, Order.id.between(first_id, last_id)]
+    if since:
+        paid.append(Order.created_at >= since)
+    line_revenue = db.func.sum(OrderItem.price * OrderItem.quantity)
+    line_orders = db.func.count(db.distinct(Order.id))
+    line_units = db.func.sum(OrderItem.quantity)
+
+    buckets = _Buckets()
+    day_units = defaultdict(int)
+    by_product = conn.execute(
+        db.select(day, OrderItem.product_id, line_revenue, line_orders, line_units)
+        .join(OrderItem, OrderItem.order_id == Order.id)
+        .where(*paid).group_by(day, OrderItem.product_id)
+    )
+    for row_day, product_id, revenue, orders, units in by_product:
+        buckets.add(_as_date(row_day), 'product', product_id, revenue or 0.0, orders, units or 0)
+        day_units[_as_date(row_day)] += units or 0
+
+    category = db.func.coalesce(Product.category, '')
+    by_category = conn.execute(
+        db.select(day, category, line_revenue, line_orders, line_units)
+        .join(OrderItem, OrderItem.order_id == Order.id)
+        .outerjoin(Product, Product.id == OrderItem.product_id)
+        .where(*paid).group_by(day, category)
+    )
+    for row_day, name, revenue, orders, units in by_category:
+        buckets.add(_as_date(row_day), 'category', name, revenue or 0.0, orders, units or 0)
+
+    by_day = conn.execute(
+        db.select(day, db.func.sum(Order.total_amount), db.func.count(Order.id))
+        .where(*paid).group_by(day)
+    )
+    for row_day, revenue, orders in by_day:
+        row_day = _as_date(row_day)
+        buckets.add(row_day, 'total', '', revenue or 0.0, orders, day_units[row_day])
+    return buckets
+
+
+def backfill(conn, since=None, batch_size=BACKFILL_BATCH, progress=None):
+    """Rebuild the rollups from paid orders, ``batch_size`` orders at a time.
+
+    ``since`` (a date) limits the rebuild to that week onwards; it is moved
+    back to a Monday so weekly buckets are rebuilt whole. Returns the number
+    of orders read.
+    """
+    table = SalesRollup.__table__
+    start = None
+    if since:
+        start = datetime.combine(week_start(since), datetime.min.time())
+        conn.execute(table.delete().where(table.c.period_start >= start.date()))
+    else:
+        conn.execute(table.delete())
+
+    done, last_id = 0, 0
+    while True:
+        query = db.select(Order.id).where(Order.status == PAID, Order.id > last_id)
+        if start:
+            query = query.where(Order.created_at >= start)
+        ids = conn.execute(query.order_by(Order.id).limit(batch_size)).scalars().all()
+        if not ids:
+            break
+        _upsert(conn, _batch_buckets(conn, ids[0], ids[-1], start))
+        done += len(ids)
+        last_id = ids[-1]
+        if progress:
+            progress(done)
+    return done
+
+
+# ──────────────── READS ────────────────
+
+def default_range(period, end=None):
+    end = end or datetime.utcnow().date()
+    return (end - timedelta(days=29) if period == 'day' else week_start(end) - timedelta(weeks=11)), end
+
+
+def sales_series(period='day', dimension='total', key='', start=None, end=None):
+    """One point per period with sales, oldest first; empty periods are omitted."""
+    rows = (
+        SalesRollup.query
+        .filter_by(period=period, dimension=dimension, dimension_key=str(key))
+        .filter(SalesRollup.period_start.between(start, end))
+        .order_by(SalesRollup.period_start)
+        .all()
+    )
+    return [
+        {'period_start': row.period_start.isoformat(), 'revenue': round(row.revenue, 2),
+         'orders': row.orders, 'units': row.units}
+        for row in rows
+    ]
+
+
+def top_products(start, end, limit=10, by='revenue'):
+    """Best-selling products between two days, from the daily product rollups."""
+    revenue = db.func.sum(SalesRollup.revenue)
+    units = db.func.sum(SalesRollup.units)
+    orders = db.func.sum(SalesRollup.orders)
+    rows = (
+        db.session.query(SalesRollup.dimension_key, revenue, units, orders)
+        .filter(SalesRollup.period == 'day', SalesRollup.dimension == 'product',
+                SalesRollup.period_start.between(start, end))
+        .group_by(SalesRollup.dimension_key)
+        .order_by((units if by == 'units' else revenue).desc())
+        .limit(limit)
+        .all()
+    )
+    ids = [int(row[0]) for row in rows]
+    names = dict(db.session.query(Product.id, Product.name).filter(Product.id.in_(ids))) if ids else {}
+    return [
+        {'product_id': int(key), 'name': names.get(int(key)), 'revenue': round(rev, 2),
+         'units': int(qty), 'orders': int(count)}
+        for key, rev, qty, count in rows
+    ]
+
+
+def total_revenue_query():
+    """SELECT of all-time paid revenue, summed over the weekly rollups."""
+    return db.select(db.func.coalesce(db.func.sum(SalesRollup.revenue), 0.0)).where(
+        SalesRollup.period == 'week', SalesRollup.dimension == 'total'
+    )
+
+
+# ──────────────── CLI ────────────────
+
+analytics_cli = AppGroup('analytics', help='Sales rollup commands.')
+
+
+@analytics_cli.command('backfill')
+@click.option('--since', type=click.DateTime(formats=['%Y-%m-%d']),
+              help='Only rebuild from this date (rounded down to its Monday).')
+@click.option('--batch-size', default=BACKFILL_BATCH, show_default=True)
+@with_appcontext
+def backfill_command(since, batch_size):
+    """Rebuild sales rollups from paid orders."""
+    with db.engine.begin() as conn:
+        done = backfill(conn, since.date() if since else None, batch_size,
+                        progress=lambda n: click.echo(f'  {n} orders'))
+    click.echo(f'Rolled up {done} paid order(s).')
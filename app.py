@@ -1,4 +1,5 @@
 import os
+import re
 import sys
 
 # More aggressive path injection for Render/Production
@@ -7,16 +8,39 @@ if current_dir not in sys.path:
     sys.path.insert(0, current_dir)
 
 
+import click
 from flask import Flask, send_from_directory, abort
+from flask.cli import with_appcontext
 from flask_login import LoginManager
+from werkzeug.middleware.proxy_fix import ProxyFix
 from config import Config
 try:
     from models import db, User, Product
+    from cache import init_cache
+    from migrations import db_cli, upgrade
+    from database import init_engine_profile
+    from images import init_images
+    from user_cache import init_user_cache
+    from guest_cart import init_guest_cart
+    from metrics import init_metrics
+    from analytics import analytics_cli
+    from catalog_io import catalog_cli
+    from jobs import jobs_cli
+    from datagen import datagen_cli
+    from payments import init_payments
+    from passwords import init_passwords
+    from ratelimit import init_rate_limits
+    from assets import init_assets, serve_asset
 except ImportError as e:
     print(f"SHOEASY_ERROR: Failed to import models: {e}")
     # Fallback or re-raise with more info
     raise
 
+IMAGE_MAX_AGE = 24 * 3600
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+CONTENT_HASHED = re.compile(r'^[0-9a-f]{16}(-[a-z]+)?\.[a-z]+$')
+
+
 def create_app():
     """Application factory."""
     app = Flask(
@@ -26,154 +50,99 @@ def create_app():
         static_url_path='/static'
     )
     app.config.from_object(Config)
+    if app.config['TRUSTED_PROXIES']:
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=app.config['TRUSTED_PROXIES'])
     
     # Initialize extensions
     db.init_app(app)
+    init_engine_profile(app, db)
+    init_metrics(app, db)
+    init_cache(app)
     
     login_manager = LoginManager()
     login_manager.init_app(app)
     login_manager.login_view = 'main.login'
     login_manager.login_message_category = 'info'
     
-    @login_manager.user_loader
-    def load_user(user_id):
-        return User.query.get(int(user_id))
+    # Loads a cached principal rather than the User row (see user_cache.py)
+    init_user_cache(app, login_manager)
+    init_guest_cart(app)
+    init_payments(app)
+    init_passwords(app)
+    init_rate_limits(app)
     
     # Register blueprint
     from routes import main
     app.register_blueprint(main)
+    app.cli.add_command(db_cli)
+    app.cli.add_command(analytics_cli)
+    app.cli.add_command(catalog_cli)
+    app.cli.add_command(jobs_cli)
+    app.cli.add_command(datagen_cli)
+    init_images(app)
+    
+    # CSS/JS are fingerprinted and served from memory (see assets.py)
+    init_assets(app)
     
-    # Serve root style.css
+    # Legacy asset URLs, kept for cached pages and external links
     @app.route('/style.css')
     def root_style():
-        return send_from_directory('.', 'style.css', mimetype='text/css')
+        return serve_asset('style.css') or abort(404)
     
-    # Serve product images from root (for existing images like shirt1.jpg, etc.)
-    @app.route('/images/<path:filename>')
-    def root_images(filename):
-        return send_from_directory('.', filename)
-    
-    # Serve static css and js explicitly with fallbacks to avoid production 404s
     @app.route('/static/css/<path:filename>')
     def static_css(filename):
-        # Try to serve from static/css first
-        static_path = os.path.join(app.static_folder, 'css', filename)
-        if os.path.exists(static_path):
-            return send_from_directory(os.path.join(app.static_folder, 'css'), filename)
-        
-        # Fallback to root directory for CSS files
-        if os.path.exists(filename):
-            return send_from_directory('.', filename, mimetype='text/css')
-        
-        # Return empty CSS file if not found (prevents 404 errors)
-        return '', 200
+        # Unknown stylesheets get an empty body (prevents 404 errors)
+        return serve_asset(f'css/{filename}') or ('', 200, {'Content-Type': 'text/css'})
 
     @app.route('/static/js/<path:filename>')
     def static_js(filename):
-        # Try to serve from static/js first
-        static_path = os.path.join(app.static_folder, 'js', filename)
-        if os.path.exists(static_path):
-            return send_from_directory(os.path.join(app.static_folder, 'js'), filename)
-        
-        # Fallback to root directory for JS files
-        if os.path.exists(filename):
-            return send_from_directory('.', filename, mimetype='application/javascript')
-        
-        # Return empty JS file if not found (prevents 404 errors)
-        return '', 200
+        return serve_asset(f'js/{filename}') or ('', 200, {'Content-Type': 'text/javascript'})
+    
+    # Serve product images: uploads and their derivatives first, then the
+    # seed images kept in the root (shirt1.jpg, etc.). Where each file lives
+    # is remembered so repeat requests skip the lookup.
+    image_folders = {}
+    
+    def find_image(filename, *folders):
+        folder = image_folders.get(filename)
+        if folder is None:
+            for candidate in folders:
+                if os.path.isfile(os.path.join(candidate, filename)):
+                    folder = image_folders[filename] = candidate
+                    break
+        return folder
+    
+    def image_max_age(filename):
+        # Uploads and derivatives are named by content hash and never change
+        return IMMUTABLE_MAX_AGE if CONTENT_HASHED.match(os.path.basename(filename)) else IMAGE_MAX_AGE
+    
+    @app.route('/images/<path:filename>')
+    def root_images(filename):
+        folder = find_image(filename, app.config['UPLOAD_FOLDER'], app.root_path)
+        if folder is None:
+            abort(404)
+        return send_from_directory(folder, filename, max_age=image_max_age(filename))
     
-    # Serve static images
     @app.route('/static/images/<path:filename>')
     def static_images(filename):
-        # Try to serve from static/images first
-        static_path = os.path.join(app.static_folder, 'images', filename)
-        if os.path.exists(static_path):
-            return send_from_directory(os.path.join(app.static_folder, 'images'), filename)
-        
-        # Fallback to root directory for images
-        if os.path.exists(filename):
-            return send_from_directory('.', filename)
-        
-        # Return a default image or 404
-        return abort(404)
+        folder = find_image(filename, os.path.join(app.static_folder, 'images'), app.root_path)
+        if folder is None:
+            abort(404)
+        return send_from_directory(folder, filename, max_age=image_max_age(filename))
     
     # Serve favicon if it exists
+    has_favicon = os.path.exists(os.path.join(app.root_path, 'favicon.ico'))
+    
     @app.route('/favicon.ico')
     def favicon():
-        if os.path.exists('favicon.ico'):
-            return send_from_directory('.', 'favicon.ico', mimetype='image/vnd.microsoft.icon')
+        if has_favicon:
+            return send_from_directory('.', 'favicon.ico', mimetype='image/vnd.microsoft.icon',
+                                       max_age=IMAGE_MAX_AGE)
         return '', 204
     
-    # Create necessary directories on startup
-    def create_directories():
-        """Create necessary directories on startup."""
-        # Create instance folder for SQLite
-        os.makedirs(app.instance_path, exist_ok=True)
-        
-        # Create static subdirectories
-        static_css_dir = os.path.join(app.static_folder, 'css')
-        static_js_dir = os.path.join(app.static_folder, 'js')
-        static_images_dir = os.path.join(app.static_folder, 'images')
-        
-        os.makedirs(static_css_dir, exist_ok=True)
-        os.makedirs(static_js_dir, exist_ok=True)
-        os.makedirs(static_images_dir, exist_ok=True)
-        
-        # Copy CSS files from root to static/css if they don't exist
-        css_files = ['admin.css', 'responsive.css']
-        for css_file in css_files:
-            root_path = css_file
-            static_path = os.path.join(static_css_dir, css_file)
-            if os.path.exists(root_path) and not os.path.exists(static_path):
-                try:
-                    import shutil
-                    shutil.copy2(root_path, static_path)
-                    print(f"Copied {css_file} to static/css/")
-                except Exception as e:
-                    print(f"Failed to copy {css_file}: {e}")
-        
-        # Copy JS files from root to static/js if they don't exist
-        js_files = ['script.js']
-        for js_file in js_files:
-            root_path = js_file
-            static_path = os.path.join(static_js_dir, js_file)
-            if os.path.exists(root_path) and not os.path.exists(static_path):
-                try:
-                    import shutil
-                    shutil.copy2(root_path, static_path)
-                    print(f"Copied {js_file} to static/js/")
-                except Exception as e:
-                    print(f"Failed to copy {js_file}: {e}")
-        
-        # Create empty CSS files if they don't exist to prevent 404s
-        for css_file in css_files:
-            static_path = os.path.join(static_css_dir, css_file)
-            if not os.path.exists(static_path):
-                try:
-                    with open(static_path, 'w') as f:
-                        f.write(f"/* {css_file} - auto-generated */\n")
-                    print(f"Created empty {css_file} in static/css/")
-                except Exception as e:
-                    print(f"Failed to create {css_file}: {e}")
-        
-        # Create empty JS file if it doesn't exist to prevent 404s
-        for js_file in js_files:
-            static_path = os.path.join(static_js_dir, js_file)
-            if not os.path.exists(static_path):
-                try:
-                    with open(static_path, 'w') as f:
-                        f.write(f"// {js_file} - auto-generated\n")
-                    print(f"Created empty {js_file} in static/js/")
-                except Exception as e:
-                    print(f"Failed to create {js_file}: {e}")
-    
-    # Create database tables and seed data
-    with app.app_context():
-        # Ensure instance folder exists for SQLite
-        os.makedirs(app.instance_path, exist_ok=True)
-        create_directories()
-        db.create_all()
-        seed_data()
+    # One-shot setup commands; create_app itself never writes to disk or DB
+    app.cli.add_command(init_command)
+    app.cli.add_command(seed_command)
     
     return app
 
@@ -363,9 +332,29 @@ def seed_data():
     db.session.commit()
 
 
-# Create and run the app
-app = create_app()
+@click.command('init')
+@with_appcontext
+def init_command():
+    """Create/upgrade the schema and seed initial data. Run once per deploy."""
+    database = db.engine.url.database
+    if db.engine.dialect.name == 'sqlite' and database and database != ':memory:':
+        os.makedirs(os.path.dirname(os.path.abspath(database)), exist_ok=True)
+    applied = upgrade()
+    if applied:
+        click.echo(f"Applied migrations: {', '.join(map(str, applied))}")
+    seed_data()
+    click.echo('Database initialised.')
+
+
+@click.command('seed')
+@with_appcontext
+def seed_command():
+    """Insert the admin user and demo catalogue if they are missing."""
+    seed_data()
+    click.echo('Seed data loaded.')
+
 
 if __name__ == '__main__':
+    app = create_app()
     port = int(os.environ.get('PORT', 5000))
     app.run(debug=False, host='0.0.0.0', port=port)
\ No newline at end of file
@@ -0,0 +1,122 @@
+"""Fingerprinted CSS/JS assets served from memory.
+
+At startup every asset in ``ASSETS`` is read once, hashed and compressed
+(gzip, plus brotli when the ``brotli`` package is installed). Templates
+link them with ``asset_url('style.css')``, which returns
+``/assets/style.<hash>.css``; those URLs change whenever the file does, so
+they are served with a one-year ``immutable`` Cache-Control. The legacy
+URLs (``/style.css``, ``/static/css/...``, ``/static/js/...``) are served
+from the same manifest with ``no-cache`` so browsers revalidate against the
+strong ETag and get a 304.
+
+Nothing here touches the filesystem after startup.
+"""
+import gzip
+import hashlib
+import mimetypes
+import os
+
+from flask import Response, abort, current_app, request
+
+try:
+    import brotli
+except ImportError:  # optional: gzip only
+    brotli = None
+
+# Logical name -> candidate source paths relative to the app root, first wins
+ASSETS = {
+    'style.css': ['style.css'],
+    'css/admin.css': ['static/css/admin.css', 'admin.css'],
+    'css/responsive.css': ['static/css/responsive.css', 'responsive.css'],
+    'js/script.js': ['static/js/script.js', 'script.js'],
+}
+
+IMMUTABLE = 'public, max-age=31536000, immutable'
+REVALIDATE = 'public, no-cache'
+MIN_COMPRESS_SIZE = 1024
+
+
+class Asset:
+    __slots__ = ('name', 'url', 'mimetype', 'digest', 'variants')
+
+    def __init__(self, name, data):
+        self.name = name
+        self.digest = hashlib.sha256(data).hexdigest()
+        stem, ext = os.path.splitext(name)
+        self.url = f'/assets/{stem}.{self.digest[:10]}{ext}'
+        self.mimetype = mimetypes.guess_type(name)[0] or 'application/octet-stream'
+        # encoding -> body; '' is the identity encoding
+        self.variants = {'': data}
+        if len(data) >= MIN_COMPRESS_SIZE:
+            compressed = gzip.compress(data, compresslevel=9, mtime=0)
+            if len(compressed) < len(data):
+                self.variants['gzip'] = compressed
+            if brotli is not None:
+                compressed = brotli.compress(data, quality=11)
+                if len(compressed) < len(data):
+                    self.variants['br'] = compressed
+
+
+class AssetManifest:
+    def __init__(self, root_path):
+        self.assets = {}
+        self.by_url = {}
+        for name, candidates in ASSETS.items():
+            for candidate in candidates:
+                path = os.path.join(root_path, candidate)
+                if os.path.isfile(path):
+                    with open(path, 'rb') as f:
+                        asset = Asset(name, f.read())
+                    self.assets[name] = asset
+                    self.by_url[asset.url] = asset
+                    break
+
+    def url(self, name):
+        asset = self.assets.get(name)
+        return asset.url if asset else f'/static/{name}'
+
+
+def _choose_encoding(asset):
+    for encoding in ('br', 'gzip'):
+        if encoding in asset.variants and encoding in request.accept_encodings:
+            return encoding
+    return ''
+
+
+def asset_response(asset, cache_control):
+    encoding = _choose_encoding(asset)
+    response = Response(asset.variants[encoding], mimetype=asset.mimetype)
+    response.headers['Cache-Control'] = cache_control
+    response.headers['Vary'] = 'Accept-Encoding'
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    # Each encoding is a different representation, so it gets its own ETag
+    response.set_etag(asset.digest + (f'-{encoding}' if encoding else ''))
+    return response.make_conditional(request)
+
+
+def get_manifest():
+    return current_app.extensions['shopeasy_assets']
+
+
+def serve_asset(name):
+    """Serve a legacy (non-fingerprinted) asset URL, or None if unknown."""
+    asset = get_manifest().assets.get(name)
+    if asset is None:
+        return None
+    return asset_response(asset, REVALIDATE)
+
+
+def init_assets(app):
+    manifest = AssetManifest(app.root_path)
+    app.extensions['shopeasy_assets'] = manifest
+    app.jinja_env.globals['asset_url'] = manifest.url
+
+    @app.route('/assets/<path:filename>')
+    def fingerprinted_asset(filename):
+        asset = manifest.by_url.get(f'/assets/{filename}')
+        if asset is None:
+            abort(404)
+        return asset_response(asset, IMMUTABLE)
+
+    return manifest
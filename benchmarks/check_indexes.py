@@ -0,0 +1,197 @@
+"""Migrations and index coverage of the queries the routes really issue.
+
+Builds a fresh SQLite database in a temporary directory and runs
+``migrations.upgrade()`` (twice: the second run must apply nothing), fills
+it with ``datagen.populate`` and then drives the hot paths through Flask's
+test client - home, product, search, category and browse pages, the
+product APIs, guest and signed-in carts, checkout, the job worker and the
+admin tables. Every SELECT/UPDATE/DELETE the ORM sends is captured and run
+through ``EXPLAIN QUERY PLAN`` with its real parameters.
+
+Exits with status 1 if a migration fails or a captured statement scans a
+table without an index, printing the route and the plan. Since the SQL
+comes from the code itself, new or changed queries are checked without
+editing this file.
+
+    python benchmarks/check_indexes.py --products 5000
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+PASSWORD = 'check-indexes'
+# Tables that stay a handful of rows, where a scan is the right plan;
+# 'SCAN CONSTANT ROW' and subquery scans read no table
+SMALL_TABLES = {'schema_migrations', 'category_facet'}
+EXPLAINED = ('SELECT', 'UPDATE', 'DELETE', 'WITH')
+
+
+class Recorder:
+    """Collects ``(label, statement, parameters)`` from the engine while active."""
+
+    def __init__(self):
+        self.label = None
+        self.statements = {}
+
+    def __call__(self, conn, cursor, statement, parameters, context, executemany):
+        if self.label is None or not statement.lstrip().upper().startswith(EXPLAINED):
+            return
+        if executemany:
+            parameters = parameters[0] if parameters else ()
+        self.statements.setdefault(statement, (self.label, parameters))
+
+
+def _login(client, user_id):
+    with client.session_transaction() as session:
+        session['_user_id'] = str(user_id)
+        session['_fresh'] = True
+
+
+def drive(app, recorder):
+    """Request every hot path once, labelling the statements by route."""
+    from jobs import work
+    from models import db, Product, User
+    from werkzeug.security import generate_password_hash
+
+    with app.app_context():
+        # In stock, so the cart and checkout requests below succeed
+        product = db.session.execute(db.select(Product).where(Product.stock >= 10)
+                                     .order_by(Product.id.desc()).limit(1)).scalar_one()
+        product_id, category = product.id, product.category
+        shopper = User(username='indexcheck', email='indexcheck@example.com',
+                       password_hash=generate_password_hash(PASSWORD, 'pbkdf2:sha256:1000'))
+        admin = db.session.execute(db.select(User).where(User.is_admin.is_(True)).limit(1)).scalar_one()
+        db.session.add(shopper)
+        db.session.commit()
+        shopper_id, admin_id = shopper.id, admin.id
+
+    def visit(client, method, path, **kwargs):
+        recorder.label = f'{method} {path}'
+        response = client.open(path, method=method, **kwargs)
+        recorder.label = None
+        if response.status_code >= 400:
+            raise SystemExit(f'{method} {path} answered {response.status_code}: '
+                             f'{response.get_data(as_text=True)[:300]}')
+        return response
+
+    guest = app.test_client()
+    for path in ('/', f'/product/{product_id}', '/search?q=shirt', f'/category/{category}',
+                 f'/category/{category}?sort=price_asc&min_price=100&max_price=2000&in_stock=1',
+                 f'/category/{category}?sort=discount&min_discount=10&size=M',
+                 f'/category/{category}?sort=price_desc', f'/api/product/{product_id}',
+                 '/api/products?limit=24', f'/api/products?category={category}&fields=id,name,price',
+                 '/api/products?search=cotton', f'/api/browse?category={category}&sort=newest',
+                 f'/api/browse?category={category}&sort=price_asc&min_price=500'):
+        visit(guest, 'GET', path)
+    cursor = guest.get('/api/products?limit=5').get_json()['next_cursor']
+    visit(guest, 'GET', f'/api/products?limit=5&cursor={cursor}')
+    visit(guest, 'POST', '/api/cart/add', json={'product_id': product_id})
+    visit(guest, 'GET', '/cart')
+    visit(guest, 'POST', '/login', data={'email': 'indexcheck@example.com', 'password': PASSWORD})
+
+    shopper = app.test_client()
+    _login(shopper, shopper_id)
+    visit(shopper, 'POST', '/api/cart/add', json={'product_id': product_id, 'size': 'M'})
+    visit(shopper, 'POST', '/api/cart/batch', json={'operations': [{'op': 'add', 'product_id': product_id}]})
+    visit(shopper, 'GET', '/api/cart/count')
+    visit(shopper, 'GET', '/cart')
+    visit(shopper, 'GET', '/checkout')
+    visit(shopper, 'POST', '/api/checkout', headers={'Idempotency-Key': 'index-check'},
+          json={'payment_id': 'pay_sim_index_check', 'full_name': 'Index Check', 'address': '1 Plan St',
+                'city': 'Pune', 'state': 'MH', 'zipcode': '411001', 'phone': '9999999999'})
+    recorder.label = 'jobs work'
+    with app.app_context():
+        work(burst=True, worker='check-indexes')
+    recorder.label = None
+
+    admin = app.test_client()
+    _login(admin, admin_id)
+    for path in ('/admin', '/admin/api/products?q=shirt', f'/admin/api/products?category={category}',
+                 '/admin/api/orders', '/admin/api/orders?status=Paid', '/admin/api/orders?q=bench',
+                 '/admin/api/users', '/admin/api/users?q=user', '/admin/api/stats',
+                 '/admin/api/sales', f'/admin/api/sales?dimension=category&key={category}',
+                 '/admin/api/sales/top-products'):
+        visit(admin, 'GET', path)
+    cursor = admin.get('/admin/api/orders?limit=5').get_json()['next_cursor']
+    visit(admin, 'GET', f'/admin/api/orders?limit=5&cursor={cursor}')
+
+
+def full_scans(engine, statements):
+    """``[(label, sql, plan)]`` for statements that scan a table without an index."""
+    failures = []
+    raw = engine.raw_connection()
+    try:
+        cursor = raw.cursor()
+        for sql, (label, parameters) in statements.items():
+            plan = [row[-1] for row in cursor.execute(f'EXPLAIN QUERY PLAN {sql}', parameters)]
+            scans = [step for step in plan if step.startswith('SCAN ') and 'INDEX' not in step
+                     and step.split()[1] not in SMALL_TABLES | {'CONSTANT'} and '(subquery' not in step]
+            if scans:
+                failures.append((label, sql, plan))
+    finally:
+        raw.close()
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--products', type=int, default=2000)
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--orders', type=int, default=500)
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix='shopeasy-indexes-')
+    os.environ.update(DATABASE_URL=f'sqlite:///{tmp}/indexes.db', CACHE_PATH=f'{tmp}/cache.db',
+                      SECRET_KEY='check-indexes', PASSWORD_HASH_WORKERS='0', SERVER_TIMING='0',
+                      RAZORPAY_KEY_ID='', RAZORPAY_KEY_SECRET='')
+    try:
+        from sqlalchemy import event
+
+        from app import create_app, seed_data
+        from datagen import populate
+        from migrations import MIGRATIONS, upgrade
+        from models import db
+
+        app = create_app()
+        with app.app_context():
+            try:
+                applied = upgrade()
+                again = upgrade()
+            except Exception as e:
+                print(f'FAILED migrations: {e!r}')
+                sys.exit(1)
+            missing = [version for version, _, _ in MIGRATIONS if version not in applied]
+            if missing or again:
+                print(f'FAILED migrations: not applied {missing}, applied twice {again}')
+                sys.exit(1)
+            print(f'Applied migrations {applied[0]}-{applied[-1]} to a fresh database.')
+            seed_data()
+            populate(products=args.products, users=args.users, orders=args.orders,
+                     cart_items=args.users)
+            engine = db.engine
+
+        # Outside any app context: each request must push its own, or
+        # flask-login's per-context user leaks from one client to the next
+        recorder = Recorder()
+        event.listen(engine, 'before_cursor_execute', recorder)
+        drive(app, recorder)
+        event.remove(engine, 'before_cursor_execute', recorder)
+        failures = full_scans(engine, recorder.statements)
+        engine.dispose()
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    for label, sql, plan in failures:
+        print(f'FULL SCAN  {label}\n  {" ".join(sql.split())}\n  plan: {" / ".join(plan)}')
+    if failures:
+        sys.exit(1)
+    print(f'All {len(recorder.statements)} captured statements use an index.')
+
+
+if __name__ == '__main__':
+    main()
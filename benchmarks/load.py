@@ -0,0 +1,363 @@
+"""End-to-end load test of the main blueprint.
+
+Seeds a temporary database (``flask --app app init`` plus benchmark users,
+or a copy of ``--database``), serves ``wsgi:app`` with gunicorn on
+localhost and drives it with concurrent clients, each a shopper session
+mixing browsing, search, cart and checkout traffic in the ``MIX`` ratios.
+Half the clients are guests (no login, cookie cart, no checkout).
+
+Reports p50/p95/p99 latency, requests per second and SQL statements per
+request (from the ``Server-Timing`` header added by metrics.py) for each
+endpoint. With ``--baseline`` the run fails (exit status 1) when an
+endpoint issues more queries, gets slower beyond ``--tolerance`` or
+errors; ``--update-baseline`` writes the results there instead. Latencies
+only compare on the same machine, so record the baseline where it is
+checked. Everything runs offline: simulated payments, no CDN.
+
+    python benchmarks/load.py --clients 8 --duration 20 --baseline benchmarks/baseline.json
+    python benchmarks/load.py --update-baseline benchmarks/baseline.json
+"""
+import argparse
+import http.client
+import json
+import os
+import random
+import re
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from http.cookies import SimpleCookie
+from urllib.parse import urlencode
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# Relative weight of each shopper action
+MIX = {
+    'index': 25,
+    'product_detail': 25,
+    'search': 12,
+    'api_products': 10,
+    'add_to_cart': 10,
+    'cart_count': 8,
+    'cart': 5,
+    'checkout': 5,   # GET /checkout then POST /api/checkout (logged-in clients only)
+}
+SEARCH_TERMS = ('shirt', 'shoe', 'watch', 'speaker', 'cotton', 'wireless', 'men', 'black')
+BENCH_PASSWORD = 'bench-password'
+SERVER_TIMING = re.compile(r'desc="(\d+) queries"')
+
+
+# ──────────────── SETUP ────────────────
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def prepare_database(env, users, source=None):
+    """Create the benchmark database and return ``(product_ids, categories)``."""
+    if source:
+        shutil.copyfile(source, env['DATABASE_URL'][len('sqlite:///'):])
+    subprocess.run([sys.executable, '-m', 'flask', '--app', 'app', 'init'],
+                   cwd=ROOT, env=env, check=True, capture_output=True)
+    os.environ.update(env)
+    from app import create_app
+    from models import db, Product, User
+    from werkzeug.security import generate_password_hash
+
+    app = create_app()
+    with app.app_context():
+        # Stock must not run out mid-run, or checkout starts answering 409
+        db.session.execute(db.update(Product).values(stock=10 ** 9))
+        password_hash = generate_password_hash(BENCH_PASSWORD)
+        existing = set(db.session.execute(
+            db.select(User.email).where(User.email.like('bench%@example.com'))).scalars())
+        db.session.execute(db.insert(User), [
+            {'username': f'bench{i}', 'email': f'bench{i}@example.com',
+             'password_hash': password_hash, 'is_admin': False}
+            for i in range(users) if f'bench{i}@example.com' not in existing
+        ])
+        db.session.commit()
+        product_ids = db.session.execute(
+            db.select(Product.id).order_by(Product.id).limit(5000)).scalars().all()
+        categories = db.session.execute(db.select(Product.category).distinct()).scalars().all()
+    return product_ids, categories
+
+
+def start_server(env, port, workers, threads):
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-w', str(workers), '--threads', str(threads),
+         '-b', f'127.0.0.1:{port}', '--log-level', 'warning', 'wsgi:app'],
+        cwd=ROOT, env=env
+    )
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=0.5).close()
+            return server
+        except OSError:
+            if server.poll() is not None:
+                raise SystemExit('gunicorn exited during startup')
+            time.sleep(0.1)
+    server.kill()
+    raise SystemExit('gunicorn did not start listening within 30s')
+
+
+# ──────────────── CLIENTS ────────────────
+
+class Client:
+    """One shopper: a keep-alive connection plus a cookie jar."""
+
+    def __init__(self, port, rng, record):
+        self.port = port
+        self.rng = rng
+        self.record = record
+        self.cookies = {}
+        self.conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+
+    def request(self, name, method, path, body=None, form=False, headers=None):
+        headers = dict(headers or {})
+        if self.cookies:
+            headers['Cookie'] = '; '.join(f'{k}={v}' for k, v in self.cookies.items())
+        if body is not None:
+            if form:
+                body = urlencode(body)
+                headers['Content-Type'] = 'application/x-www-form-urlencoded'
+            else:
+                body = json.dumps(body)
+                headers['Content-Type'] = 'application/json'
+        started = time.perf_counter()
+        try:
+            self.conn.request(method, path, body=body, headers=headers)
+            response = self.conn.getresponse()
+            payload = response.read()
+        except (OSError, http.client.HTTPException):
+            self.conn.close()
+            self.conn = http.client.HTTPConnection('127.0.0.1', self.port, timeout=30)
+            if self.record:
+                self.record(name, time.perf_counter() - started, 599, None)
+            return 599, b''
+        elapsed = time.perf_counter() - started
+        for header in response.headers.get_all('Set-Cookie') or ():
+            for key, morsel in SimpleCookie(header).items():
+                if morsel['max-age'] == '0':
+                    self.cookies.pop(key, None)
+                else:
+                    self.cookies[key] = morsel.value
+        timing = SERVER_TIMING.search(response.headers.get('Server-Timing', ''))
+        if self.record:
+            self.record(name, elapsed, response.status, int(timing.group(1)) if timing else None)
+        return response.status, payload
+
+    def login(self, index):
+        self.request('login', 'POST', '/login', {'email': f'bench{index}@example.com',
+                                                 'password': BENCH_PASSWORD}, form=True)
+        return 'session' in self.cookies or 'remember_token' in self.cookies
+
+
+def shopper(client, logged_in, product_ids, categories, deadline):
+    rng = client.rng
+    actions = [a for a in MIX if logged_in or a != 'checkout']
+    weights = [MIX[a] for a in actions]
+    checkout_no = 0
+    while time.time() < deadline:
+        action = rng.choices(actions, weights)[0]
+        product_id = rng.choice(product_ids)
+        if action == 'index':
+            client.request(action, 'GET', '/')
+        elif action == 'product_detail':
+            client.request(action, 'GET', f'/product/{product_id}')
+        elif action == 'search':
+            client.request(action, 'GET', f'/search?q={rng.choice(SEARCH_TERMS)}')
+        elif action == 'api_products':
+            params = {'limit': 24, 'fields': 'id,name,price,image'}
+            if rng.random() < 0.5 and categories:
+                params['category'] = rng.choice(categories)
+            elif rng.random() < 0.5:
+                params['search'] = rng.choice(SEARCH_TERMS)
+            client.request(action, 'GET', f'/api/products?{urlencode(params)}')
+        elif action == 'add_to_cart':
+            client.request(action, 'POST', '/api/cart/add',
+                           {'product_id': product_id, 'quantity': rng.randint(1, 2)})
+        elif action == 'cart_count':
+            client.request(action, 'GET', '/api/cart/count')
+        elif action == 'cart':
+            client.request(action, 'GET', '/cart')
+        elif action == 'checkout':
+            client.request('add_to_cart', 'POST', '/api/cart/add', {'product_id': product_id})
+            client.request('checkout', 'GET', '/checkout')
+            checkout_no += 1
+            client.request('process_checkout', 'POST', '/api/checkout',
+                           {'payment_method': 'cod', 'full_name': 'Bench Shopper',
+                            'address': '1 Load St', 'city': 'Pune', 'state': 'MH',
+                            'zipcode': '411001', 'phone': '9999999999'},
+                           headers={'Idempotency-Key': f'bench-{id(client)}-{checkout_no}'})
+
+
+# ──────────────── RUN ────────────────
+
+def percentile(values, pct):
+    """Nearest-rank percentile of sorted ``values``."""
+    if not values:
+        return 0.0
+    rank = max(1, round(pct / 100 * len(values)))
+    return values[min(rank, len(values)) - 1]
+
+
+def summarise(samples, seconds):
+    endpoints = {}
+    for name, rows in sorted(samples.items()):
+        latencies = sorted(r[0] for r in rows)
+        queries = [r[2] for r in rows if r[2] is not None]
+        endpoints[name] = {
+            'requests': len(rows),
+            'errors': sum(1 for r in rows if r[1] >= 400),
+            'rps': round(len(rows) / seconds, 1),
+            'p50_ms': round(percentile(latencies, 50) * 1000, 2),
+            'p95_ms': round(percentile(latencies, 95) * 1000, 2),
+            'p99_ms': round(percentile(latencies, 99) * 1000, 2),
+            'queries_per_request': round(sum(queries) / len(queries), 2) if queries else None,
+        }
+    everything = sorted(r[0] for rows in samples.values() for r in rows)
+    total = {
+        'requests': len(everything),
+        'errors': sum(e['errors'] for e in endpoints.values()),
+        'rps': round(len(everything) / seconds, 1),
+        'p50_ms': round(percentile(everything, 50) * 1000, 2),
+        'p95_ms': round(percentile(everything, 95) * 1000, 2),
+        'p99_ms': round(percentile(everything, 99) * 1000, 2),
+    }
+    return {'endpoints': endpoints, 'total': total}
+
+
+def run(args):
+    tmp = tempfile.mkdtemp(prefix='shopeasy-bench-')
+    env = dict(os.environ,
+               DATABASE_URL=f'sqlite:///{tmp}/bench.db',
+               CACHE_PATH=f'{tmp}/cache.db',
+               SECRET_KEY='benchmark',
+               METRICS_ENABLED='1',
+               SERVER_TIMING='1',
+               LOGIN_IP_BURST='100000',  # every client logs in from 127.0.0.1
+               RAZORPAY_KEY_ID='', RAZORPAY_KEY_SECRET='')
+    try:
+        product_ids, categories = prepare_database(env, args.clients, args.database)
+        port = _free_port()
+        server = start_server(env, port, args.workers, args.threads)
+        try:
+            samples = {}
+            lock = threading.Lock()
+            recording = threading.Event()
+
+            def record(name, seconds, status, queries):
+                if recording.is_set():
+                    with lock:
+                        samples.setdefault(name, []).append((seconds, status, queries))
+
+            clients = []
+            for i in range(args.clients):
+                client = Client(port, random.Random(args.seed * 1000 + i), record)
+                logged_in = i % 2 == 1 and client.login(i)
+                clients.append((client, logged_in))
+
+            started = time.time()
+            deadline = started + args.warmup + args.duration
+            threads = [threading.Thread(target=shopper, daemon=True,
+                                        args=(client, logged_in, product_ids, categories, deadline))
+                       for client, logged_in in clients]
+            for thread in threads:
+                thread.start()
+            time.sleep(args.warmup)
+            recording.set()
+            for thread in threads:
+                thread.join()
+            recording.clear()
+        finally:
+            server.terminate()
+            server.wait(timeout=10)
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    result = summarise(samples, args.duration)
+    result['config'] = {'clients': args.clients, 'duration': args.duration, 'workers': args.workers,
+                        'threads': args.threads, 'seed': args.seed, 'products': len(product_ids)}
+    return result
+
+
+# ──────────────── BASELINE ────────────────
+
+def regressions(result, baseline, tolerance):
+    """Human-readable list of ways ``result`` is worse than ``baseline``."""
+    problems = []
+    for name, base in baseline['endpoints'].items():
+        now = result['endpoints'].get(name)
+        if now is None:
+            problems.append(f'{name}: no requests recorded')
+            continue
+        if now['errors']:
+            problems.append(f"{name}: {now['errors']} error responses")
+        if base.get('queries_per_request') is not None and now['queries_per_request'] is not None:
+            # Query counts are deterministic up to cache hits, so allow only a little drift
+            if now['queries_per_request'] > base['queries_per_request'] * 1.1 + 0.5:
+                problems.append(f"{name}: {now['queries_per_request']} queries/request "
+                                f"(baseline {base['queries_per_request']})")
+        if now['p95_ms'] > base['p95_ms'] * (1 + tolerance) + 1:
+            problems.append(f"{name}: p95 {now['p95_ms']} ms (baseline {base['p95_ms']} ms)")
+    if result['total']['rps'] < baseline['total']['rps'] * (1 - tolerance):
+        problems.append(f"throughput {result['total']['rps']} rps (baseline {baseline['total']['rps']} rps)")
+    return problems
+
+
+def print_report(result):
+    print(f'{"endpoint":<18} {"reqs":>7} {"err":>5} {"rps":>8} {"p50 ms":>8} {"p95 ms":>8} '
+          f'{"p99 ms":>8} {"queries":>8}')
+    rows = list(result['endpoints'].items()) + [('TOTAL', result['total'])]
+    for name, r in rows:
+        queries = r.get('queries_per_request')
+        print(f'{name:<18} {r["requests"]:>7} {r["errors"]:>5} {r["rps"]:>8} {r["p50_ms"]:>8} '
+              f'{r["p95_ms"]:>8} {r["p99_ms"]:>8} {"" if queries is None else queries:>8}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--clients', type=int, default=8, help='Concurrent shoppers.')
+    parser.add_argument('--duration', type=float, default=20, help='Measured seconds.')
+    parser.add_argument('--warmup', type=float, default=3, help='Unmeasured seconds first.')
+    parser.add_argument('--workers', type=int, default=2, help='gunicorn worker processes.')
+    parser.add_argument('--threads', type=int, default=4, help='Threads per gunicorn worker.')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--database', help='SQLite file to copy instead of the demo catalogue.')
+    parser.add_argument('--baseline', help='Fail if the run is worse than this JSON file.')
+    parser.add_argument('--update-baseline', metavar='PATH', help='Write the results to PATH.')
+    parser.add_argument('--tolerance', type=float, default=0.5,
+                        help='Allowed p95/throughput regression as a fraction (default 0.5).')
+    parser.add_argument('--output', help='Also write the results as JSON here.')
+    args = parser.parse_args()
+
+    result = run(args)
+    print_report(result)
+    for path in filter(None, (args.output, args.update_baseline)):
+        with open(path, 'w') as f:
+            json.dump(result, f, indent=2, sort_keys=True)
+            f.write('\n')
+    if args.baseline and not args.update_baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline.get('config') != result['config']:
+            print(f"warning: baseline was recorded with {baseline.get('config')}")
+        problems = regressions(result, baseline, args.tolerance)
+        for problem in problems:
+            print(f'REGRESSION {problem}')
+        if problems:
+            sys.exit(1)
+        print('No regressions against', args.baseline)
+
+
+if __name__ == '__main__':
+    main()
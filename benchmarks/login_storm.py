@@ -0,0 +1,165 @@
+"""Browse latency while the server is flooded with logins.
+
+Runs the same gunicorn setup as ``load.py`` once per scenario, with
+``--browsers`` clients fetching pages (home, product, search, product API)
+and ``--attackers`` clients posting logins back to back, each with a fresh
+session so every attempt reaches the password check:
+
+* ``quiet``       - browsing only, the reference latency;
+* ``inline``      - logins hashed in the request workers
+                    (``PASSWORD_HASH_WORKERS=0``) with rate limits off,
+                    i.e. the behaviour before passwords.py;
+* ``pool``        - hashing on the niced process pool, rate limits off;
+* ``pool+limits`` - the default configuration.
+
+Reports browse p50/p95/p99 and throughput per scenario, and what the
+login attempts got back (302 signed in, 429 rate limited, 503 hashing
+queue full).
+
+    python benchmarks/login_storm.py --duration 15 --attackers 8
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from urllib.parse import urlencode
+
+from load import (BENCH_PASSWORD, SEARCH_TERMS, Client, _free_port, percentile, prepare_database,
+                  start_server)
+
+UNLIMITED = {'LOGIN_IP_BURST': '1000000', 'LOGIN_IP_PER_MINUTE': '1000000',
+             'LOGIN_ACCOUNT_BURST': '1000000', 'LOGIN_ACCOUNT_PER_MINUTE': '1000000'}
+SCENARIOS = {
+    'quiet': None,
+    'inline': {'PASSWORD_HASH_WORKERS': '0', **UNLIMITED},
+    'pool': UNLIMITED,
+    'pool+limits': {},
+}
+
+
+def browser(client, product_ids, deadline):
+    rng = client.rng
+    while time.time() < deadline:
+        roll = rng.random()
+        if roll < 0.3:
+            client.request('browse', 'GET', '/')
+        elif roll < 0.6:
+            client.request('browse', 'GET', f'/product/{rng.choice(product_ids)}')
+        elif roll < 0.8:
+            client.request('browse', 'GET', f'/search?q={rng.choice(SEARCH_TERMS)}')
+        else:
+            params = {'limit': 24, 'fields': 'id,name,price,image'}
+            client.request('browse', 'GET', f'/api/products?{urlencode(params)}')
+
+
+def attacker(client, accounts, deadline):
+    while time.time() < deadline:
+        client.cookies.clear()
+        index = client.rng.randrange(accounts)
+        client.request('login', 'POST', '/login', {'email': f'bench{index}@example.com',
+                                                   'password': BENCH_PASSWORD}, form=True)
+
+
+def run_scenario(env, overrides, args, product_ids):
+    port = _free_port()
+    server = start_server(dict(env, **(overrides or {})), port, args.workers, args.threads)
+    samples = {'browse': [], 'login': []}
+    lock = threading.Lock()
+    recording = threading.Event()
+
+    def record(name, seconds, status, queries):
+        if recording.is_set():
+            with lock:
+                samples[name].append((seconds, status))
+
+    try:
+        deadline = time.time() + args.warmup + args.duration
+        threads = [threading.Thread(target=browser, daemon=True,
+                                    args=(Client(port, random.Random(args.seed * 1000 + i), record),
+                                          product_ids, deadline))
+                   for i in range(args.browsers)]
+        if overrides is not None:
+            threads += [threading.Thread(target=attacker, daemon=True,
+                                         args=(Client(port, random.Random(args.seed * 2000 + i), record),
+                                               args.accounts, deadline))
+                        for i in range(args.attackers)]
+        for thread in threads:
+            thread.start()
+        time.sleep(args.warmup)
+        recording.set()
+        for thread in threads:
+            thread.join()
+        recording.clear()
+    finally:
+        server.terminate()
+        server.wait(timeout=10)
+
+    latencies = sorted(s[0] for s in samples['browse'])
+    logins = {}
+    for _, status in samples['login']:
+        logins[status] = logins.get(status, 0) + 1
+    return {
+        'browse_requests': len(latencies),
+        'browse_errors': sum(1 for s in samples['browse'] if s[1] >= 400),
+        'browse_rps': round(len(latencies) / args.duration, 1),
+        'p50_ms': round(percentile(latencies, 50) * 1000, 2),
+        'p95_ms': round(percentile(latencies, 95) * 1000, 2),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 2),
+        'logins': {str(k): v for k, v in sorted(logins.items())},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--browsers', type=int, default=4, help='Concurrent browsing clients.')
+    parser.add_argument('--attackers', type=int, default=8, help='Concurrent login clients.')
+    parser.add_argument('--accounts', type=int, default=50, help='Accounts the logins spread over.')
+    parser.add_argument('--duration', type=float, default=15, help='Measured seconds per scenario.')
+    parser.add_argument('--warmup', type=float, default=2, help='Unmeasured seconds first.')
+    parser.add_argument('--workers', type=int, default=2, help='gunicorn worker processes.')
+    parser.add_argument('--threads', type=int, default=4, help='Threads per gunicorn worker.')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--scenario', action='append', choices=SCENARIOS,
+                        help='Run only these scenarios (repeatable).')
+    parser.add_argument('--output', help='Also write the results as JSON here.')
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix='shopeasy-storm-')
+    env = dict(os.environ,
+               DATABASE_URL=f'sqlite:///{tmp}/bench.db',
+               CACHE_PATH=f'{tmp}/cache.db',
+               SECRET_KEY='benchmark',
+               RAZORPAY_KEY_ID='', RAZORPAY_KEY_SECRET='')
+    results = {}
+    try:
+        product_ids, _ = prepare_database(env, args.accounts)
+        for name in args.scenario or SCENARIOS:
+            # Each scenario starts with empty rate-limit buckets
+            for suffix in ('', '-wal', '-shm'):
+                if os.path.exists(f'{tmp}/cache.db{suffix}'):
+                    os.remove(f'{tmp}/cache.db{suffix}')
+            results[name] = run_scenario(env, SCENARIOS[name], args, product_ids)
+            print(f'{name} done', file=sys.stderr)
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    print(f'{"scenario":<12} {"rps":>8} {"p50 ms":>8} {"p95 ms":>8} {"p99 ms":>8} {"err":>5}  logins')
+    for name, r in results.items():
+        logins = ' '.join(f'{status}:{count}' for status, count in r['logins'].items()) or '-'
+        print(f'{name:<12} {r["browse_rps"]:>8} {r["p50_ms"]:>8} {r["p95_ms"]:>8} {r["p99_ms"]:>8} '
+              f'{r["browse_errors"]:>5}  {logins}')
+    if args.output:
+        config = {k: getattr(args, k) for k in ('browsers', 'attackers', 'accounts', 'duration',
+                                                 'workers', 'threads', 'seed')}
+        with open(args.output, 'w') as f:
+            json.dump({'config': config, 'scenarios': results}, f, indent=2, sort_keys=True)
+            f.write('\n')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,157 @@
+"""Concurrent checkouts of the last units of one product.
+
+Seeds a temporary database like ``load.py``, leaves ``--stock`` units of
+one product, serves ``wsgi:app`` with several gunicorn workers and starts
+``--processes`` client processes. Each logs in as its own user, puts one
+unit in its cart, waits for the others (every other one then opens
+``/checkout``, which reserves stock) and then they all post
+``/api/checkout`` at the same moment.
+
+Fails (exit status 1) unless the final stock is not negative, no more
+orders succeeded than there were units, every accepted checkout has its
+order, and stock + held + sold still adds up to the starting stock.
+
+    python benchmarks/oversell.py --processes 20 --stock 5 --rounds 3
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import shutil
+import sys
+import tempfile
+import threading
+
+from load import Client, _free_port, prepare_database, start_server
+
+
+def shopper(port, index, round_no, product_id, reserve, barrier, results):
+    client = Client(port, random.Random(index), None)
+    if not client.login(index):
+        barrier.abort()  # release the others rather than leave them waiting
+        results.put((index, 'login failed'))
+        return
+    try:
+        client.request('add', 'POST', '/api/cart/add', {'product_id': product_id, 'quantity': 1})
+        # All carts are filled before any reservation takes the stock
+        barrier.wait(timeout=60)
+        if reserve:
+            client.request('reserve', 'GET', '/checkout')
+        barrier.wait(timeout=60)
+    except threading.BrokenBarrierError:
+        results.put((index, 'aborted'))
+        return
+    status, _ = client.request('checkout', 'POST', '/api/checkout',
+                               {'payment_method': 'cod', 'full_name': 'Oversell Test',
+                                'address': '1 Race St', 'city': 'Pune', 'state': 'MH',
+                                'zipcode': '411001', 'phone': '9999999999'},
+                               headers={'Idempotency-Key': f'oversell-{round_no}-{index}'})
+    results.put((index, status))
+
+
+def set_stock(product_id, stock):
+    """Start a round: empty carts and holds, ``stock`` units left."""
+    from app import create_app
+    from models import db, CartItem, Product, StockReservation
+
+    app = create_app()
+    with app.app_context():
+        db.session.execute(db.delete(CartItem))
+        db.session.execute(db.delete(StockReservation))
+        db.session.execute(db.update(Product).where(Product.id == product_id).values(stock=stock))
+        db.session.commit()
+
+
+def tally(product_id):
+    """``(stock, held, sold, orders)`` for the product."""
+    from app import create_app
+    from models import db, OrderItem, Product, StockReservation
+
+    app = create_app()
+    with app.app_context():
+        stock = db.session.get(Product, product_id).stock
+        held = db.session.execute(
+            db.select(db.func.coalesce(db.func.sum(StockReservation.quantity), 0))
+            .where(StockReservation.product_id == product_id)).scalar()
+        sold, orders = db.session.execute(
+            db.select(db.func.coalesce(db.func.sum(OrderItem.quantity), 0), db.func.count(OrderItem.id))
+            .where(OrderItem.product_id == product_id)).one()
+    return stock, held, sold, orders
+
+
+def run_round(port, args, round_no, product_id, context):
+    set_stock(product_id, args.stock)
+    _, _, sold_before, orders_before = tally(product_id)
+    barrier = context.Barrier(args.processes)
+    results = context.Queue()
+    processes = [context.Process(target=shopper,
+                                 args=(port, i, round_no, product_id, i % 2 == 1, barrier, results))
+                 for i in range(args.processes)]
+    for process in processes:
+        process.start()
+    statuses = [results.get(timeout=120)[1] for _ in processes]
+    for process in processes:
+        process.join()
+
+    stock, held, sold, orders = tally(product_id)
+    sold, orders = sold - sold_before, orders - orders_before
+    accepted = statuses.count(200)
+    problems = []
+    if stock < 0:
+        problems.append(f'stock went negative ({stock})')
+    if accepted > args.stock or orders > args.stock:
+        problems.append(f'{accepted} checkouts accepted and {orders} orders for {args.stock} units')
+    if accepted != orders:
+        problems.append(f'{accepted} checkouts accepted but {orders} orders recorded')
+    if stock + held + sold != args.stock:
+        problems.append(f'stock {stock} + held {held} + sold {sold} != {args.stock}')
+    unexpected = sorted({s for s in statuses if s not in (200, 409)}, key=str)
+    if unexpected:
+        problems.append(f'unexpected responses: {unexpected}')
+    print(f'accepted {accepted:>3}  conflicts {statuses.count(409):>3}  '
+          f'stock {stock:>3}  held {held:>3}  sold {sold:>3}')
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--processes', type=int, default=20, help='Concurrent shopper processes.')
+    parser.add_argument('--stock', type=int, default=5, help='Units left of the contested product.')
+    parser.add_argument('--rounds', type=int, default=3)
+    parser.add_argument('--workers', type=int, default=4, help='gunicorn worker processes.')
+    parser.add_argument('--threads', type=int, default=4, help='Threads per gunicorn worker.')
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix='shopeasy-oversell-')
+    env = dict(os.environ,
+               DATABASE_URL=f'sqlite:///{tmp}/bench.db',
+               CACHE_PATH=f'{tmp}/cache.db',
+               SECRET_KEY='benchmark',
+               LOGIN_IP_BURST='100000',  # every shopper logs in from 127.0.0.1
+               PASSWORD_HASH_WORKERS='0',  # all logins at once would fill the hashing queue
+               RAZORPAY_KEY_ID='', RAZORPAY_KEY_SECRET='')
+    problems = []
+    try:
+        product_ids, _ = prepare_database(env, args.processes)
+        port = _free_port()
+        server = start_server(env, port, args.workers, args.threads)
+        context = multiprocessing.get_context('spawn')
+        try:
+            for number in range(1, args.rounds + 1):
+                print(f'round {number}: ', end='', flush=True)
+                problems += run_round(port, args, number, product_ids[0], context)
+        finally:
+            server.terminate()
+            server.wait(timeout=10)
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    for problem in problems:
+        print(f'OVERSELL {problem}')
+    if problems:
+        sys.exit(1)
+    print('No oversell.')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,120 @@
+"""Concurrent read/write throughput of the SQLite profiles in database.py.
+
+Readers run the home page "latest products" query, writers run a
+checkout-shaped transaction (stock decrement + order insert), each in its
+own process like gunicorn workers. Every profile runs against a fresh
+database file.
+
+    python benchmarks/sqlite_profile.py --readers 4 --writers 2 --seconds 5
+"""
+import argparse
+import multiprocessing as mp
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import SQLITE_PROFILES, apply_pragmas  # noqa: E402
+
+PRODUCTS = 5000
+
+
+def _connect(path, pragmas):
+    # timeout=0 so the profile's busy_timeout (if any) is the only waiting
+    conn = sqlite3.connect(path, timeout=0, isolation_level=None)
+    apply_pragmas(conn, pragmas)
+    return conn
+
+
+def _setup(path, pragmas):
+    conn = _connect(path, pragmas)
+    conn.executescript('''
+        CREATE TABLE product (id INTEGER PRIMARY KEY, name TEXT, price REAL,
+                              stock INTEGER, created_at REAL);
+        CREATE INDEX ix_product_created_at ON product (created_at);
+        CREATE TABLE "order" (id INTEGER PRIMARY KEY, product_id INTEGER, created_at REAL);
+    ''')
+    conn.executemany(
+        'INSERT INTO product (name, price, stock, created_at) VALUES (?, ?, ?, ?)',
+        [(f'Product {i}', 100 + i % 900, 10 ** 6, i) for i in range(PRODUCTS)]
+    )
+    conn.close()
+
+
+def _reader(path, pragmas, deadline, results):
+    conn = _connect(path, pragmas)
+    done = errors = 0
+    while time.time() < deadline:
+        try:
+            conn.execute('SELECT * FROM product ORDER BY created_at DESC LIMIT 12').fetchall()
+            done += 1
+        except sqlite3.OperationalError:
+            errors += 1
+    results.put(('read', done, errors))
+
+
+def _writer(path, pragmas, deadline, results):
+    conn = _connect(path, pragmas)
+    done = errors = 0
+    n = 0
+    while time.time() < deadline:
+        n += 1
+        product_id = n % PRODUCTS + 1
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            conn.execute('UPDATE product SET stock = stock - 1 WHERE id = ? AND stock >= 1', (product_id,))
+            conn.execute('INSERT INTO "order" (product_id, created_at) VALUES (?, ?)', (product_id, time.time()))
+            conn.execute('COMMIT')
+            done += 1
+        except sqlite3.OperationalError:
+            errors += 1
+            if conn.in_transaction:
+                conn.execute('ROLLBACK')
+    results.put(('write', done, errors))
+
+
+def run(profile, readers, writers, seconds):
+    pragmas = SQLITE_PROFILES[profile]
+    path = os.path.join(tempfile.mkdtemp(), 'bench.db')
+    _setup(path, pragmas)
+
+    results = mp.Queue()
+    deadline = time.time() + seconds
+    procs = [mp.Process(target=_reader, args=(path, pragmas, deadline, results)) for _ in range(readers)]
+    procs += [mp.Process(target=_writer, args=(path, pragmas, deadline, results)) for _ in range(writers)]
+    for p in procs:
+        p.start()
+    totals = {'read': [0, 0], 'write': [0, 0]}
+    for _ in procs:
+        kind, done, errors = results.get()
+        totals[kind][0] += done
+        totals[kind][1] += errors
+    for p in procs:
+        p.join()
+
+    return {
+        'reads_per_sec': totals['read'][0] / seconds,
+        'writes_per_sec': totals['write'][0] / seconds,
+        'locked_errors': totals['read'][1] + totals['write'][1],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--readers', type=int, default=4)
+    parser.add_argument('--writers', type=int, default=2)
+    parser.add_argument('--seconds', type=float, default=5)
+    parser.add_argument('--profiles', nargs='+', default=list(SQLITE_PROFILES))
+    args = parser.parse_args()
+
+    print(f'{"profile":<12} {"reads/s":>10} {"writes/s":>10} {"locked":>8}')
+    for profile in args.profiles:
+        r = run(profile, args.readers, args.writers, args.seconds)
+        print(f'{profile:<12} {r["reads_per_sec"]:>10.0f} {r["writes_per_sec"]:>10.0f} {r["locked_errors"]:>8}')
+
+
+if __name__ == '__main__':
+    main()
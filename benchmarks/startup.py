@@ -0,0 +1,70 @@
+"""Cold-start cost of the application factory.
+
+Each run imports ``wsgi`` (which calls ``create_app()``) in a fresh
+interpreter, the way a gunicorn worker boots, and reports wall time plus
+the number of SQL statements issued and files created while doing so.
+Both counts should be zero: schema and seed data belong to
+``flask --app app init``.
+
+    python benchmarks/startup.py --runs 10
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CHILD = r'''
+import json, os, sys, time
+sys.path.insert(0, os.getcwd())
+start = time.perf_counter()
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+statements = []
+event.listen(Engine, 'before_cursor_execute', lambda *a: statements.append(a[2]))
+import wsgi
+with wsgi.app.app_context():
+    pass
+print(json.dumps({'seconds': time.perf_counter() - start, 'statements': len(statements)}))
+'''
+
+
+def _snapshot(path):
+    return {os.path.join(d, f) for d, _, files in os.walk(path) for f in files}
+
+
+def run_once(env):
+    before = _snapshot(env['BENCH_DIR'])
+    out = subprocess.run([sys.executable, '-c', CHILD], cwd=ROOT, env=env,
+                         capture_output=True, text=True, check=True)
+    result = json.loads(out.stdout.strip().splitlines()[-1])
+    result['files_created'] = len(_snapshot(env['BENCH_DIR']) - before)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--runs', type=int, default=10)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ,
+                   BENCH_DIR=tmp,
+                   DATABASE_URL=f'sqlite:///{tmp}/startup.db',
+                   CACHE_PATH=f'{tmp}/cache.db')
+        results = [run_once(env) for _ in range(args.runs)]
+
+    times = sorted(r['seconds'] * 1000 for r in results)
+    print(f'runs:           {args.runs}')
+    print(f'median:         {statistics.median(times):.1f} ms')
+    print(f'min / max:      {times[0]:.1f} / {times[-1]:.1f} ms')
+    print(f'SQL statements: {max(r["statements"] for r in results)}')
+    print(f'files created:  {max(r["files_created"] for r in results)}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,254 @@
+"""Checkout and payment verification against a stubbed Razorpay client.
+
+Builds a fresh database in a temporary directory, installs ``StubRazorpay``
+with ``init_payments(app, client)`` and drives ``/checkout`` (which creates
+the Razorpay order) and ``/api/checkout`` through Flask's test client,
+running the queued jobs in-process after each order:
+
+* ``captured``      - a settled payment; the order becomes Paid;
+* ``authorized``    - the job captures the payment, then Paid;
+* ``amount``        - the payment is for the wrong amount; Payment Failed
+                      and the stock is returned;
+* ``signature``     - a forged signature; Payment Failed, stock returned;
+* ``foreign``       - a payment of another Razorpay order; Payment Failed;
+* ``reused``        - a payment that already paid one order, posted for a
+                      second one; Payment Failed, stock returned;
+* ``unknown``       - Razorpay answers 400 for the payment id; Payment
+                      Failed on the first run, stock returned;
+* ``outage``        - Razorpay errors on every attempt; once the job gives
+                      up the order is Payment Failed and its stock returned;
+* ``replay``        - the same ``Idempotency-Key`` twice gives one order
+                      and one verification job;
+* ``free``          - ``payment_method=free`` with something to pay stays
+                      Pending.
+
+Exits with status 1 if any check fails. Needs no network access.
+
+    python benchmarks/verify_payments.py
+"""
+import os
+import shutil
+import sys
+import tempfile
+from datetime import datetime
+from types import SimpleNamespace
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+GOOD_SIGNATURE = 'stub-signature'
+STOCK = 10
+
+
+class StubRazorpay:
+    """The parts of ``razorpay.Client`` that payments.py uses."""
+
+    def __init__(self):
+        self.payments = {}
+        self.orders = {}
+        self.captured = []
+        self.utility = self
+        self.payment = self
+        self.order = SimpleNamespace(create=self.create_order)
+        self.down = set()  # payment ids whose fetch raises ServerError
+
+    def add(self, payment_id, amount, status, order_id, currency='INR'):
+        self.payments[payment_id] = {'id': payment_id, 'order_id': order_id, 'amount': amount,
+                                     'currency': currency, 'status': status}
+
+    # client.order
+    def create_order(self, data):
+        order_id = f'order_stub{len(self.orders) + 1}'
+        self.orders[order_id] = dict(data, id=order_id)
+        return dict(self.orders[order_id])
+
+    # client.utility
+    def verify_payment_signature(self, params):
+        from razorpay.errors import SignatureVerificationError
+        if params['razorpay_signature'] != GOOD_SIGNATURE:
+            raise SignatureVerificationError('Razorpay Signature Verification Failed')
+
+    # client.payment
+    def fetch(self, payment_id):
+        from razorpay.errors import BadRequestError, ServerError
+        if payment_id in self.down:
+            raise ServerError('The server encountered an error')
+        if payment_id not in self.payments:
+            raise BadRequestError('The id provided does not exist')
+        return dict(self.payments[payment_id])
+
+    def capture(self, payment_id, amount, data):
+        payment = self.payments[payment_id]
+        assert payment['status'] == 'authorized' and payment['amount'] == amount
+        payment['status'] = 'captured'
+        self.captured.append(payment_id)
+        return dict(payment)
+
+
+class Checker:
+    def __init__(self, app, stub):
+        from models import db, Product, User
+        self.app = app
+        self.stub = stub
+        self.failures = []
+        self.client = app.test_client()
+        with app.app_context():
+            user = User(username='payer', email='payer@example.com', password_hash='-', is_admin=False)
+            product = Product(name='Stub Tee', description='Test product', price=500, original_price=800,
+                              category='Shirts', stock=STOCK, image='tshirt1.jpg')
+            db.session.add_all([user, product])
+            db.session.commit()
+            self.user_id, self.product_id = user.id, product.id
+        with self.client.session_transaction() as session:
+            session['_user_id'] = str(self.user_id)
+            session['_fresh'] = True
+
+    def check(self, name, condition, detail=''):
+        print(f"{'ok  ' if condition else 'FAIL'} {name}{f' ({detail})' if detail and not condition else ''}")
+        if not condition:
+            self.failures.append(name)
+
+    def stock(self):
+        from models import db, Product
+        with self.app.app_context():
+            return db.session.get(Product, self.product_id).stock
+
+    def order(self, order_id):
+        from models import db, Order
+        with self.app.app_context():
+            order = db.session.get(Order, order_id)
+            return order.status, order.total_amount
+
+    def jobs(self, kind):
+        from models import db, Job
+        with self.app.app_context():
+            return db.session.execute(db.select(db.func.count(Job.id)).where(Job.kind == kind)).scalar()
+
+    def run_jobs(self, retries=False):
+        """Run the due jobs; with ``retries``, also every retry until none is queued."""
+        from jobs import QUEUED, work
+        from models import db, Job
+        with self.app.app_context():
+            work(burst=True, worker='verify-payments')
+            while retries and db.session.execute(db.update(Job).where(Job.status == QUEUED)
+                                                 .values(run_at=datetime.utcnow())).rowcount:
+                db.session.commit()
+                work(burst=True, worker='verify-payments')
+            db.session.commit()
+
+    def checkout(self, **data):
+        """Open the checkout page and place the order: ``(status code, body, key, razorpay order)``."""
+        response = self.client.post('/api/cart/add', json={'product_id': self.product_id, 'quantity': 1})
+        assert response.status_code == 200, response.get_data(as_text=True)
+        response = self.client.get('/checkout')
+        assert response.status_code == 200, response.status_code
+        with self.client.session_transaction() as session:
+            key, razorpay_order = session['razorpay_order']['key'], session['razorpay_order']['id']
+        body = {'full_name': 'Stub Payer', 'address': '1 Test Rd', 'city': 'Pune', 'state': 'MH',
+                'zipcode': '411001', 'phone': '9999999999',
+                'razorpay_order_id': 'order_from_the_client', **data}
+        response = self.client.post('/api/checkout', json=body, headers={'Idempotency-Key': key})
+        return response.status_code, response.get_json(), key, razorpay_order
+
+    def pay(self, name, status, amount=None, signature=GOOD_SIGNATURE, payment_id=None,
+            payment_order=None, retries=False):
+        """Check out one item with a stub payment; returns the final order status.
+
+        The stub payment belongs to the checkout's Razorpay order unless
+        ``payment_order`` names another one; an existing ``payment_id`` is
+        left as it is, and with ``status=None`` Razorpay does not know it.
+        """
+        from payments import amount_due
+        payment_id = payment_id or f'pay_{name}'
+        before = self.stock()
+        code, placed, _, razorpay_order = self.checkout(payment_id=payment_id, razorpay_signature=signature)
+        if code != 200:
+            self.check(f'{name}: checkout accepted', False, f'{code} {placed}')
+            return None, before
+        _, total = self.order(placed['order_id'])
+        if status is not None and payment_id not in self.stub.payments:
+            self.stub.add(payment_id, round(amount_due(total) * 100) if amount is None else amount, status,
+                          order_id=payment_order or razorpay_order)
+        self.check(f'{name}: order starts Processing', placed['status'] == 'Processing', placed['status'])
+        self.run_jobs(retries)
+        final, _ = self.order(placed['order_id'])
+        return final, before
+
+    def run(self):
+        from models import db, SalesRollup
+        status, before = self.pay('captured', 'captured')
+        self.check('captured: order Paid', status == 'Paid', status)
+        self.check('captured: stock stays taken', self.stock() == before - 1, self.stock())
+        with self.app.app_context():
+            rollups = db.session.execute(db.select(db.func.count()).select_from(SalesRollup)).scalar()
+        self.check('captured: order_paid recorded the rollup', rollups > 0, rollups)
+
+        status, _ = self.pay('authorized', 'authorized')
+        self.check('authorized: payment captured', 'pay_authorized' in self.stub.captured, self.stub.captured)
+        self.check('authorized: order Paid', status == 'Paid', status)
+
+        status, before = self.pay('amount', 'captured', amount=100)
+        self.check('amount mismatch: order Payment Failed', status == 'Payment Failed', status)
+        self.check('amount mismatch: stock returned', self.stock() == before, self.stock())
+
+        status, before = self.pay('signature', 'captured', signature='forged')
+        self.check('bad signature: order Payment Failed', status == 'Payment Failed', status)
+        self.check('bad signature: stock returned', self.stock() == before, self.stock())
+
+        status, before = self.pay('foreign', 'captured', payment_order='order_someone_else')
+        self.check('foreign order: order Payment Failed', status == 'Payment Failed', status)
+        self.check('foreign order: stock returned', self.stock() == before, self.stock())
+
+        status, _ = self.pay('once', 'captured')
+        self.check('reused: first order Paid', status == 'Paid', status)
+        status, before = self.pay('again', 'captured', payment_id='pay_once')
+        self.check('reused: second order Payment Failed', status == 'Payment Failed', status)
+        self.check('reused: stock returned', self.stock() == before, self.stock())
+
+        status, before = self.pay('unknown', None)
+        self.check('unknown payment: order Payment Failed', status == 'Payment Failed', status)
+        self.check('unknown payment: stock returned', self.stock() == before, self.stock())
+
+        self.stub.down.add('pay_outage')
+        status, before = self.pay('outage', 'captured', retries=True)
+        self.check('outage: order Payment Failed once the job gives up', status == 'Payment Failed', status)
+        self.check('outage: stock returned', self.stock() == before, self.stock())
+
+        verify_jobs = self.jobs('verify_payment')
+        _, first, key, _ = self.checkout(payment_id='pay_replay', razorpay_signature=GOOD_SIGNATURE)
+        second = self.client.post('/api/checkout', json={'payment_id': 'pay_replay'},
+                                  headers={'Idempotency-Key': key}).get_json()
+        self.check('replay: same order returned', second['order_id'] == first['order_id'], second)
+        self.check('replay: flagged as replayed', second['replayed'] and not first['replayed'], second)
+        self.check('replay: one verification job', self.jobs('verify_payment') == verify_jobs + 1,
+                   self.jobs('verify_payment'))
+
+        _, placed, _, _ = self.checkout(payment_method='free')
+        self.check('free: order with a total stays Pending', placed['status'] == 'Pending', placed['status'])
+        return not self.failures
+
+
+def main():
+    tmp = tempfile.mkdtemp(prefix='shopeasy-payments-')
+    os.environ.update(DATABASE_URL=f'sqlite:///{tmp}/payments.db', CACHE_PATH=f'{tmp}/cache.db',
+                      SECRET_KEY='verify-payments', PASSWORD_HASH_WORKERS='0',
+                      RAZORPAY_KEY_ID='', RAZORPAY_KEY_SECRET='')
+    try:
+        from app import create_app
+        from migrations import upgrade
+        from payments import init_payments
+
+        app = create_app()
+        stub = StubRazorpay()
+        init_payments(app, stub)
+        with app.app_context():
+            upgrade()
+        ok = Checker(app, stub).run()
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+    print('All payment checks passed.' if ok else 'Payment checks FAILED.')
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,282 @@
+"""Faceted category browsing.
+
+``browse_products()`` filters a category by price range, stock, discount
+and size, sorts it by newest, price or discount, and pages with an opaque
+cursor.
+Each sort has a covering index on ``product`` led by ``category`` (see
+``models.Product``), so a page is one index range scan for the ids plus a
+primary-key lookup for the rows shown, however large the category is.
+
+``Product.discount_pct`` stores the discount percentage so it can be
+indexed; it is set by mapper events on every ORM insert/update, and
+``refresh_discounts`` recomputes it after bulk Core writes.
+
+Facet counts (products per category and per price bucket) live in
+``category_facet``. Mapper events add and subtract as products are
+created, edited or deleted, in the same transaction, so pages read a few
+rows instead of grouping the product table. Bulk writers call
+``rebuild_facets`` instead.
+"""
+import re
+from datetime import datetime
+
+from sqlalchemy import event, inspect, text
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import load_only
+
+from cache import get_cache, get_version
+from models import db, CategoryFacet, Product
+from pagination import DEFAULT_LIMIT, value_page
+
+# Lower bounds of the price buckets shown as facets; the last one is open-ended
+PRICE_BUCKETS = (0, 500, 1000, 2000, 5000)
+
+SORTS = {
+    # name: (column, descending)
+    'newest': (Product.created_at, True),
+    'price_asc': (Product.price, False),
+    'price_desc': (Product.price, True),
+    'discount': (Product.discount_pct, True),
+}
+SORT_LABELS = {
+    'newest': 'Newest',
+    'price_asc': 'Price: low to high',
+    'price_desc': 'Price: high to low',
+    'discount': 'Biggest discount',
+}
+DEFAULT_SORT = 'newest'
+
+FACET_CACHE_TIMEOUT = 3600
+
+_SIZE_RE = re.compile(r'^[A-Za-z0-9.+-]{1,20}$')
+
+DISCOUNT_SQL = ('CASE WHEN original_price > price '
+                'THEN CAST((original_price - price) / original_price * 100 AS INTEGER) ELSE 0 END')
+
+
+class InvalidFilter(ValueError):
+    pass
+
+
+def discount_pct(price, original_price):
+    """Same rounding as ``Product.discount_percent`` and ``DISCOUNT_SQL``."""
+    if original_price and price is not None and original_price > price:
+        return int((original_price - price) / original_price * 100)
+    return 0
+
+
+def price_bucket(price):
+    bucket = PRICE_BUCKETS[0]
+    for bound in PRICE_BUCKETS:
+        if price is not None and price >= bound:
+            bucket = bound
+    return bucket
+
+
+def bucket_label(bucket):
+    index = PRICE_BUCKETS.index(bucket)
+    if index + 1 < len(PRICE_BUCKETS):
+        return f'₹{bucket}–{PRICE_BUCKETS[index + 1] - 1}'
+    return f'₹{bucket}+'
+
+
+# ──────────────── QUERY ────────────────
+
+def _number(args, name, cast=float, low=0, high=None):
+    value = args.get(name)
+    if value in (None, ''):
+        return None
+    try:
+        value = cast(value)
+    except ValueError:
+        raise InvalidFilter(f'{name} must be a number')
+    if value < low or (high is not None and value > high):
+        raise InvalidFilter(f'{name} is out of range')
+    return value
+
+
+def parse_filters(args):
+    """Validate browse filters from query args; raises ``InvalidFilter``."""
+    filters = {
+        'min_price': _number(args, 'min_price'),
+        'max_price': _number(args, 'max_price'),
+        'min_discount': _number(args, 'min_discount', int, 0, 100),
+        'in_stock': args.get('in_stock', '').lower() in ('1', 'true', 'yes', 'on'),
+        'size': args.get('size') or None,
+        'sort': args.get('sort') or DEFAULT_SORT,
+    }
+    if filters['sort'] not in SORTS:
+        raise InvalidFilter(f"sort must be one of: {', '.join(SORTS)}")
+    if filters['size'] and not _SIZE_RE.match(filters['size']):
+        raise InvalidFilter('Invalid size')
+    return filters
+
+
+def browse_products(category=None, min_price=None, max_price=None, in_stock=False, min_discount=None,
+                    size=None, sort=DEFAULT_SORT, limit=DEFAULT_LIMIT, cursor=None, fields=None):
+    """Return ``(products, next_cursor)`` for one page of a filtered listing.
+
+    Raises ``pagination.InvalidCursor`` for a bad cursor. ``fields`` limits
+    the columns loaded, as for ``/api/products``.
+    """
+    sort_col, descending = SORTS[sort]
+    # Deferred join: page through (id, sort value) in the covering index,
+    # then load only the rows on this page.
+    ids = db.select(Product.id, sort_col)
+    if category:
+        ids = ids.where(Product.category == category)
+    if min_price is not None:
+        ids = ids.where(Product.price >= min_price)
+    if max_price is not None:
+        ids = ids.where(Product.price <= max_price)
+    if in_stock:
+        ids = ids.where(Product.stock > 0)
+    if min_discount:
+        ids = ids.where(Product.discount_pct >= min_discount)
+    if size:
+        ids = ids.where((',' + Product.sizes + ',').like(f'%,{size},%'))
+
+    parse = datetime.fromisoformat if sort == 'newest' else None
+    rows, next_cursor = value_page(ids, sort_col, Product.id, limit, cursor, descending, parse)
+    if not rows:
+        return [], None
+
+    query = Product.query.filter(Product.id.in_([row[0] for row in rows]))
+    if fields:
+        query = query.options(load_only(*Product.columns_for(fields)))
+    by_id = {product.id: product for product in query}
+    return [by_id[row[0]] for row in rows if row[0] in by_id], next_cursor
+
+
+# ──────────────── FACETS ────────────────
+
+def _load_facets():
+    rows = db.session.execute(
+        db.select(CategoryFacet.category, CategoryFacet.price_bucket, CategoryFacet.products)
+        .where(CategoryFacet.products > 0)
+        .order_by(CategoryFacet.category, CategoryFacet.price_bucket)
+    ).all()
+    facets = {}
+    for category, bucket, products in rows:
+        facets.setdefault(category, {})[bucket] = products
+    return facets
+
+
+def get_facets():
+    """``{category: {price_bucket: products}}``, cached per catalog version."""
+    cache = get_cache()
+    key = f'browse:facets:{get_version("catalog")}'
+    facets = cache.get(key)
+    if facets is None:
+        facets = _load_facets()
+        cache.set(key, facets, timeout=FACET_CACHE_TIMEOUT)
+    # JSON-backed caches turn the integer bucket keys into strings
+    return {category: {int(bucket): n for bucket, n in buckets.items()} for category, buckets in facets.items()}
+
+
+def category_counts(facets=None):
+    """``{category: products}`` in name order."""
+    facets = get_facets() if facets is None else facets
+    return {category: sum(buckets.values()) for category, buckets in sorted(facets.items())}
+
+
+def price_facets(category, facets=None):
+    """``[(bucket, label, products), ...]`` for the non-empty buckets of ``category``."""
+    facets = get_facets() if facets is None else facets
+    buckets = facets.get(category, {})
+    return [(bucket, bucket_label(bucket), buckets[bucket]) for bucket in PRICE_BUCKETS if buckets.get(bucket)]
+
+
+def bucket_range(bucket):
+    """``(min_price, max_price)`` covering one price bucket."""
+    index = PRICE_BUCKETS.index(bucket)
+    upper = PRICE_BUCKETS[index + 1] - 0.01 if index + 1 < len(PRICE_BUCKETS) else None
+    return bucket, upper
+
+
+def _bucket_sql():
+    cases = ' '.join(f'WHEN price >= {bound} THEN {bound}' for bound in reversed(PRICE_BUCKETS[1:]))
+    return f'CASE {cases} ELSE {PRICE_BUCKETS[0]} END'
+
+
+def rebuild_facets(conn):
+    """Recount every facet from the product table."""
+    conn.execute(text('DELETE FROM category_facet'))
+    conn.execute(text(
+        f'INSERT INTO category_facet (category, price_bucket, products) '
+        f'SELECT category, {_bucket_sql()} AS bucket, count(*) FROM product GROUP BY category, bucket'
+    ))
+
+
+def refresh_discounts(conn, ids=None):
+    """Recompute ``discount_pct`` after Core writes (for ``ids``, or every product)."""
+    sql = f'UPDATE product SET discount_pct = {DISCOUNT_SQL}'
+    if ids is None:
+        conn.execute(text(sql))
+        return
+    ids = list(ids)
+    for start in range(0, len(ids), 500):
+        chunk = ids[start:start + 500]
+        conn.execute(
+            Product.__table__.update().where(Product.__table__.c.id.in_(chunk))
+            .values(discount_pct=text(DISCOUNT_SQL))
+        )
+
+
+# ──────────────── MAINTENANCE ────────────────
+
+def _adjust(connection, changes):
+    """Add ``{(category, bucket): delta}`` onto the facet rows."""
+    rows = [{'category': category, 'price_bucket': bucket, 'products': delta}
+            for (category, bucket), delta in changes.items() if delta]
+    if not rows:
+        return
+    insert = postgresql.insert if connection.dialect.name == 'postgresql' else sqlite.insert
+    table = CategoryFacet.__table__
+    stmt = insert(table)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=['category', 'price_bucket'],
+        set_={'products': table.c.products + stmt.excluded.products},
+    )
+    connection.execute(stmt, rows)
+
+
+@event.listens_for(Product, 'before_insert')
+@event.listens_for(Product, 'before_update')
+def _set_discount(mapper, connection, target):
+    target.discount_pct = discount_pct(target.price, target.original_price)
+
+
+@event.listens_for(Product, 'after_insert')
+def _product_inserted(mapper, connection, target):
+    _adjust(connection, {(target.category, price_bucket(target.price)): 1})
+
+
+def _previous(state, column):
+    history = state.attrs[column].history
+    if not history.has_changes():
+        return getattr(state.object, column), True
+    if history.deleted:
+        return history.deleted[0], True
+    return None, False  # changed without the old value ever being loaded
+
+
+@event.listens_for(Product, 'after_update')
+def _product_updated(mapper, connection, target):
+    state = inspect(target)
+    if not any(state.attrs[col].history.has_changes() for col in ('category', 'price')):
+        return
+    old_category, known_category = _previous(state, 'category')
+    old_price, known_price = _previous(state, 'price')
+    if not (known_category and known_price):
+        rebuild_facets(connection)
+        return
+    changes = {(old_category, price_bucket(old_price)): -1}
+    key = (target.category, price_bucket(target.price))
+    changes[key] = changes.get(key, 0) + 1
+    _adjust(connection, changes)
+
+
+@event.listens_for(Product, 'after_delete')
+def _product_deleted(mapper, connection, target):
+    _adjust(connection, {(target.category, price_bucket(target.price)): -1})
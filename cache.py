@@ -0,0 +1,174 @@
+"""Small key/value cache shared by the routes.
+
+Two backends, picked with ``CACHE_TYPE``:
+
+* ``sqlite`` (default) - a separate SQLite file, so every gunicorn worker
+  sees the same entries and an invalidation in one worker is seen by all.
+* ``memory`` - a per-process dict, for tests and single-worker runs.
+
+``null`` disables caching. Values must be JSON-serialisable.
+
+Version stamps (``get_version``/``bump_version``) let callers key entries
+by a namespace version, so invalidating everything derived from e.g. the
+catalogue is a single write instead of a key scan.
+"""
+import json
+import os
+import random
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from flask import current_app
+
+
+class NullCache:
+    def get(self, key):
+        return None
+
+    def set(self, key, value, timeout=None):
+        pass
+
+    def delete(self, *keys):
+        pass
+
+    def clear(self):
+        pass
+
+
+class MemoryCache:
+    """Thread-safe in-process cache with TTL and LRU eviction."""
+
+    def __init__(self, default_timeout=300, max_entries=10000):
+        self.default_timeout = default_timeout
+        self.max_entries = max_entries
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires and expires < time.time():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, timeout=None):
+        timeout = self.default_timeout if timeout is None else timeout
+        expires = time.time() + timeout if timeout else 0
+        with self._lock:
+            self._data[key] = (expires, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def delete(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class SQLiteCache:
+    """Cache stored in its own SQLite file, shared between processes."""
+
+    # Fraction of writes that also purge expired rows
+    PRUNE_PROBABILITY = 0.01
+
+    def __init__(self, path, default_timeout=300):
+        self.path = path
+        self.default_timeout = default_timeout
+        self._local = threading.local()
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or getattr(self._local, 'pid', None) != os.getpid():
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS cache '
+                '(key TEXT PRIMARY KEY, value TEXT NOT NULL, expires REAL NOT NULL)'
+            )
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def get(self, key):
+        row = self._conn().execute(
+            'SELECT value, expires FROM cache WHERE key = ?', (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        value, expires = row
+        if expires and expires < time.time():
+            return None
+        return json.loads(value)
+
+    def set(self, key, value, timeout=None):
+        timeout = self.default_timeout if timeout is None else timeout
+        expires = time.time() + timeout if timeout else 0
+        self._conn().execute(
+            'INSERT OR REPLACE INTO cache (key, value, expires) VALUES (?, ?, ?)',
+            (key, json.dumps(value), expires)
+        )
+        if random.random() < self.PRUNE_PROBABILITY:
+            self.prune()
+
+    def prune(self):
+        self._conn().execute(
+            'DELETE FROM cache WHERE expires > 0 AND expires < ?', (time.time(),)
+        )
+
+    def delete(self, *keys):
+        if keys:
+            self._conn().executemany('DELETE FROM cache WHERE key = ?', [(k,) for k in keys])
+
+    def clear(self):
+        self._conn().execute('DELETE FROM cache')
+
+
+def init_cache(app):
+    cache_type = app.config.get('CACHE_TYPE', 'sqlite')
+    timeout = app.config.get('CACHE_DEFAULT_TIMEOUT', 300)
+    if cache_type == 'sqlite':
+        cache = SQLiteCache(app.config['CACHE_PATH'], default_timeout=timeout)
+    elif cache_type == 'memory':
+        cache = MemoryCache(default_timeout=timeout)
+    else:
+        cache = NullCache()
+    app.extensions['shopeasy_cache'] = cache
+    return cache
+
+
+def get_cache():
+    return current_app.extensions['shopeasy_cache']
+
+
+def get_version(namespace):
+    """Current version token of ``namespace``, created on first use."""
+    cache = get_cache()
+    key = f'version:{namespace}'
+    version = cache.get(key)
+    if version is None:
+        version = uuid.uuid4().hex[:12]
+        cache.set(key, version, timeout=0)
+    return version
+
+
+def bump_version(namespace):
+    """Invalidate every entry keyed by the namespace's current version."""
+    get_cache().set(f'version:{namespace}', uuid.uuid4().hex[:12], timeout=0)
@@ -0,0 +1,198 @@
+"""Cart loading shared by the cart, checkout and cart API routes.
+
+``CartItem.product`` is a lazy relationship, so iterating a cart and
+touching ``item.product`` costs one SELECT per line. Everything here loads
+the products in the same query, or aggregates in SQL when only the totals
+are needed.
+
+``get_cart_summary`` backs the cart badge. It is cached per user and must
+be invalidated with ``invalidate_cart`` after any committed cart change.
+The key also carries the ``catalog`` version, so price edits and product
+deletes (which take cart lines with them) show up at once.
+"""
+from sqlalchemy.orm import contains_eager
+
+from cache import get_cache, get_version
+from models import db, CartItem, Product
+
+SUMMARY_TIMEOUT = 600
+
+
+def get_cart_items(user_id):
+    """Return the user's cart lines with ``product`` already populated."""
+    return (
+        CartItem.query
+        .join(CartItem.product)
+        .options(contains_eager(CartItem.product))
+        .filter(CartItem.user_id == user_id)
+        .order_by(CartItem.added_at, CartItem.id)
+        .all()
+    )
+
+
+def items_total(cart_items):
+    """Total price of already-loaded cart lines."""
+    return sum(item.product.price * item.quantity for item in cart_items)
+
+
+def cart_summary(user_id):
+    """Return ``{'count': ..., 'total': ...}`` from a single aggregate query."""
+    count, total = (
+        db.session.query(
+            db.func.coalesce(db.func.sum(CartItem.quantity), 0),
+            db.func.coalesce(db.func.sum(CartItem.quantity * Product.price), 0.0)
+        )
+        .join(Product, Product.id == CartItem.product_id)
+        .filter(CartItem.user_id == user_id)
+        .one()
+    )
+    return {'count': int(count), 'total': float(total)}
+
+
+def _summary_key(user_id):
+    return f"cart_summary:{user_id}:{get_version('catalog')}"
+
+
+def get_cart_summary(user_id):
+    """Cached ``cart_summary``."""
+    cache = get_cache()
+    key = _summary_key(user_id)
+    summary = cache.get(key)
+    if summary is None:
+        summary = cart_summary(user_id)
+        cache.set(key, summary, timeout=SUMMARY_TIMEOUT)
+    return summary
+
+
+def invalidate_cart(user_id):
+    get_cache().delete(_summary_key(user_id))
+
+
+# ──────────────── BATCH OPERATIONS ────────────────
+
+MAX_BATCH_OPERATIONS = 50
+
+
+class CartBatchError(Exception):
+    """Raised with one ``{'index', 'message'}`` entry per rejected operation."""
+
+    def __init__(self, errors):
+        super().__init__('Invalid cart operations')
+        self.errors = errors
+
+
+def _int(value, name):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise ValueError(f'{name} must be an integer')
+
+
+def batch_product_ids(operations):
+    """Ids of the products that ``add`` operations refer to, skipping malformed ones."""
+    ids = set()
+    for op in operations if isinstance(operations, list) else ():
+        if isinstance(op, dict) and op.get('op') == 'add':
+            try:
+                ids.add(_int(op.get('product_id'), 'product_id'))
+            except ValueError:
+                pass
+    return ids
+
+
+def apply_to_lines(lines, operations, products, new_line, max_lines=None, max_quantity=None):
+    """Validate ``add``/``update``/``remove`` operations and apply them to ``lines``.
+
+    Shared by the signed-in and guest carts so both accept exactly the same
+    operations. ``lines`` is a list of ``CartItem``-like lines (``id``,
+    ``product_id``, ``size``, ``quantity``) changed in place, ``products``
+    maps product ids to the products of the lines and of the ``add``
+    operations, and ``new_line(product, size)`` makes an empty line.
+    ``max_lines``/``max_quantity`` optionally cap the cart.
+
+    Operations are applied in order, so an ``update`` after an ``add`` of
+    the same line sees the added quantity. Raises ``CartBatchError`` with
+    every invalid operation, leaving ``lines`` partly changed.
+    """
+    if not isinstance(operations, list) or not operations:
+        raise CartBatchError([{'index': None, 'message': 'operations must be a non-empty list'}])
+    if len(operations) > MAX_BATCH_OPERATIONS:
+        raise CartBatchError([{'index': None, 'message': f'At most {MAX_BATCH_OPERATIONS} operations per batch'}])
+
+    def capped(quantity):
+        return min(quantity, max_quantity) if max_quantity else quantity
+
+    by_key = {(line.product_id, line.size): line for line in lines}
+    errors = []
+    for index, op in enumerate(operations):
+        try:
+            kind = op.get('op') if isinstance(op, dict) else None
+            if kind == 'add':
+                product = products.get(_int(op.get('product_id'), 'product_id'))
+                quantity = _int(op.get('quantity', 1), 'quantity')
+                size = op.get('size') or None
+                if product is None:
+                    raise ValueError('Product not found')
+                if quantity < 1:
+                    raise ValueError('quantity must be at least 1')
+                if product.stock < quantity:
+                    raise ValueError(f'Not enough stock for {product.name}')
+                line = by_key.get((product.id, size))
+                if line is None:
+                    if max_lines and len(lines) >= max_lines:
+                        raise ValueError(f'A cart holds at most {max_lines} lines')
+                    line = by_key[(product.id, size)] = new_line(product, size)
+                    lines.append(line)
+                line.quantity = capped(line.quantity + quantity)
+            elif kind in ('update', 'remove'):
+                item_id = _int(op.get('item_id'), 'item_id')
+                line = next((l for l in lines if l.id is not None and l.id == item_id), None)
+                if line is None:
+                    raise ValueError('Cart item not found')
+                quantity = 0 if kind == 'remove' else _int(op.get('quantity'), 'quantity')
+                product = products.get(line.product_id)
+                if product is not None and quantity > product.stock:
+                    raise ValueError(f'Not enough stock for {product.name}')
+                if quantity <= 0:
+                    lines.remove(line)
+                    by_key.pop((line.product_id, line.size), None)
+                else:
+                    line.quantity = capped(quantity)
+            else:
+                raise ValueError("op must be 'add', 'update' or 'remove'")
+        except ValueError as e:
+            errors.append({'index': index, 'message': str(e)})
+
+    if errors:
+        raise CartBatchError(errors)
+    return lines
+
+
+def apply_cart_operations(user_id, operations):
+    """Apply cart operations (see ``apply_to_lines``) to the user's cart.
+
+    Either every operation is valid and the session is ready to commit, or
+    ``CartBatchError`` is raised and the caller must roll back. Returns the
+    resulting cart lines with their products.
+    """
+    with db.session.no_autoflush:
+        lines = get_cart_items(user_id)
+        original = list(lines)
+        products = {line.product_id: line.product for line in lines}
+        add_ids = batch_product_ids(operations) - set(products)
+        if add_ids:
+            products.update((p.id, p) for p in Product.query.filter(Product.id.in_(add_ids)))
+
+        def new_line(product, size):
+            return CartItem(user_id=user_id, product_id=product.id, quantity=0, size=size, product=product)
+
+        apply_to_lines(lines, operations, products, new_line)
+
+    kept = set(map(id, lines))
+    for line in original:
+        if id(line) not in kept:
+            db.session.delete(line)
+    for line in lines:
+        if line.id is None:
+            db.session.add(line)
+    return lines
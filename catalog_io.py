@@ -0,0 +1,314 @@
+"""Bulk catalogue import and export.
+
+Imports read CSV (with a header row) or JSON Lines one record at a time and
+write them in chunks of ``CHUNK_SIZE``: each chunk resolves its keys with
+one SELECT, inserts new products and updates existing ones with
+executemany, refreshes their discount and search index rows and commits. A
+bad record is reported with its line number and skipped; it never aborts
+the file. Browse facet counts are recounted and cached product pages
+invalidated once the file is done.
+
+Records are matched on ``sku``, or on ``id`` when there is no sku (use that
+to update products created through the admin form). On update, empty or
+missing fields keep their current value.
+
+Exports stream every product as CSV or JSON Lines from a generator, so
+memory stays flat however large the catalogue is.
+
+    flask --app app catalog import products.csv
+    flask --app app catalog export --format jsonl > products.jsonl
+"""
+import codecs
+import csv
+import io
+import json
+import sys
+
+import click
+from flask.cli import AppGroup, with_appcontext
+from sqlalchemy import event
+
+import browse
+import search
+from models import db, Product
+from product_cache import invalidate_products
+
+CHUNK_SIZE = 1000
+EXPORT_BATCH = 1000
+MAX_REPORTED_ERRORS = 1000
+FORMATS = ('csv', 'jsonl')
+
+# Importable fields, in export column order
+FIELDS = ('id', 'sku', 'name', 'description', 'price', 'original_price', 'category',
+          'stock', 'featured', 'image', 'highlights', 'sizes')
+MAX_LENGTHS = {'sku': 64, 'name': 200, 'category': 100, 'image': 300, 'sizes': 200}
+DEFAULTS = {'description': '', 'original_price': None, 'category': 'General', 'stock': 0,
+            'featured': False, 'image': 'default.jpg', 'highlights': None, 'sizes': None}
+TRUE_VALUES = {'1', 'true', 'yes', 'y', 'on'}
+FALSE_VALUES = {'0', 'false', 'no', 'n', 'off'}
+
+
+class ImportReport:
+    def __init__(self):
+        self.inserted = 0
+        self.updated = 0
+        self.failed = 0
+        self.errors = []
+
+    def error(self, line, message):
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({'line': line, 'message': message})
+
+    def to_dict(self):
+        return {
+            'inserted': self.inserted,
+            'updated': self.updated,
+            'failed': self.failed,
+            'errors': sorted(self.errors, key=lambda error: error['line']),
+            'errors_truncated': self.failed > len(self.errors),
+        }
+
+
+@event.listens_for(Product, 'after_insert')
+def _assign_sku(mapper, connection, target):
+    """Products created through the ORM (admin form, seed data) get ``SE-<id>``."""
+    if target.sku is None:
+        target.sku = f'SE-{target.id}'
+        connection.execute(
+            Product.__table__.update().where(Product.__table__.c.id == target.id).values(sku=target.sku)
+        )
+
+
+# ──────────────── PARSING ────────────────
+
+def detect_format(filename, mimetype=None):
+    name = (filename or '').lower()
+    if name.endswith(('.jsonl', '.ndjson')) or 'ndjson' in (mimetype or '') or 'jsonl' in (mimetype or ''):
+        return 'jsonl'
+    return 'csv'
+
+
+def iter_records(stream, fmt):
+    """Yield ``(line_number, record_or_None, error_or_None)`` from a binary stream."""
+    text = codecs.getreader('utf-8-sig')(stream, errors='replace')
+    if fmt == 'jsonl':
+        for line_no, line in enumerate(text, start=1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError as e:
+                yield line_no, None, f'Invalid JSON: {e}'
+                continue
+            if not isinstance(record, dict):
+                yield line_no, None, 'Each line must be a JSON object'
+                continue
+            yield line_no, record, None
+        return
+
+    reader = csv.DictReader(text)
+    unknown = [name for name in (reader.fieldnames or []) if name and name.strip() not in FIELDS]
+    if unknown:
+        yield 1, None, f"Unknown columns: {', '.join(unknown)}"
+        return
+    for record in reader:
+        yield reader.line_num, {k.strip(): v for k, v in record.items() if k}, None
+
+
+def _blank(value):
+    return value is None or (isinstance(value, str) and not value.strip())
+
+
+def clean_record(record):
+    """Validate one record. Returns ``(values, error)``; blank fields are omitted."""
+    unknown = [key for key in record if key not in FIELDS]
+    if unknown:
+        return None, f"Unknown fields: {', '.join(unknown)}"
+
+    values = {}
+    for field, raw in record.items():
+        if _blank(raw):
+            continue
+        value = raw.strip() if isinstance(raw, str) else raw
+        try:
+            if field in ('id', 'stock'):
+                value = int(value)
+                if value < 0:
+                    return None, f'{field} must not be negative'
+            elif field in ('price', 'original_price'):
+                value = float(value)
+                if value < 0:
+                    return None, f'{field} must not be negative'
+            elif field == 'featured':
+                if not isinstance(value, bool):
+                    flag = str(value).lower()
+                    if flag not in TRUE_VALUES | FALSE_VALUES:
+                        return None, f'featured must be one of {", ".join(sorted(TRUE_VALUES | FALSE_VALUES))}'
+                    value = flag in TRUE_VALUES
+            else:
+                value = str(value)
+                if len(value) > MAX_LENGTHS.get(field, len(value)):
+                    return None, f'{field} is longer than {MAX_LENGTHS[field]} characters'
+        except (TypeError, ValueError):
+            return None, f'{field} is not a valid number'
+        values[field] = value
+
+    if 'sku' not in values and 'id' not in values:
+        return None, 'sku (or id) is required'
+    return values, None
+
+
+# ──────────────── IMPORT ────────────────
+
+def _write_chunk(chunk, report):
+    """Insert/update one chunk of ``(line, values)`` and commit it."""
+    product = Product.__table__
+    skus = {values['sku'] for _, values in chunk if 'sku' in values}
+    ids = {values['id'] for _, values in chunk if 'sku' not in values}
+    by_sku, known_ids = {}, set()
+    if skus:
+        by_sku = dict(db.session.execute(
+            db.select(product.c.sku, product.c.id).where(product.c.sku.in_(skus))).all())
+    if ids:
+        known_ids = set(db.session.execute(
+            db.select(product.c.id).where(product.c.id.in_(ids))).scalars())
+
+    inserts, updates = {}, {}  # keyed so a repeated sku/id keeps its last record
+    for line, values in chunk:
+        values = dict(values)
+        if 'sku' in values:
+            values.pop('id', None)
+            product_id = by_sku.get(values['sku'])
+        else:
+            product_id = values.pop('id')
+            if product_id not in known_ids:
+                report.error(line, f'No product with id {product_id}')
+                continue
+        if product_id is None:
+            missing = [f for f in ('name', 'price') if f not in values]
+            if missing:
+                report.error(line, f"New product needs {', '.join(missing)}")
+                continue
+            inserts[values['sku']] = (line, {**DEFAULTS, **values})
+        else:
+            updates[product_id] = (line, values)
+
+    # executemany needs the same columns in every row, so group updates by column set
+    groups = {}
+    for product_id, (line, values) in updates.items():
+        groups.setdefault(tuple(sorted(values)), []).append(
+            {'b_id': product_id, **{f'v_{column}': value for column, value in values.items()}})
+
+    try:
+        if inserts:
+            db.session.execute(product.insert(), [values for _, values in inserts.values()])
+        for columns, rows in groups.items():
+            if not columns:
+                continue
+            db.session.execute(
+                product.update().where(product.c.id == db.bindparam('b_id'))
+                .values({column: db.bindparam(f'v_{column}') for column in columns}),
+                rows
+            )
+        touched = set(updates)
+        if inserts:
+            touched.update(db.session.execute(
+                db.select(product.c.id).where(product.c.sku.in_(list(inserts)))).scalars())
+        browse.refresh_discounts(db.session.connection(), touched)
+        search.reindex_products(db.session.connection(), touched)
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        first = min(line for line, _ in chunk)
+        last = max(line for line, _ in chunk)
+        report.failed += len(inserts) + len(updates)
+        report.errors.append({'line': first, 'message': f'Lines {first}-{last} not saved: {e}'})
+        return
+    report.inserted += len(inserts)
+    report.updated += len(updates)
+
+
+def import_products(stream, fmt='csv', chunk_size=CHUNK_SIZE):
+    """Import a CSV/JSONL byte stream. Returns an ``ImportReport``."""
+    report = ImportReport()
+    chunk = []
+    for line, record, error in iter_records(stream, fmt):
+        if error is None:
+            record, error = clean_record(record)
+        if error:
+            report.error(line, error)
+            continue
+        chunk.append((line, record))
+        if len(chunk) >= chunk_size:
+            _write_chunk(chunk, report)
+            chunk = []
+    if chunk:
+        _write_chunk(chunk, report)
+    if report.inserted or report.updated:
+        browse.rebuild_facets(db.session.connection())
+        db.session.commit()
+    if report.updated:
+        invalidate_products()
+    return report
+
+
+# ──────────────── EXPORT ────────────────
+
+def _export_rows():
+    columns = [getattr(Product.__table__.c, field) for field in FIELDS]
+    result = db.session.execute(
+        db.select(*columns).order_by(Product.id).execution_options(yield_per=EXPORT_BATCH)
+    )
+    for partition in result.partitions():
+        yield from partition
+
+
+def export_products(fmt='csv'):
+    """Yield the whole catalogue as CSV or JSONL text, a batch of rows at a time."""
+    if fmt == 'jsonl':
+        for row in _export_rows():
+            yield json.dumps(dict(zip(FIELDS, row)), ensure_ascii=False) + '\n'
+        return
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(FIELDS)
+    for count, row in enumerate(_export_rows(), start=1):
+        writer.writerow(['' if value is None else value for value in row])
+        if count % EXPORT_BATCH == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+# ──────────────── CLI ────────────────
+
+catalog_cli = AppGroup('catalog', help='Bulk catalogue import/export.')
+
+
+@catalog_cli.command('import')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--format', 'fmt', type=click.Choice(FORMATS), help='Defaults to the file extension.')
+@click.option('--chunk-size', default=CHUNK_SIZE, show_default=True)
+@with_appcontext
+def import_command(path, fmt, chunk_size):
+    """Insert or update products from a CSV or JSONL file."""
+    with open(path, 'rb') as f:
+        report = import_products(f, fmt or detect_format(path), chunk_size)
+    if report.inserted or report.updated:
+        from routes import catalog_changed
+        catalog_changed()
+    for error in report.errors:
+        click.echo(f"line {error['line']}: {error['message']}", err=True)
+    click.echo(f'Inserted {report.inserted}, updated {report.updated}, failed {report.failed}.')
+
+
+@catalog_cli.command('export')
+@click.option('--format', 'fmt', type=click.Choice(FORMATS), default='csv', show_default=True)
+@with_appcontext
+def export_command(fmt):
+    """Write every product to stdout."""
+    for chunk in export_products(fmt):
+        sys.stdout.write(chunk)
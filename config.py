@@ -1,17 +1,73 @@
 import os
+from database import database_url
 
 class Config:
     """Application configuration."""
     SECRET_KEY = os.environ.get('SECRET_KEY', 'shopeasy-secret-key-2024-change-in-production')
     # Default to instance/ folder which acts as persistent storage on Render
     db_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'instance', 'shopeasy_v2.db')
-    SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL', f'sqlite:///{db_path}')
+    # SQLite by default; a postgresql:// URL works too (requires psycopg2-binary)
+    SQLALCHEMY_DATABASE_URI = database_url(os.environ.get('DATABASE_URL', f'sqlite:///{db_path}'))
+    # Optional read replica used by the read-only routes (see database.py)
+    SQLALCHEMY_BINDS = {'replica': database_url(os.environ['DATABASE_REPLICA_URL'])} \
+        if os.environ.get('DATABASE_REPLICA_URL') else {}
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     
+    # Engine tuning: SQLite PRAGMA profile (see database.py) and pool settings
+    SQLITE_PROFILE = os.environ.get('SQLITE_PROFILE', 'production')
+    SQLALCHEMY_ENGINE_OPTIONS = {
+        'pool_size': int(os.environ.get('DB_POOL_SIZE', 5)),
+        'max_overflow': int(os.environ.get('DB_MAX_OVERFLOW', 10)),
+        'pool_timeout': int(os.environ.get('DB_POOL_TIMEOUT', 30)),
+        'pool_recycle': int(os.environ.get('DB_POOL_RECYCLE', 1800)),
+        'pool_pre_ping': os.environ.get('DB_POOL_PRE_PING', '0') == '1',
+    } if ':memory:' not in SQLALCHEMY_DATABASE_URI and SQLALCHEMY_DATABASE_URI != 'sqlite://' else {}
+    
+    # Cache shared across gunicorn workers ('sqlite', 'memory' or 'null')
+    CACHE_TYPE = os.environ.get('CACHE_TYPE', 'sqlite')
+    CACHE_PATH = os.environ.get('CACHE_PATH', os.path.join(os.path.dirname(db_path), 'cache.db'))
+    CACHE_DEFAULT_TIMEOUT = int(os.environ.get('CACHE_DEFAULT_TIMEOUT', 300))
+    
+    # Per-worker cache of the logged-in user (see user_cache.py)
+    USER_CACHE_TTL = int(os.environ.get('USER_CACHE_TTL', 60))
+    USER_CACHE_SIZE = int(os.environ.get('USER_CACHE_SIZE', 1024))
+    
+    # Request instrumentation (see metrics.py); METRICS_TOKEN lets a
+    # Prometheus scraper read /admin/metrics without an admin session
+    METRICS_ENABLED = os.environ.get('METRICS_ENABLED', '1') == '1'
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+    # Server-Timing headers expose query counts and timings to any client;
+    # off unless a deployment (or benchmarks/load.py) turns them on
+    SERVER_TIMING = os.environ.get('SERVER_TIMING', '0') == '1'
+    N_PLUS_ONE_THRESHOLD = int(os.environ.get('N_PLUS_ONE_THRESHOLD', 20))
+    
+    # Password hashing pool (see passwords.py). Changing the method or its
+    # cost rehashes each account on its next successful login.
+    PASSWORD_HASH_METHOD = os.environ.get('PASSWORD_HASH_METHOD', 'scrypt')
+    # WORKERS + QUEUE must stay below gunicorn's --threads, or waiting logins
+    # take every thread and browsing stalls anyway
+    PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS', 1))  # per gunicorn worker; 0 = inline
+    PASSWORD_HASH_QUEUE = int(os.environ.get('PASSWORD_HASH_QUEUE', 1))      # waiting hashes before 503
+    PASSWORD_HASH_TIMEOUT = int(os.environ.get('PASSWORD_HASH_TIMEOUT', 10))
+    PASSWORD_HASH_NICE = int(os.environ.get('PASSWORD_HASH_NICE', 10))
+    
+    # Login/register token buckets (see ratelimit.py): burst size and refill per minute
+    LOGIN_IP_BURST = int(os.environ.get('LOGIN_IP_BURST', 10))
+    LOGIN_IP_PER_MINUTE = float(os.environ.get('LOGIN_IP_PER_MINUTE', 10))
+    LOGIN_ACCOUNT_BURST = int(os.environ.get('LOGIN_ACCOUNT_BURST', 5))
+    LOGIN_ACCOUNT_PER_MINUTE = float(os.environ.get('LOGIN_ACCOUNT_PER_MINUTE', 2))
+    # Reverse proxies in front of the app whose X-Forwarded-For is trusted
+    # (1 on Render), so rate limits see the client IP rather than the proxy's
+    TRUSTED_PROXIES = int(os.environ.get('TRUSTED_PROXIES', 0))
+    
     # Razorpay Configuration (Test Mode)
     RAZORPAY_KEY_ID = os.environ.get('RAZORPAY_KEY_ID', 'rzp_test_XXXXXXXXXXXXXXX')
     RAZORPAY_KEY_SECRET = os.environ.get('RAZORPAY_KEY_SECRET', 'XXXXXXXXXXXXXXXXXXXXXXXX')
     
+    # How long stock stays held for a shopper who has opened checkout
+    STOCK_RESERVATION_MINUTES = int(os.environ.get('STOCK_RESERVATION_MINUTES', 10))
+    
     # Upload folder
     UPLOAD_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static', 'images')
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB max upload
+    IMAGE_WORKERS = int(os.environ.get('IMAGE_WORKERS', 2))  # threads rendering derivatives
@@ -0,0 +1,109 @@
+"""Engine setup: SQLite tuning and read-replica routing.
+
+SQLite connections get the PRAGMAs of the profile named by
+``SQLITE_PROFILE``; any single PRAGMA can be overridden with
+``SQLITE_<NAME>`` (e.g. ``SQLITE_BUSY_TIMEOUT=10000``). Pool settings come
+from ``SQLALCHEMY_ENGINE_OPTIONS`` built in ``config.py``.
+
+The ``production`` profile is what lets ``gunicorn -w 2`` share one file:
+WAL lets readers proceed while a checkout commits, and ``busy_timeout``
+makes a writer wait for the lock instead of failing with
+"database is locked".
+
+When ``DATABASE_REPLICA_URL`` is set it is registered as the ``replica``
+bind. Views decorated with ``@read_only`` send their queries there; flushes
+and INSERT/UPDATE/DELETE statements always go to the primary.
+"""
+import os
+from functools import wraps
+
+from flask import g, has_app_context
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
+
+REPLICA_BIND = 'replica'
+
+SQLITE_PROFILES = {
+    # SQLite's own defaults: rollback journal, full fsync, no waiting on locks
+    'default': {},
+    'production': {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'busy_timeout': 5000,            # ms
+        'mmap_size': 256 * 1024 * 1024,  # bytes
+        'cache_size': -64000,            # negative = KiB, i.e. 64MB
+        'temp_store': 'MEMORY',
+    },
+}
+
+
+def sqlite_pragmas(profile_name):
+    """PRAGMAs for ``profile_name`` with ``SQLITE_<NAME>`` env overrides applied."""
+    if profile_name not in SQLITE_PROFILES:
+        raise ValueError(f'Unknown SQLITE_PROFILE {profile_name!r}')
+    pragmas = dict(SQLITE_PROFILES[profile_name])
+    for name in SQLITE_PROFILES['production']:
+        value = os.environ.get(f'SQLITE_{name.upper()}')
+        if value:
+            pragmas[name] = value
+    return pragmas
+
+
+def apply_pragmas(dbapi_connection, pragmas):
+    cursor = dbapi_connection.cursor()
+    try:
+        for name, value in pragmas.items():
+            cursor.execute(f'PRAGMA {name}={value}')
+    finally:
+        cursor.close()
+
+
+def database_url(url):
+    """Normalise provider URLs (Render/Heroku hand out ``postgres://``)."""
+    if url and url.startswith('postgres://'):
+        return 'postgresql://' + url[len('postgres://'):]
+    return url
+
+
+def init_engine_profile(app, db):
+    """Attach the configured SQLite profile to every SQLite engine (primary and replica)."""
+    pragmas = sqlite_pragmas(app.config.get('SQLITE_PROFILE', 'production'))
+    if not pragmas:
+        return
+
+    with app.app_context():
+        engines = list(db.engines.values())
+
+    def _set_sqlite_pragmas(dbapi_connection, connection_record):
+        apply_pragmas(dbapi_connection, pragmas)
+
+    for engine in engines:
+        if engine.dialect.name == 'sqlite':
+            event.listen(engine, 'connect', _set_sqlite_pragmas)
+
+
+# ──────────────── READ REPLICA ROUTING ────────────────
+
+def read_only(view):
+    """Mark a view as read-only so its queries may be served by the replica."""
+    @wraps(view)
+    def wrapped(*args, **kwargs):
+        g.use_replica = True
+        return view(*args, **kwargs)
+    return wrapped
+
+
+class RoutingSession(Session):
+    """Session that sends reads from ``@read_only`` views to the replica bind."""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and self._use_replica(clause):
+            return self._db.engines[REPLICA_BIND]
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+    def _use_replica(self, clause):
+        if self._flushing or getattr(clause, 'is_dml', False):
+            return False
+        if not has_app_context() or not g.get('use_replica'):
+            return False
+        return REPLICA_BIND in self._db.engines
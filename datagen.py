@@ -0,0 +1,277 @@
+"""Synthetic data for performance testing.
+
+Bulk-inserts users, products, orders with their items, and cart lines
+with Core ``executemany`` batches, committing every ``--batch-size`` rows.
+Rows are appended after whatever the database already holds (ids, skus,
+usernames continue from the current maximum), so it can run on top of
+``flask --app app init``.
+
+Output is deterministic for a given ``--seed`` and set of counts (only
+timestamps move, being relative to the time of the run). Each table draws
+from its own random stream, so changing ``--orders`` does not change the
+generated catalogue. Users share the password ``password123``
+(hashed once).
+
+Afterwards the search index, browse facets and sales rollups are rebuilt,
+and the catalogue caches are invalidated. The rollup rebuild grows with the
+number of (day, product) pairs and dominates on large order volumes; skip
+it with ``--skip-rollups`` when the analytics pages are not under test. The
+result can be fed to ``benchmarks/load.py --database``.
+
+    flask --app app datagen populate --products 1000000 --users 200000 \\
+        --orders 5000000 --cart-items 2000000 --seed 42
+
+Meant for throwaway databases: on SQLite the loading connection runs with
+``synchronous=OFF``.
+"""
+import math
+import random
+import time
+from array import array
+from datetime import datetime, timedelta
+
+import click
+from flask.cli import AppGroup, with_appcontext
+from werkzeug.security import generate_password_hash
+
+import analytics
+import browse
+import search
+from models import db, CartItem, Order, OrderItem, Product, User
+
+BATCH_SIZE = 10000
+PASSWORD = 'password123'
+DAYS = 365
+MAX_ITEMS_PER_ORDER = 4
+# (status, share of orders)
+ORDER_STATUSES = (('Paid', 0.80), ('Pending', 0.12), ('Processing', 0.03), ('Payment Failed', 0.05))
+
+# category -> (images, sizes, nouns)
+CATEGORIES = {
+    'Shirts': (('shirt1.jpg', 'shirt2.jpg'), 'S,M,L,XL', ('Shirt', 'Oxford Shirt', 'Flannel Shirt', 'Linen Shirt')),
+    'T-Shirts': (('tshirt1.jpg', 'tshirt2.jpg', 'tshirtw1.jpg'), 'S,M,L,XL,XXL', ('T-Shirt', 'Polo', 'Henley', 'Tee')),
+    'Footwear': (('sneaker.jpg', 'sneaker1.jpg', 'shoe.jpg', 'shoe1.jpg'), '6,7,8,9,10,11',
+                 ('Sneakers', 'Trainers', 'Loafers', 'Running Shoes', 'Boots')),
+    'Watches': (('watch.jpg', 'watch1.jpg', 'watch2.jpg'), None, ('Watch', 'Chronograph', 'Smartwatch', 'Field Watch')),
+    'Audio': (('speaker1.jpg', 'speaker2.jpg', 'wiredheadphone.jpg', 'wiredheadphone1.jpg', 'wiredheadphone2.jpg'),
+              None, ('Speaker', 'Headphones', 'Earbuds', 'Soundbar')),
+}
+ADJECTIVES = ('Classic', 'Urban', 'Everyday', 'Premium', 'Slim', 'Relaxed', 'Vintage', 'Sport', 'Bold',
+              'Minimal', 'Rugged', 'Lightweight', 'Wireless', 'Compact', 'Signature', 'Heritage')
+COLOURS = ('Black', 'White', 'Navy', 'Olive', 'Grey', 'Brown', 'Red', 'Blue', 'Beige', 'Green')
+FEATURES = ('Breathable fabric', 'Machine washable', 'Water resistant', 'One year warranty',
+            'Cushioned sole', 'Long battery life', 'Soft cotton blend', 'Scratch-proof glass',
+            'Noise isolating', 'Regular fit', 'Recycled materials', 'Free returns')
+
+
+def _rng(seed, table):
+    return random.Random(f'{seed}:{table}')
+
+
+def _next_id(conn, column):
+    return (conn.execute(db.select(db.func.max(column))).scalar() or 0) + 1
+
+
+def _spread(rng, index, count, start, span):
+    """Timestamp for row ``index`` of ``count``, evenly spread over ``span`` with jitter."""
+    return start + span * ((index + rng.random()) / max(count, 1))
+
+
+def _insert(conn, table, rows, batch_size, label):
+    """Insert ``rows`` (an iterable of dicts) in committed batches; returns the count."""
+    started = time.perf_counter()
+    done = 0
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= batch_size:
+            conn.execute(table.insert(), batch)
+            conn.commit()
+            done += len(batch)
+            batch = []
+    if batch:
+        conn.execute(table.insert(), batch)
+        conn.commit()
+        done += len(batch)
+    if done:
+        seconds = time.perf_counter() - started
+        click.echo(f'  {label:<12} {done:>10,} rows  {seconds:7.1f}s  {done / seconds:>9,.0f} rows/s')
+    return done
+
+
+# ──────────────── GENERATORS ────────────────
+
+def user_rows(rng, count, first_id, now, days):
+    password_hash = generate_password_hash(PASSWORD)
+    start, span = now - timedelta(days=days), timedelta(days=days)
+    for i in range(count):
+        n = first_id + i
+        yield {'id': n, 'username': f'user{n}', 'email': f'user{n}@example.com',
+               'password_hash': password_hash, 'is_admin': False,
+               'created_at': _spread(rng, i, count, start, span)}
+
+
+def product_rows(rng, count, first_id, now, days):
+    categories = list(CATEGORIES.items())
+    start, span = now - timedelta(days=days), timedelta(days=days)
+    for i in range(count):
+        n = first_id + i
+        category, (images, sizes, nouns) = rng.choice(categories)
+        adjective, colour, noun = rng.choice(ADJECTIVES), rng.choice(COLOURS), rng.choice(nouns)
+        price = float(rng.randrange(199, 5000, 10) - 1)
+        markup = rng.choice((None, None, 1.25, 1.5, 2.0))
+        original_price = round(price * markup) if markup else None
+        yield {
+            'id': n,
+            'sku': f'GEN-{n}',
+            'name': f'{adjective} {colour} {noun}',
+            'description': f'{adjective} {noun.lower()} in {colour.lower()}. '
+                           f'{rng.choice(FEATURES)} and {rng.choice(FEATURES).lower()}.',
+            'highlights': '|'.join(rng.sample(FEATURES, 3)),
+            'price': price,
+            'original_price': original_price,
+            'image': rng.choice(images),
+            'category': category,
+            'stock': rng.randint(0, 500),
+            'featured': rng.random() < 0.01,
+            'sizes': sizes,
+            'discount_pct': browse.discount_pct(price, original_price),
+            'created_at': _spread(rng, i, count, start, span),
+        }
+
+
+def order_batches(rng, count, first_id, user_ids, product_ids, prices, now, days, batch_size):
+    """Yield ``(orders, items)`` lists of at most ``batch_size`` orders, oldest first."""
+    statuses = [status for status, _ in ORDER_STATUSES]
+    weights = [share for _, share in ORDER_STATUSES]
+    start, span = now - timedelta(days=days), timedelta(days=days)
+    orders, items = [], []
+    for i in range(count):
+        order_id = first_id + i
+        total = 0.0
+        for _ in range(rng.randint(1, MAX_ITEMS_PER_ORDER)):
+            index = rng.randrange(len(product_ids))
+            quantity = rng.choice((1, 1, 1, 2, 3))
+            total += prices[index] * quantity
+            items.append({'order_id': order_id, 'product_id': product_ids[index],
+                          'quantity': quantity, 'price': prices[index], 'size': None})
+        status = rng.choices(statuses, weights)[0]
+        orders.append({
+            'id': order_id, 'user_id': user_ids[rng.randrange(len(user_ids))],
+            'total_amount': round(total, 2), 'status': status,
+            'payment_id': f'pay_gen_{order_id}' if status != 'Pending' else '',
+            'razorpay_order_id': '', 'full_name': 'Test Shopper', 'address': '1 Test Street',
+            'city': 'Bengaluru', 'state': 'KA', 'zipcode': '560001', 'phone': '9000000000',
+            'created_at': _spread(rng, i, count, start, span),
+        })
+        if len(orders) >= batch_size:
+            yield orders, items
+            orders, items = [], []
+    if orders:
+        yield orders, items
+
+
+def cart_rows(rng, count, user_ids, product_ids, now):
+    """About ``count`` cart lines, a few distinct products per user."""
+    per_user = max(1, math.ceil(count / len(user_ids)))
+    done = 0
+    while done < count:
+        for user_id in user_ids:
+            lines = min(count - done, rng.randint(1, 2 * per_user - 1), len(product_ids))
+            for index in rng.sample(range(len(product_ids)), lines):
+                yield {'user_id': user_id, 'product_id': product_ids[index],
+                       'quantity': rng.randint(1, 3), 'size': None,
+                       'added_at': now - timedelta(minutes=rng.randrange(60 * 24 * 30))}
+            done += lines
+            if done >= count:
+                return
+
+
+# ──────────────── POPULATE ────────────────
+
+def populate(products=0, users=0, orders=0, cart_items=0, seed=42, batch_size=BATCH_SIZE,
+             days=DAYS, rollups=True):
+    """Generate the requested rows. Returns ``{table: rows inserted}``."""
+    now = datetime.utcnow().replace(microsecond=0)
+    counts = {}
+    with db.engine.connect() as conn:
+        if conn.dialect.name == 'sqlite':
+            conn.exec_driver_sql('PRAGMA synchronous=OFF')
+        conn.commit()
+
+        counts['users'] = _insert(conn, User.__table__,
+                                  user_rows(_rng(seed, 'users'), users, _next_id(conn, User.id), now, days),
+                                  batch_size, 'users')
+        counts['products'] = _insert(conn, Product.__table__,
+                                     product_rows(_rng(seed, 'products'), products,
+                                                  _next_id(conn, Product.id), now, days),
+                                     batch_size, 'products')
+
+        if orders or cart_items:
+            user_ids = array('q', conn.execute(db.select(User.id).order_by(User.id)).scalars())
+            product_ids, prices = array('q'), array('d')
+            for product_id, price in conn.execute(db.select(Product.id, Product.price).order_by(Product.id)):
+                product_ids.append(product_id)
+                prices.append(price)
+            if not user_ids or not product_ids:
+                raise click.UsageError('Orders and carts need at least one user and one product.')
+
+        counts['orders'] = counts['order_items'] = 0
+        if orders:
+            started = time.perf_counter()
+            batches = order_batches(_rng(seed, 'orders'), orders, _next_id(conn, Order.id),
+                                    user_ids, product_ids, prices, now, days, batch_size)
+            for order_batch, item_batch in batches:
+                conn.execute(Order.__table__.insert(), order_batch)
+                conn.execute(OrderItem.__table__.insert(), item_batch)
+                conn.commit()
+                counts['orders'] += len(order_batch)
+                counts['order_items'] += len(item_batch)
+            seconds = time.perf_counter() - started
+            rows = counts['orders'] + counts['order_items']
+            click.echo(f"  {'orders':<12} {counts['orders']:>10,} rows  (+{counts['order_items']:,} items)"
+                       f'  {seconds:7.1f}s  {rows / seconds:>9,.0f} rows/s')
+
+        counts['cart_items'] = _insert(conn, CartItem.__table__,
+                                       cart_rows(_rng(seed, 'carts'), cart_items, user_ids, product_ids, now)
+                                       if cart_items else (),
+                                       batch_size, 'cart items')
+
+    if counts['products']:
+        started = time.perf_counter()
+        search.rebuild_index()
+        with db.engine.begin() as conn:
+            browse.rebuild_facets(conn)
+        click.echo(f'  search index and facets rebuilt in {time.perf_counter() - started:.1f}s')
+    if counts['orders'] and rollups:
+        started = time.perf_counter()
+        with db.engine.begin() as conn:
+            analytics.backfill(conn)
+        click.echo(f'  sales rollups rebuilt in {time.perf_counter() - started:.1f}s')
+    if counts['products'] or counts['orders'] or counts['users']:
+        from routes import catalog_changed
+        catalog_changed()
+    return counts
+
+
+# ──────────────── CLI ────────────────
+
+datagen_cli = AppGroup('datagen', help='Synthetic data for performance testing.')
+
+
+@datagen_cli.command('populate')
+@click.option('--products', default=0, show_default=True)
+@click.option('--users', default=0, show_default=True)
+@click.option('--orders', default=0, show_default=True, help=f'Each with 1-{MAX_ITEMS_PER_ORDER} items.')
+@click.option('--cart-items', default=0, show_default=True)
+@click.option('--seed', default=42, show_default=True)
+@click.option('--days', default=DAYS, show_default=True, help='Spread created_at over this many days.')
+@click.option('--batch-size', default=BATCH_SIZE, show_default=True)
+@click.option('--skip-rollups', is_flag=True, help='Do not rebuild the sales rollups afterwards.')
+@with_appcontext
+def populate_command(products, users, orders, cart_items, seed, days, batch_size, skip_rollups):
+    """Bulk-insert synthetic users, products, orders and carts."""
+    started = time.perf_counter()
+    counts = populate(products, users, orders, cart_items, seed, batch_size, days, not skip_rollups)
+    total = sum(counts.values())
+    click.echo(f'Inserted {total:,} rows in {time.perf_counter() - started:.1f}s.')
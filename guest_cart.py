@@ -0,0 +1,162 @@
+"""Carts for shoppers who are not logged in.
+
+A guest cart lives entirely in a signed cookie holding compact
+``[line_id, product_id, size, quantity]`` lines - no prices, so nothing a
+shopper could tamper with is trusted: prices, names and stock always come
+from the product table when the cart is shown. Browsing and building a
+cart therefore never writes to the database.
+
+On login/register ``merge_into_user`` folds the cookie into the user's
+``CartItem`` rows with one SELECT plus one batched INSERT and one batched
+UPDATE, and the cookie is cleared.
+
+Routes read and change the cart through ``load``/``save``; the cookie is
+written by an ``after_request`` hook only when the cart changed.
+"""
+from flask import current_app, g, request
+from itsdangerous import BadSignature, URLSafeSerializer
+
+from cart_service import apply_to_lines, batch_product_ids
+from models import db, CartItem, Product
+
+COOKIE_NAME = 'guest_cart'
+COOKIE_MAX_AGE = 30 * 24 * 3600
+MAX_LINES = 50
+MAX_QUANTITY = 99
+
+
+class GuestLine:
+    """Quacks like a ``CartItem`` for the cart template and ``items_total``."""
+    __slots__ = ('id', 'product_id', 'size', 'quantity', 'product')
+
+    def __init__(self, id, product_id, size, quantity, product=None):
+        self.id = id
+        self.product_id = product_id
+        self.size = size
+        self.quantity = quantity
+        self.product = product
+
+
+def _serializer():
+    return URLSafeSerializer(current_app.secret_key, salt='guest-cart')
+
+
+def _decode(token):
+    try:
+        raw = _serializer().loads(token)
+        lines = [GuestLine(int(i), int(p), s or None, int(q)) for i, p, s, q in raw]
+    except (BadSignature, TypeError, ValueError):
+        return []
+    return [line for line in lines if 0 < line.quantity <= MAX_QUANTITY][:MAX_LINES]
+
+
+def load():
+    """The current request's guest cart lines (without products)."""
+    if 'guest_cart' not in g:
+        token = request.cookies.get(COOKIE_NAME)
+        g.guest_cart = _decode(token) if token else []
+    return g.guest_cart
+
+
+def save(lines):
+    g.guest_cart = lines
+    g.guest_cart_changed = True
+
+
+def count(lines=None):
+    return sum(line.quantity for line in (load() if lines is None else lines))
+
+
+def with_products(lines=None):
+    """Attach products with one query, dropping lines whose product is gone."""
+    lines = load() if lines is None else lines
+    ids = {line.product_id for line in lines}
+    products = {p.id: p for p in Product.query.filter(Product.id.in_(ids))} if ids else {}
+    for line in lines:
+        line.product = products.get(line.product_id)
+    return [line for line in lines if line.product is not None]
+
+
+def _write_cookie(response):
+    if not g.get('guest_cart_changed'):
+        return response
+    lines = g.guest_cart
+    if lines:
+        token = _serializer().dumps([[l.id, l.product_id, l.size or '', l.quantity] for l in lines])
+        response.set_cookie(
+            COOKIE_NAME, token, max_age=COOKIE_MAX_AGE, httponly=True, samesite='Lax',
+            secure=current_app.config.get('SESSION_COOKIE_SECURE', False)
+        )
+    else:
+        response.delete_cookie(COOKIE_NAME)
+    return response
+
+
+def init_guest_cart(app):
+    app.after_request(_write_cookie)
+
+
+# ──────────────── CHANGES ────────────────
+
+def apply_operations(operations, products=None):
+    """Guest counterpart of ``cart_service.apply_cart_operations``.
+
+    Validates and applies every operation with the same rules as the
+    signed-in cart, or raises ``CartBatchError``; the cookie is only
+    rewritten on success. Returns the lines with products.
+    """
+    lines = [GuestLine(l.id, l.product_id, l.size, l.quantity) for l in load()]
+    if products is None:
+        wanted = {l.product_id for l in lines} | batch_product_ids(operations)
+        products = {p.id: p for p in Product.query.filter(Product.id.in_(wanted))} if wanted else {}
+
+    def new_line(product, size):
+        return GuestLine(max((l.id for l in lines), default=0) + 1, product.id, size, 0)
+
+    apply_to_lines(lines, operations, products, new_line, max_lines=MAX_LINES, max_quantity=MAX_QUANTITY)
+    save(lines)
+    for line in lines:
+        line.product = products.get(line.product_id)
+    return [line for line in lines if line.product is not None]
+
+
+def merge_into_user(user_id):
+    """Move the guest cart into ``user_id``'s cart and clear the cookie.
+
+    Quantities of lines already in the user's cart are added together.
+    Runs in the caller's transaction; the caller commits and then calls
+    ``invalidate_cart``. Returns the number of lines merged.
+    """
+    lines = with_products()
+    if not lines:
+        if load():
+            save([])
+        return 0
+
+    cart = CartItem.__table__
+    existing = {
+        (product_id, size): (item_id, quantity)
+        for item_id, product_id, size, quantity in db.session.execute(
+            db.select(cart.c.id, cart.c.product_id, cart.c.size, cart.c.quantity)
+            .where(cart.c.user_id == user_id,
+                   cart.c.product_id.in_({line.product_id for line in lines}))
+        )
+    }
+    inserts, updates = [], []
+    for line in lines:
+        match = existing.get((line.product_id, line.size))
+        if match:
+            updates.append({'b_id': match[0], 'b_quantity': match[1] + line.quantity})
+        else:
+            inserts.append({'user_id': user_id, 'product_id': line.product_id,
+                            'quantity': line.quantity, 'size': line.size})
+    if inserts:
+        db.session.execute(cart.insert(), inserts)
+    if updates:
+        db.session.execute(
+            cart.update().where(cart.c.id == db.bindparam('b_id'))
+            .values(quantity=db.bindparam('b_quantity')),
+            updates
+        )
+    save([])
+    return len(lines)
@@ -0,0 +1,241 @@
+"""Product image pipeline.
+
+Uploads are stored under a content-hashed name (``<sha256[:16]>.<ext>``)
+and a background thread pool renders resized derivatives next to them in
+``UPLOAD_FOLDER/derived``::
+
+    <stem>-thumb.webp  <stem>-thumb.jpg   (200px wide)
+    <stem>-medium.webp <stem>-medium.jpg  (480px wide)
+    <stem>-large.webp  <stem>-large.jpg   (1024px wide)
+
+Templates call ``responsive_image()``, which emits a ``<picture>`` with WebP
+and JPEG ``srcset``s once the derivatives exist and the original image
+until then. Which images have derivatives is read from ``derived/`` at
+startup and recorded in the shared cache as builds finish, so rendering a
+page never stats files. Pillow is optional: without it uploads are stored
+as-is.
+``flask --app app images build`` renders derivatives for every product.
+"""
+import hashlib
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import click
+from flask import current_app
+from flask.cli import AppGroup, with_appcontext
+from markupsafe import Markup, escape
+
+from cache import get_cache
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # Pillow not installed: originals only
+    Image = None
+
+SIZES = {'thumb': 200, 'medium': 480, 'large': 1024}
+FORMATS = {'webp': ('WEBP', {'quality': 80, 'method': 4}),
+           'jpg': ('JPEG', {'quality': 82, 'optimize': True, 'progressive': True})}
+DERIVED_DIR = 'derived'
+
+# Re-check a missing derivative at most this often (seconds)
+MISSING_RECHECK = 30
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+# Stems whose derivatives exist: read from the derived folder at startup,
+# added to as builds finish here or (through the cache) in other workers
+_ready = set()
+_missing = {}
+
+
+def _get_executor(app):
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=app.config.get('IMAGE_WORKERS', 2),
+            thread_name_prefix='image-derivatives'
+        )
+    return _executor
+
+
+def derivative_name(filename, size, fmt):
+    stem = os.path.splitext(filename)[0]
+    return f'{stem}-{size}.{fmt}'
+
+
+def _source_path(app, filename):
+    """Uploads live in UPLOAD_FOLDER; the seed images live in the app root."""
+    for folder in (app.config['UPLOAD_FOLDER'], app.root_path):
+        path = os.path.join(folder, filename)
+        if os.path.isfile(path):
+            return path
+    return None
+
+
+def generate_derivatives(source_path, filename, upload_folder):
+    """Render every size/format of ``source_path``. Safe to run in a worker thread."""
+    if Image is None:
+        return []
+    out_dir = os.path.join(upload_folder, DERIVED_DIR)
+    os.makedirs(out_dir, exist_ok=True)
+
+    written = []
+    with Image.open(source_path) as original:
+        original = ImageOps.exif_transpose(original)
+        for size, width in SIZES.items():
+            image = original.copy()
+            image.thumbnail((width, width * 4))  # never upscales
+            for fmt, (pil_format, options) in FORMATS.items():
+                frame = image.convert('RGB') if pil_format == 'JPEG' else image
+                target = os.path.join(out_dir, derivative_name(filename, size, fmt))
+                tmp = f'{target}.tmp'
+                frame.save(tmp, pil_format, **options)
+                os.replace(tmp, target)
+                written.append(target)
+    return written
+
+
+def _ready_key(filename):
+    return f'images:derived:{os.path.splitext(filename)[0]}'
+
+
+def record_derivatives(cache, filename):
+    """Mark ``filename``'s derivatives as built, for this process and the others."""
+    _ready.add(os.path.splitext(filename)[0])
+    _missing.pop(filename, None)
+    cache.set(_ready_key(filename), True, timeout=0)
+
+
+def _scan_derived(upload_folder):
+    """Stems with a finished set of derivatives (the large JPEG is written last)."""
+    suffix = '-large.jpg'
+    try:
+        names = os.listdir(os.path.join(upload_folder, DERIVED_DIR))
+    except FileNotFoundError:
+        return set()
+    return {name[:-len(suffix)] for name in names if name.endswith(suffix)}
+
+
+def save_upload(file_storage):
+    """Store an uploaded image under its content hash and queue its derivatives.
+
+    Returns the stored filename to put in ``Product.image``.
+    """
+    app = current_app._get_current_object()
+    data = file_storage.read()
+    ext = file_storage.filename.rsplit('.', 1)[1].lower()
+    filename = f'{hashlib.sha256(data).hexdigest()[:16]}.{ext}'
+
+    upload_folder = app.config['UPLOAD_FOLDER']
+    os.makedirs(upload_folder, exist_ok=True)
+    path = os.path.join(upload_folder, filename)
+    if not os.path.exists(path):
+        with open(path, 'wb') as f:
+            f.write(data)
+
+    if Image is not None and not has_derivatives(filename):
+        _get_executor(app).submit(_generate_logged, get_cache(), path, filename, upload_folder)
+    return filename
+
+
+def _generate_logged(cache, path, filename, upload_folder):
+    try:
+        generate_derivatives(path, filename, upload_folder)
+    except Exception:
+        logger.exception('Failed to build image derivatives for %s', filename)
+    else:
+        record_derivatives(cache, filename)
+
+
+def has_derivatives(filename):
+    """Whether the derivatives exist, without touching the filesystem."""
+    if os.path.splitext(filename)[0] in _ready:
+        return True
+    checked = _missing.get(filename)
+    if checked and time.time() - checked < MISSING_RECHECK:
+        return False
+    if get_cache().get(_ready_key(filename)):  # built by another worker
+        _ready.add(os.path.splitext(filename)[0])
+        _missing.pop(filename, None)
+        return True
+    _missing[filename] = time.time()
+    return False
+
+
+# ──────────────── TEMPLATE HELPERS ────────────────
+
+def image_url(filename, size=None, fmt='jpg'):
+    if size and has_derivatives(filename):
+        return f'/images/{DERIVED_DIR}/{derivative_name(filename, size, fmt)}'
+    return f'/images/{filename}'
+
+
+def image_srcset(filename, fmt='webp'):
+    if not has_derivatives(filename):
+        return ''
+    return ', '.join(
+        f'/images/{DERIVED_DIR}/{derivative_name(filename, size, fmt)} {width}w'
+        for size, width in SIZES.items()
+    )
+
+
+def responsive_image(filename, alt='', class_='', sizes='100vw', size='medium', loading='lazy', **attrs):
+    """``<picture>`` markup for a product image.
+
+    The ``<picture>`` is ``display: contents`` so the ``<img>`` keeps
+    behaving as a direct child of its container for existing CSS.
+    """
+    extra = ''.join(f' {escape(k.replace("_", "-"))}="{escape(v)}"' for k, v in attrs.items())
+    img = (f'<img src="{escape(image_url(filename, size))}" alt="{escape(alt)}"'
+           f' class="{escape(class_)}" loading="{escape(loading)}"{extra}')
+    if not has_derivatives(filename):
+        return Markup(img + '>')
+    return Markup(
+        '<picture style="display: contents">'
+        f'<source type="image/webp" srcset="{escape(image_srcset(filename, "webp"))}" sizes="{escape(sizes)}">'
+        f'{img} srcset="{escape(image_srcset(filename, "jpg"))}" sizes="{escape(sizes)}">'
+        '</picture>'
+    )
+
+
+def init_images(app):
+    _ready.update(_scan_derived(app.config['UPLOAD_FOLDER']))
+    app.jinja_env.globals.update(
+        image_url=image_url,
+        image_srcset=image_srcset,
+        responsive_image=responsive_image,
+    )
+    app.cli.add_command(images_cli)
+
+
+# ──────────────── CLI ────────────────
+
+images_cli = AppGroup('images', help='Product image commands.')
+
+
+@images_cli.command('build')
+@click.option('--force', is_flag=True, help='Rebuild derivatives that already exist.')
+@with_appcontext
+def build_command(force):
+    """Render derivatives for every product image that lacks them."""
+    from models import Product
+
+    if Image is None:
+        raise click.ClickException('Pillow is not installed.')
+    app = current_app._get_current_object()
+    filenames = {row[0] for row in Product.query.with_entities(Product.image).distinct()}
+    built = 0
+    for filename in sorted(filenames):
+        if not force and has_derivatives(filename):
+            continue
+        path = _source_path(app, filename)
+        if path is None:
+            click.echo(f'missing  {filename}')
+            continue
+        generate_derivatives(path, filename, app.config['UPLOAD_FOLDER'])
+        record_derivatives(get_cache(), filename)
+        built += 1
+    click.echo(f'Built derivatives for {built} image(s).')
@@ -0,0 +1,143 @@
+"""Atomic stock reservation.
+
+Stock is only ever changed with conditional updates of the form
+``UPDATE product SET stock = stock - :qty WHERE id = :id AND stock >= :qty``,
+so two workers competing for the last units cannot both succeed: the
+database decides, not a value read earlier in Python.
+
+Opening checkout reserves the cart for ``STOCK_RESERVATION_MINUTES``; the
+reservation is either consumed by ``process_checkout`` or handed back to
+stock once it expires - by ``flask jobs work`` every
+``RELEASE_INTERVAL`` seconds, so an abandoned checkout does not keep the
+units out of carts and in-stock listings. None of these functions commit - the caller owns the
+transaction, so a failure on any line rolls back every line.
+"""
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+from flask import current_app
+
+from jobs import periodic
+from models import db, OrderItem, Product, StockReservation
+
+RELEASE_INTERVAL = 60
+
+
+class InsufficientStock(Exception):
+    """Raised with one entry per cart line that could not be fulfilled."""
+
+    def __init__(self, failures):
+        super().__init__('Not enough stock')
+        self.failures = failures
+
+
+def _take_stock(product_id, quantity):
+    result = db.session.execute(
+        db.update(Product)
+        .where(Product.id == product_id, Product.stock >= quantity)
+        .values(stock=Product.stock - quantity)
+        .execution_options(synchronize_session=False)
+    )
+    return result.rowcount == 1
+
+
+def _release(condition):
+    """Delete the reservations matching ``condition`` and return their stock.
+
+    DELETE ... RETURNING reports only the rows this transaction actually
+    removed, so two workers releasing the same hold cannot both return it.
+    """
+    released = db.session.execute(
+        db.delete(StockReservation)
+        .where(condition)
+        .returning(StockReservation.product_id, StockReservation.quantity)
+        .execution_options(synchronize_session=False)
+    ).all()
+    _return_stock(released)
+
+
+def _return_stock(lines):
+    """Add ``(product_id, quantity)`` lines back onto product stock."""
+    totals = {}
+    for product_id, quantity in lines:
+        totals[product_id] = totals.get(product_id, 0) + quantity
+    if totals:
+        product = Product.__table__
+        db.session.execute(
+            product.update()
+            .where(product.c.id == db.bindparam('pid'))
+            .values(stock=product.c.stock + db.bindparam('qty')),
+            [{'pid': pid, 'qty': qty} for pid, qty in totals.items()]
+        )
+
+
+@periodic('release_expired_reservations', RELEASE_INTERVAL)
+def release_expired(now=None):
+    """Hand stock held by expired reservations back to the products."""
+    _release(StockReservation.expires_at < (now or datetime.utcnow()))
+
+
+def release_user(user_id):
+    _release(StockReservation.user_id == user_id)
+
+
+def _quantities(cart_items):
+    """Total quantity per product (one product can be in the cart in several sizes)."""
+    totals = OrderedDict()
+    for item in cart_items:
+        totals[item.product_id] = totals.get(item.product_id, 0) + item.quantity
+    return totals
+
+
+def _take_cart(cart_items):
+    failures = []
+    products = {item.product_id: item.product for item in cart_items}
+    for product_id, quantity in _quantities(cart_items).items():
+        if not _take_stock(product_id, quantity):
+            available = db.session.query(Product.stock).filter_by(id=product_id).scalar() or 0
+            failures.append({
+                'product_id': product_id,
+                'name': products[product_id].name,
+                'requested': quantity,
+                'available': available,
+            })
+    if failures:
+        raise InsufficientStock(failures)
+
+
+def reserve_cart(user_id, cart_items):
+    """Hold stock for every cart line, replacing the user's previous hold.
+
+    Raises ``InsufficientStock`` listing every line that cannot be held.
+    """
+    release_expired()
+    release_user(user_id)
+    _take_cart(cart_items)
+
+    expires_at = datetime.utcnow() + timedelta(
+        minutes=current_app.config.get('STOCK_RESERVATION_MINUTES', 10)
+    )
+    db.session.execute(db.insert(StockReservation), [
+        {'user_id': user_id, 'product_id': product_id, 'quantity': quantity,
+         'expires_at': expires_at, 'created_at': datetime.utcnow()}
+        for product_id, quantity in _quantities(cart_items).items()
+    ])
+
+
+def commit_cart(user_id, cart_items):
+    """Take stock for an order being placed, consuming the user's reservation.
+
+    The held units go back first and the full quantities are then taken
+    conditionally, which covers carts edited after checkout was opened and
+    reservations that have already expired.
+    """
+    release_expired()
+    release_user(user_id)
+    _take_cart(cart_items)
+
+
+def restock(order_id):
+    """Give back the stock taken for an order that will not be fulfilled."""
+    _return_stock(db.session.execute(
+        db.select(OrderItem.product_id, OrderItem.quantity).where(OrderItem.order_id == order_id)
+    ).all())
@@ -0,0 +1,286 @@
+"""Background jobs stored in the application database.
+
+Jobs are rows of the ``job`` table, so a route enqueues work in the same
+transaction as the data it refers to - an order and the job verifying its
+payment are committed together or not at all. Worker processes claim due
+jobs with a single conditional ``UPDATE ... RETURNING`` and run them; the
+handler's writes and the job's ``done`` mark commit in one transaction, so
+a job's database effects happen once even when a worker dies mid-job.
+
+A job that raises is retried with exponential backoff until
+``max_attempts`` and then left ``failed`` (see ``jobs retry``); the
+kind's ``on_failure`` handler, if any, runs in that last transaction so
+the job can undo what it was holding (an order's stock). A job whose
+worker died is queued again when its lease runs out. Enqueueing with a
+``key`` is idempotent: a second job with the same key is ignored.
+
+Handlers are plain functions taking the payload as keyword arguments,
+registered with ``@handler('kind')``; they must not commit. Housekeeping
+that runs on a clock rather than per row (releasing expired stock holds)
+is registered with ``@periodic(name, seconds)`` and run by every worker
+process between jobs, each run in its own transaction.
+
+    flask --app app jobs work [--processes 2] [--burst]
+    flask --app app jobs status
+    flask --app app jobs retry
+"""
+import json
+import logging
+import multiprocessing
+import os
+import socket
+import time
+from datetime import datetime, timedelta
+
+import click
+from flask.cli import AppGroup, with_appcontext
+from sqlalchemy.dialects import postgresql, sqlite
+
+from models import db, Job
+
+QUEUED, RUNNING, DONE, FAILED = 'queued', 'running', 'done', 'failed'
+MAX_ATTEMPTS = 5
+RETRY_BASE = 5        # seconds before the first retry, doubled each attempt
+RETRY_MAX = 3600
+LEASE_SECONDS = 300   # a running job is assumed dead after this long
+POLL_INTERVAL = 1.0
+
+HANDLERS = {}
+FAILURE_HANDLERS = {}
+PERIODIC = {}  # name -> (seconds, fn)
+logger = logging.getLogger(__name__)
+
+
+def handler(kind, on_failure=None):
+    """Register the function running ``kind`` jobs.
+
+    ``on_failure`` is called with the same payload once the job has used
+    up its attempts.
+    """
+    def register(fn):
+        HANDLERS[kind] = fn
+        if on_failure is not None:
+            FAILURE_HANDLERS[kind] = on_failure
+        return fn
+    return register
+
+
+def periodic(name, seconds):
+    """Run the decorated function (no arguments) every ``seconds`` in ``jobs work``."""
+    def register(fn):
+        PERIODIC[name] = (seconds, fn)
+        return fn
+    return register
+
+
+def enqueue(kind, key=None, delay=0, max_attempts=MAX_ATTEMPTS, **payload):
+    """Add a job to the current transaction; the caller commits."""
+    dialect = db.session.get_bind(mapper=Job).dialect
+    insert = postgresql.insert if dialect.name == 'postgresql' else sqlite.insert
+    now = datetime.utcnow()
+    stmt = insert(Job.__table__).values(
+        kind=kind, key=key, payload=json.dumps(payload), status=QUEUED, attempts=0,
+        max_attempts=max_attempts, run_at=now + timedelta(seconds=delay), created_at=now,
+    )
+    if key is not None:
+        stmt = stmt.on_conflict_do_nothing(index_elements=['key'])
+    db.session.execute(stmt)
+
+
+def retry_delay(attempts):
+    return min(RETRY_BASE * 2 ** (attempts - 1), RETRY_MAX)
+
+
+# ──────────────── WORKER ────────────────
+
+def _requeue_expired(now):
+    job = Job.__table__
+    with db.engine.begin() as conn:
+        conn.execute(
+            job.update()
+            .where(job.c.status == RUNNING, job.c.locked_until < now)
+            .values(status=QUEUED, locked_by=None, locked_until=None, run_at=now)
+        )
+
+
+def claim(worker, kinds=None):
+    """Lock the next due job for ``worker``; returns its row or ``None``.
+
+    The subquery picks a candidate and the outer WHERE re-checks it, so when
+    two workers race for one job only one UPDATE matches.
+    """
+    now = datetime.utcnow()
+    job = Job.__table__
+    due = [job.c.status == QUEUED, job.c.run_at <= now]
+    if kinds:
+        due.append(job.c.kind.in_(kinds))
+    candidate = db.select(job.c.id).where(*due).order_by(job.c.run_at, job.c.id).limit(1).scalar_subquery()
+    with db.engine.begin() as conn:
+        return conn.execute(
+            job.update()
+            .where(job.c.id == candidate, *due)
+            .values(status=RUNNING, attempts=job.c.attempts + 1, locked_by=worker,
+                    locked_until=now + timedelta(seconds=LEASE_SECONDS))
+            .returning(job.c.id, job.c.kind, job.c.payload, job.c.attempts, job.c.max_attempts)
+        ).first()
+
+
+def run(row, worker):
+    """Run a claimed job and record the outcome. Returns True if it succeeded."""
+    job = Job.__table__
+    mine = [job.c.id == row.id, job.c.status == RUNNING, job.c.locked_by == worker]
+    try:
+        fn = HANDLERS.get(row.kind)
+        if fn is None:
+            raise LookupError(f'No handler for job kind {row.kind!r}')
+        fn(**json.loads(row.payload))
+        finished = db.session.execute(
+            job.update().where(*mine)
+            .values(status=DONE, finished_at=datetime.utcnow(), locked_by=None,
+                    locked_until=None, last_error=None)
+        )
+        if finished.rowcount != 1:
+            # The lease ran out and another worker has the job; drop our writes
+            db.session.rollback()
+            logger.warning('Job %s lost its lease; discarded this run', row.id)
+            return False
+        db.session.commit()
+        return True
+    except Exception as e:
+        db.session.rollback()
+        failed = row.attempts >= row.max_attempts or isinstance(e, LookupError)
+        logger.log(logging.ERROR if failed else logging.WARNING, 'Job %s (%s) attempt %d failed: %r',
+                   row.id, row.kind, row.attempts, e)
+        if failed:
+            _give_up(row)
+        marked = db.session.execute(
+            job.update().where(*mine)
+            .values(status=FAILED if failed else QUEUED, locked_by=None, locked_until=None,
+                    last_error=repr(e)[:2000],
+                    run_at=datetime.utcnow() + timedelta(seconds=retry_delay(row.attempts)))
+        )
+        if marked.rowcount != 1:
+            db.session.rollback()  # another worker has the job now; it decides
+            return False
+        db.session.commit()
+        return False
+    finally:
+        db.session.remove()
+
+
+def _give_up(row):
+    """Run the kind's ``on_failure`` handler; its writes commit with the ``failed`` mark."""
+    on_failure = FAILURE_HANDLERS.get(row.kind)
+    if on_failure is None:
+        return
+    try:
+        on_failure(**json.loads(row.payload))
+    except Exception:
+        db.session.rollback()
+        logger.exception('Failure handler of job %s (%s) raised', row.id, row.kind)
+
+
+def run_periodic(next_runs):
+    """Run the periodic tasks that are due; ``next_runs`` maps name -> monotonic time."""
+    now = time.monotonic()
+    for name, (seconds, fn) in PERIODIC.items():
+        if now < next_runs.get(name, 0):
+            continue
+        next_runs[name] = now + seconds
+        try:
+            fn()
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            logger.exception('Periodic task %s failed', name)
+        finally:
+            db.session.remove()
+
+
+def work(burst=False, kinds=None, poll_interval=POLL_INTERVAL, worker=None):
+    """Claim and run jobs until stopped, or until none are due when ``burst``.
+
+    Periodic tasks run as they come due (once, at the start, when ``burst``).
+    Returns the number of jobs run.
+    """
+    worker = worker or f'{socket.gethostname()}:{os.getpid()}'
+    done = 0
+    next_runs = {}
+    while True:
+        run_periodic(next_runs)
+        _requeue_expired(datetime.utcnow())
+        row = claim(worker, kinds)
+        if row is None:
+            if burst:
+                return done
+            time.sleep(poll_interval)
+            continue
+        run(row, worker)
+        done += 1
+
+
+def _worker_process(kinds, poll_interval):
+    from app import create_app
+    app = create_app()
+    with app.app_context():
+        work(kinds=kinds, poll_interval=poll_interval)
+
+
+# ──────────────── CLI ────────────────
+
+jobs_cli = AppGroup('jobs', help='Background job queue.')
+
+
+@jobs_cli.command('work')
+@click.option('--processes', default=1, show_default=True, help='Worker processes to start.')
+@click.option('--burst', is_flag=True, help='Exit once no job is due (single process).')
+@click.option('--kind', 'kinds', multiple=True, help='Only run jobs of this kind.')
+@click.option('--poll-interval', default=POLL_INTERVAL, show_default=True)
+@with_appcontext
+def work_command(processes, burst, kinds, poll_interval):
+    """Run queued jobs."""
+    logging.basicConfig(level=logging.INFO)
+    kinds = list(kinds) or None
+    if burst or processes <= 1:
+        done = work(burst=burst, kinds=kinds, poll_interval=poll_interval)
+        click.echo(f'Ran {done} job(s).')
+        return
+    # Spawned children build their own app and engine instead of sharing this one's connections
+    context = multiprocessing.get_context('spawn')
+    children = [context.Process(target=_worker_process, args=(kinds, poll_interval), daemon=True)
+                for _ in range(processes)]
+    for child in children:
+        child.start()
+    try:
+        for child in children:
+            child.join()
+    except KeyboardInterrupt:
+        for child in children:
+            child.terminate()
+
+
+@jobs_cli.command('status')
+@with_appcontext
+def status_command():
+    """Count jobs by kind and status."""
+    rows = db.session.execute(
+        db.select(Job.kind, Job.status, db.func.count(Job.id))
+        .group_by(Job.kind, Job.status).order_by(Job.kind, Job.status)
+    ).all()
+    if not rows:
+        click.echo('No jobs.')
+    for kind, status, count in rows:
+        click.echo(f'{kind:<20} {status:<8} {count}')
+
+
+@jobs_cli.command('retry')
+@click.option('--kind', help='Only retry jobs of this kind.')
+@with_appcontext
+def retry_command(kind):
+    """Queue failed jobs again with a fresh attempt count."""
+    query = db.update(Job).where(Job.status == FAILED)
+    if kind:
+        query = query.where(Job.kind == kind)
+    result = db.session.execute(query.values(status=QUEUED, attempts=0, run_at=datetime.utcnow()))
+    db.session.commit()
+    click.echo(f'Queued {result.rowcount} job(s) again.')
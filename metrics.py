@@ -0,0 +1,190 @@
+"""Per-endpoint request instrumentation.
+
+SQLAlchemy cursor events count the statements each request issues and the
+time spent in them; Flask request hooks record latency. With
+``SERVER_TIMING`` on, responses get a ``Server-Timing`` header (``db`` and
+``app``); it is off by default since it tells any client how many queries
+a page runs. Requests issuing more than ``N_PLUS_ONE_THRESHOLD``
+statements are logged as likely N+1 queries together with the statement
+repeated most.
+
+``/admin/metrics`` renders the registry in the Prometheus text format.
+Counters live in each worker process, so Prometheus should scrape every
+worker (or sum what it gets) - there is no cross-process aggregation.
+"""
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter
+
+from flask import current_app, g, has_request_context, request
+from sqlalchemy import event
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+
+class Histogram:
+    __slots__ = ('buckets', 'counts', 'sum', 'count')
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Registry:
+    """Thread-safe per-process store of request metrics, keyed by endpoint."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latency = {}        # (endpoint, method) -> Histogram
+        self.queries = {}        # endpoint -> Histogram of statements per request
+        self.requests = Counter()  # (endpoint, method, status)
+        self.db_seconds = Counter()  # endpoint
+        self.n_plus_one = Counter()  # endpoint
+
+    def record(self, endpoint, method, status, seconds, query_count, db_seconds, flagged):
+        with self._lock:
+            key = (endpoint, method)
+            if key not in self.latency:
+                self.latency[key] = Histogram(LATENCY_BUCKETS)
+            self.latency[key].observe(seconds)
+            if endpoint not in self.queries:
+                self.queries[endpoint] = Histogram(QUERY_BUCKETS)
+            self.queries[endpoint].observe(query_count)
+            self.requests[(endpoint, method, status)] += 1
+            self.db_seconds[endpoint] += db_seconds
+            if flagged:
+                self.n_plus_one[endpoint] += 1
+
+    def render(self, extra=()):
+        """The registry in Prometheus text exposition format."""
+        lines = []
+        with self._lock:
+            lines += _histogram('shopeasy_request_duration_seconds', 'Request latency by endpoint.',
+                                {(('endpoint', e), ('method', m)): h for (e, m), h in self.latency.items()})
+            lines += _counter('shopeasy_requests_total', 'Requests by endpoint, method and status.',
+                              {(('endpoint', e), ('method', m), ('status', str(s))): v
+                               for (e, m, s), v in self.requests.items()})
+            lines += _histogram('shopeasy_db_queries_per_request', 'SQL statements issued per request.',
+                                {(('endpoint', e),): h for e, h in self.queries.items()})
+            lines += _counter('shopeasy_db_duration_seconds_total', 'Time spent executing SQL.',
+                              {(('endpoint', e),): v for e, v in self.db_seconds.items()})
+            lines += _counter('shopeasy_n_plus_one_total', 'Requests over the N+1 query threshold.',
+                              {(('endpoint', e),): v for e, v in self.n_plus_one.items()})
+        for name, kind, help_text, value in extra:
+            lines += [f'# HELP {name} {help_text}', f'# TYPE {name} {kind}', f'{name} {_number(value)}']
+        return '\n'.join(lines) + '\n'
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(pairs):
+    return '{' + ','.join(f'{k}="{_escape(v)}"' for k, v in pairs) + '}'
+
+
+def _counter(name, help_text, samples):
+    lines = [f'# HELP {name} {help_text}', f'# TYPE {name} counter']
+    for labels, value in sorted(samples.items()):
+        lines.append(f'{name}{_labels(labels)} {_number(value)}')
+    return lines
+
+
+def _histogram(name, help_text, samples):
+    lines = [f'# HELP {name} {help_text}', f'# TYPE {name} histogram']
+    for labels, hist in sorted(samples.items()):
+        cumulative = 0
+        for bound, count in zip(hist.buckets + (float('inf'),), hist.counts):
+            cumulative += count
+            le = '+Inf' if bound == float('inf') else _number(bound)
+            lines.append(f'{name}_bucket{_labels(labels + (("le", le),))} {cumulative}')
+        lines.append(f'{name}_sum{_labels(labels)} {_number(hist.sum)}')
+        lines.append(f'{name}_count{_labels(labels)} {hist.count}')
+    return lines
+
+
+def get_registry():
+    return current_app.extensions['shopeasy_metrics']
+
+
+# ──────────────── HOOKS ────────────────
+
+def _tracking():
+    return has_request_context() and 'request_started' in g
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None and _tracking():
+        context._metrics_started = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, '_metrics_started', None)
+    if started is None or not _tracking():
+        return
+    g.db_seconds += time.perf_counter() - started
+    g.statements[statement] += 1
+
+
+def _start_request():
+    g.request_started = time.perf_counter()
+    g.db_seconds = 0.0
+    g.statements = Counter()
+
+
+def _finish_request(response):
+    if 'request_started' not in g:
+        return response
+    app = current_app
+    elapsed = time.perf_counter() - g.request_started
+    query_count = sum(g.statements.values())
+    endpoint = request.endpoint or 'unmatched'
+
+    threshold = app.config.get('N_PLUS_ONE_THRESHOLD', 20)
+    flagged = bool(threshold) and query_count > threshold
+    if flagged:
+        statement, repeats = g.statements.most_common(1)[0]
+        app.logger.warning(
+            'Possible N+1 on %s %s: %d queries (%d x %s)',
+            request.method, request.path, query_count, repeats, ' '.join(statement.split())[:200]
+        )
+
+    get_registry().record(endpoint, request.method, response.status_code,
+                          elapsed, query_count, g.db_seconds, flagged)
+
+    if app.config.get('SERVER_TIMING', False):
+        response.headers.add(
+            'Server-Timing',
+            f'db;dur={g.db_seconds * 1000:.1f};desc="{query_count} queries", app;dur={elapsed * 1000:.1f}'
+        )
+    return response
+
+
+def init_metrics(app, db):
+    if not app.config.get('METRICS_ENABLED', True):
+        return None
+    registry = Registry()
+    app.extensions['shopeasy_metrics'] = registry
+
+    with app.app_context():
+        engines = list(db.engines.values())
+    for engine in engines:
+        event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(engine, 'after_cursor_execute', _after_cursor_execute)
+
+    app.before_request(_start_request)
+    app.after_request(_finish_request)
+    return registry
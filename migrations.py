@@ -0,0 +1,187 @@
+"""Versioned schema migrations.
+
+Each migration is a function registered with ``@migration(version, name)``
+and receives a SQLAlchemy connection inside its own transaction. Applied
+versions are recorded in ``schema_migrations`` so an existing database
+(e.g. the live ``shopeasy_v2.db``) is brought forward in place instead of
+being recreated.
+
+Rules for new migrations:
+
+* never edit one that has shipped - add a new version instead;
+* keep them idempotent (``IF NOT EXISTS`` / column checks), because the
+  baseline uses ``create_all`` and so a fresh database already has every
+  table and index declared in ``models.py``.
+
+CLI: ``flask --app app db upgrade | status``. ``benchmarks/check_indexes.py``
+runs every migration on a fresh database and checks that the queries the
+routes issue use an index.
+"""
+from datetime import datetime
+
+import click
+from flask.cli import AppGroup
+from sqlalchemy import inspect, text
+from sqlalchemy.exc import IntegrityError
+
+import analytics
+import browse
+import search
+from models import db, CategoryFacet, Job, Product, SalesRollup, StockReservation
+
+MIGRATIONS = []
+
+
+def migration(version, name):
+    def register(fn):
+        MIGRATIONS.append((version, name, fn))
+        MIGRATIONS.sort(key=lambda m: m[0])
+        return fn
+    return register
+
+
+def has_column(conn, table, column):
+    return column in {c['name'] for c in inspect(conn).get_columns(table)}
+
+
+# ──────────────── MIGRATIONS ────────────────
+
+@migration(1, 'baseline schema')
+def _baseline(conn):
+    db.metadata.create_all(bind=conn)
+
+
+@migration(2, 'indexes for hot lookup columns')
+def _hot_indexes(conn):
+    statements = [
+        'CREATE INDEX IF NOT EXISTS ix_cart_item_user_product_size '
+        'ON cart_item (user_id, product_id, size)',
+        'CREATE INDEX IF NOT EXISTS ix_product_created_at_id ON product (created_at, id)',
+        'CREATE INDEX IF NOT EXISTS ix_product_category_created_at ON product (category, created_at)',
+        'CREATE INDEX IF NOT EXISTS ix_product_featured_created_at ON product (featured, created_at)',
+        'CREATE INDEX IF NOT EXISTS ix_order_status_created_at ON "order" (status, created_at)',
+        'CREATE INDEX IF NOT EXISTS ix_order_created_at ON "order" (created_at)',
+        'CREATE INDEX IF NOT EXISTS ix_order_item_order_id ON order_item (order_id)',
+    ]
+    for statement in statements:
+        conn.execute(text(statement))
+
+
+@migration(3, 'stock reservations')
+def _stock_reservations(conn):
+    StockReservation.__table__.create(bind=conn, checkfirst=True)
+
+
+@migration(4, 'product full-text search index')
+def _product_fts(conn):
+    if conn.dialect.name == 'sqlite':
+        search.create_index(conn)
+
+
+@migration(5, 'admin table indexes')
+def _admin_indexes(conn):
+    conn.execute(text('CREATE INDEX IF NOT EXISTS ix_user_created_at ON "user" (created_at)'))
+
+
+@migration(6, 'sales rollups')
+def _sales_rollups(conn):
+    SalesRollup.__table__.create(bind=conn, checkfirst=True)
+    analytics.backfill(conn)
+
+
+@migration(7, 'product sku')
+def _product_sku(conn):
+    if not has_column(conn, 'product', 'sku'):
+        conn.execute(text('ALTER TABLE product ADD COLUMN sku VARCHAR(64)'))
+    # Give existing products a key so catalogue imports can update them
+    conn.execute(text("UPDATE product SET sku = 'SE-' || id WHERE sku IS NULL"))
+    conn.execute(text('CREATE UNIQUE INDEX IF NOT EXISTS uq_product_sku ON product (sku)'))
+
+
+@migration(8, 'job queue and checkout idempotency keys')
+def _job_queue(conn):
+    Job.__table__.create(bind=conn, checkfirst=True)
+    if not has_column(conn, 'order', 'idempotency_key'):
+        conn.execute(text('ALTER TABLE "order" ADD COLUMN idempotency_key VARCHAR(64)'))
+    conn.execute(text('CREATE UNIQUE INDEX IF NOT EXISTS uq_order_user_idempotency_key '
+                      'ON "order" (user_id, idempotency_key)'))
+
+
+@migration(9, 'browse indexes and category facets')
+def _browse(conn):
+    if not has_column(conn, 'product', 'discount_pct'):
+        conn.execute(text('ALTER TABLE product ADD COLUMN discount_pct INTEGER NOT NULL DEFAULT 0'))
+    browse.refresh_discounts(conn)
+    for index in Product.__table__.indexes:
+        if index.name.startswith('ix_product_browse_'):
+            index.create(bind=conn, checkfirst=True)
+    CategoryFacet.__table__.create(bind=conn, checkfirst=True)
+    browse.rebuild_facets(conn)
+
+
+@migration(10, 'order payment id index')
+def _order_payment_id(conn):
+    # verify_payment looks up other orders paid with the same payment id
+    conn.execute(text('CREATE INDEX IF NOT EXISTS ix_order_payment_id ON "order" (payment_id)'))
+
+
+# ──────────────── RUNNER ────────────────
+
+def _ensure_version_table():
+    with db.engine.begin() as conn:
+        conn.execute(text(
+            'CREATE TABLE IF NOT EXISTS schema_migrations ('
+            'version INTEGER PRIMARY KEY, name VARCHAR(200) NOT NULL, applied_at TIMESTAMP NOT NULL)'
+        ))
+
+
+def applied_versions():
+    _ensure_version_table()
+    with db.engine.connect() as conn:
+        return {row[0] for row in conn.execute(text('SELECT version FROM schema_migrations'))}
+
+
+def upgrade():
+    """Apply every pending migration in order. Returns the versions applied."""
+    done = applied_versions()
+    applied = []
+    for version, name, fn in MIGRATIONS:
+        if version in done:
+            continue
+        try:
+            with db.engine.begin() as conn:
+                fn(conn)
+                conn.execute(
+                    text('INSERT INTO schema_migrations (version, name, applied_at) '
+                         'VALUES (:version, :name, :applied_at)'),
+                    {'version': version, 'name': name, 'applied_at': datetime.utcnow()}
+                )
+        except IntegrityError:
+            # Another worker recorded this version first; the DDL is idempotent.
+            continue
+        applied.append(version)
+    return applied
+
+
+# ──────────────── CLI ────────────────
+
+db_cli = AppGroup('db', help='Database schema commands.')
+
+
+@db_cli.command('upgrade')
+def upgrade_command():
+    """Apply pending migrations."""
+    applied = upgrade()
+    if applied:
+        click.echo(f"Applied migrations: {', '.join(map(str, applied))}")
+    else:
+        click.echo('Database is up to date.')
+
+
+@db_cli.command('status')
+def status_command():
+    """List migrations and whether they are applied."""
+    done = applied_versions()
+    for version, name, _ in MIGRATIONS:
+        mark = 'x' if version in done else ' '
+        click.echo(f'[{mark}] {version:04d} {name}')
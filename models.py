@@ -2,12 +2,16 @@ from flask_sqlalchemy import SQLAlchemy
 from flask_login import UserMixin
 from werkzeug.security import generate_password_hash, check_password_hash
 from datetime import datetime
+from database import RoutingSession
 
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 
 
 class User(UserMixin, db.Model):
     """User model for authentication."""
+    __table_args__ = (
+        db.Index('ix_user_created_at', 'created_at'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(80), unique=True, nullable=False)
     email = db.Column(db.String(120), unique=True, nullable=False)
@@ -31,7 +35,19 @@ class User(UserMixin, db.Model):
 
 class Product(db.Model):
     """Product model."""
+    __table_args__ = (
+        db.Index('ix_product_created_at_id', 'created_at', 'id'),
+        db.Index('ix_product_category_created_at', 'category', 'created_at'),
+        db.Index('ix_product_featured_created_at', 'featured', 'created_at'),
+        db.Index('uq_product_sku', 'sku', unique=True),
+        # Covering indexes for filtered category browsing, one per sort (see browse.py)
+        db.Index('ix_product_browse_newest', 'category', 'created_at', 'id', 'price', 'stock',
+                 'discount_pct', 'sizes'),
+        db.Index('ix_product_browse_price', 'category', 'price', 'id', 'stock', 'discount_pct', 'sizes'),
+        db.Index('ix_product_browse_discount', 'category', 'discount_pct', 'id', 'price', 'stock', 'sizes'),
+    )
     id = db.Column(db.Integer, primary_key=True)
+    sku = db.Column(db.String(64), nullable=True)  # bulk import/export key (see catalog_io.py)
     name = db.Column(db.String(200), nullable=False)
     description = db.Column(db.Text, nullable=False)
     highlights = db.Column(db.Text, nullable=True) # "About this item" bullet points
@@ -42,10 +58,12 @@ class Product(db.Model):
     stock = db.Column(db.Integer, nullable=False, default=0)
     featured = db.Column(db.Boolean, default=False)
     sizes = db.Column(db.String(200), nullable=True) # Comma-separated sizes like "S,M,L,XL"
+    discount_pct = db.Column(db.Integer, nullable=False, default=0, server_default='0')  # kept by browse.py
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
     # Relationships
     cart_items = db.relationship('CartItem', backref='product', lazy=True, cascade='all, delete-orphan')
+    reservations = db.relationship('StockReservation', backref='product', lazy=True, cascade='all, delete-orphan')
     order_items = db.relationship('OrderItem', backref='product', lazy=True)
     
     @property
@@ -65,13 +83,45 @@ class Product(db.Model):
         if self.sizes:
             return [s.strip() for s in self.sizes.split(',') if s.strip()]
         return []
-    
+
+    # Public API fields and the columns each one needs loaded
+    API_FIELDS = {
+        'id': ('id',),
+        'sku': ('sku',),
+        'name': ('name',),
+        'description': ('description',),
+        'price': ('price',),
+        'original_price': ('original_price',),
+        'image': ('image',),
+        'category': ('category',),
+        'stock': ('stock',),
+        'featured': ('featured',),
+        'discount_percent': ('price', 'original_price'),
+        'highlights': ('highlights',),
+        'sizes': ('sizes',),
+    }
+
+    @classmethod
+    def columns_for(cls, fields):
+        names = {'id', 'created_at'}
+        for field in fields:
+            names.update(cls.API_FIELDS[field])
+        return [getattr(cls, name) for name in sorted(names)]
+
+    def to_dict(self, fields=None):
+        fields = fields or self.API_FIELDS.keys()
+        return {field: getattr(self, field) for field in fields}
+
     def __repr__(self):
         return f'<Product {self.name}>'
 
 
 class CartItem(db.Model):
     """Shopping cart item model."""
+    __table_args__ = (
+        # Leading user_id also serves the plain "cart for user" lookups
+        db.Index('ix_cart_item_user_product_size', 'user_id', 'product_id', 'size'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     product_id = db.Column(db.Integer, db.ForeignKey('product.id'), nullable=False)
@@ -83,14 +133,34 @@ class CartItem(db.Model):
         return f'<CartItem user={self.user_id} product={self.product_id}>'
 
 
+class StockReservation(db.Model):
+    """Stock held for a user between opening checkout and placing the order."""
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
+    product_id = db.Column(db.Integer, db.ForeignKey('product.id'), nullable=False)
+    quantity = db.Column(db.Integer, nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<StockReservation user={self.user_id} product={self.product_id} qty={self.quantity}>'
+
+
 class Order(db.Model):
     """Order model."""
+    __table_args__ = (
+        db.Index('ix_order_status_created_at', 'status', 'created_at'),
+        db.Index('ix_order_created_at', 'created_at'),
+        db.Index('uq_order_user_idempotency_key', 'user_id', 'idempotency_key', unique=True),
+        db.Index('ix_order_payment_id', 'payment_id'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     total_amount = db.Column(db.Float, nullable=False)
     status = db.Column(db.String(50), default='Pending')
     payment_id = db.Column(db.String(200), nullable=True)
     razorpay_order_id = db.Column(db.String(200), nullable=True)
+    idempotency_key = db.Column(db.String(64), nullable=True)  # makes retried checkouts safe
     
     # Shipping details
     full_name = db.Column(db.String(200), nullable=True)
@@ -112,7 +182,7 @@ class Order(db.Model):
 class OrderItem(db.Model):
     """Order item model."""
     id = db.Column(db.Integer, primary_key=True)
-    order_id = db.Column(db.Integer, db.ForeignKey('order.id'), nullable=False)
+    order_id = db.Column(db.Integer, db.ForeignKey('order.id'), nullable=False, index=True)
     product_id = db.Column(db.Integer, db.ForeignKey('product.id'), nullable=False)
     quantity = db.Column(db.Integer, nullable=False)
     price = db.Column(db.Float, nullable=False)
@@ -120,3 +190,60 @@ class OrderItem(db.Model):
     
     def __repr__(self):
         return f'<OrderItem order={self.order_id} product={self.product_id}>'
+
+
+class SalesRollup(db.Model):
+    """Pre-aggregated paid sales for one period and dimension (see analytics.py)."""
+    __table_args__ = (
+        db.UniqueConstraint('period', 'period_start', 'dimension', 'dimension_key',
+                            name='uq_sales_rollup_bucket'),
+        db.Index('ix_sales_rollup_lookup', 'period', 'dimension', 'period_start'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    period = db.Column(db.String(10), nullable=False)          # 'day' or 'week'
+    period_start = db.Column(db.Date, nullable=False)          # the day, or the Monday of the week
+    dimension = db.Column(db.String(20), nullable=False)       # 'total', 'category' or 'product'
+    dimension_key = db.Column(db.String(100), nullable=False, default='')  # category name / product id
+    revenue = db.Column(db.Float, nullable=False, default=0.0)
+    orders = db.Column(db.Integer, nullable=False, default=0)
+    units = db.Column(db.Integer, nullable=False, default=0)
+    
+    def __repr__(self):
+        return f'<SalesRollup {self.period} {self.period_start} {self.dimension}={self.dimension_key}>'
+
+
+class CategoryFacet(db.Model):
+    """Product count for one category and price bucket, kept current by browse.py."""
+    __table_args__ = (
+        db.UniqueConstraint('category', 'price_bucket', name='uq_category_facet'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    category = db.Column(db.String(100), nullable=False)
+    price_bucket = db.Column(db.Integer, nullable=False)  # lower bound of the bucket, see browse.PRICE_BUCKETS
+    products = db.Column(db.Integer, nullable=False, default=0)
+    
+    def __repr__(self):
+        return f'<CategoryFacet {self.category} {self.price_bucket}+={self.products}>'
+
+
+class Job(db.Model):
+    """Background job queue entry (see jobs.py)."""
+    __table_args__ = (
+        db.Index('ix_job_status_run_at', 'status', 'run_at'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(50), nullable=False)
+    key = db.Column(db.String(200), nullable=True, unique=True)  # idempotency key
+    payload = db.Column(db.Text, nullable=False, default='{}')   # JSON keyword arguments
+    status = db.Column(db.String(20), nullable=False, default='queued')
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    max_attempts = db.Column(db.Integer, nullable=False, default=5)
+    run_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    locked_by = db.Column(db.String(100), nullable=True)
+    locked_until = db.Column(db.DateTime, nullable=True)
+    last_error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    finished_at = db.Column(db.DateTime, nullable=True)
+    
+    def __repr__(self):
+        return f'<Job {self.id} {self.kind} {self.status}>'
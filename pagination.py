@@ -0,0 +1,101 @@
+"""Keyset (cursor) pagination helpers.
+
+Listings are ordered by a ``(created_at, id)`` pair descending. A cursor is
+the pair of the last row on a page, encoded as an opaque URL-safe token, so
+the next page is a plain range scan instead of an ``OFFSET`` that has to
+walk every skipped row. ``value_page`` does the same for any
+``(sort value, id)`` ordering, in either direction.
+"""
+import base64
+import json
+from datetime import datetime
+
+from models import db
+
+DEFAULT_LIMIT = 24
+MAX_LIMIT = 100
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(created_at, row_id):
+    raw = f'{created_at.isoformat()}|{row_id}'.encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        created_at, row_id = base64.urlsafe_b64decode(padded).decode().split('|')
+        return datetime.fromisoformat(created_at), int(row_id)
+    except (ValueError, UnicodeDecodeError):
+        raise InvalidCursor('Invalid cursor')
+
+
+def parse_limit(value, default=DEFAULT_LIMIT):
+    try:
+        limit = int(value) if value is not None else default
+    except (ValueError, TypeError):
+        limit = default
+    return max(1, min(limit, MAX_LIMIT))
+
+
+def keyset_page(query, created_col, id_col, limit, cursor=None):
+    """Return ``(rows, next_cursor)`` for one page of ``query``.
+
+    ``query`` must not be ordered yet; rows are returned newest first.
+    """
+    if cursor:
+        created_at, row_id = decode_cursor(cursor)
+        query = query.filter(db.or_(
+            created_col < created_at,
+            db.and_(created_col == created_at, id_col < row_id)
+        ))
+
+    rows = query.order_by(created_col.desc(), id_col.desc()).limit(limit + 1).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor(last.created_at, last.id)
+    return rows, next_cursor
+
+
+def encode_value_cursor(value, row_id):
+    if isinstance(value, datetime):
+        value = value.isoformat()
+    raw = json.dumps([value, row_id], separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_value_cursor(token, parse=None):
+    """Return ``(value, id)``; ``parse`` converts the value back (e.g. to a datetime)."""
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        value, row_id = json.loads(base64.urlsafe_b64decode(padded))
+        return (parse(value) if parse else value), int(row_id)
+    except (ValueError, TypeError, UnicodeDecodeError):
+        raise InvalidCursor('Invalid cursor')
+
+
+def value_page(select, sort_col, id_col, limit, cursor=None, descending=True, parse=None):
+    """Return ``([(id, value), ...], next_cursor)`` for one page of ``select``.
+
+    ``select`` is an unordered Core SELECT whose first two columns are the
+    id and the sort value; ties are broken by id in the same direction.
+    """
+    if cursor:
+        value, row_id = decode_value_cursor(cursor, parse)
+        if descending:
+            select = select.where(db.or_(sort_col < value, db.and_(sort_col == value, id_col < row_id)))
+        else:
+            select = select.where(db.or_(sort_col > value, db.and_(sort_col == value, id_col > row_id)))
+    order = (sort_col.desc(), id_col.desc()) if descending else (sort_col.asc(), id_col.asc())
+    rows = db.session.execute(select.order_by(*order).limit(limit + 1)).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_value_cursor(rows[-1][1], rows[-1][0])
+    return rows, next_cursor
@@ -0,0 +1,150 @@
+"""Password hashing on a small process pool instead of the request workers.
+
+scrypt is deliberately CPU- and memory-hard, so a burst of logins hashed
+inside gunicorn workers starves every other request. ``hash_password`` and
+``verify_password`` hand the work to a per-worker ``ProcessPoolExecutor``
+whose processes run at a lower CPU priority (``PASSWORD_HASH_NICE``), so
+browsing keeps the CPU under a login storm. At most
+``PASSWORD_HASH_WORKERS + PASSWORD_HASH_QUEUE`` hashes are in flight per
+worker; beyond that ``HashingBusy`` is raised at once instead of queueing
+requests behind each other. Keep that sum below gunicorn's ``--threads``
+so some threads are always free for other requests. A crashed hashing
+process also raises ``HashingBusy``, and the next call gets a new pool.
+
+The pool uses the ``forkserver`` start method, so hashing processes start
+from a clean interpreter rather than a copy of a threaded worker. As with
+any multiprocessing code, a script that logs users in needs an
+``if __name__ == '__main__':`` guard.
+
+``verify_password`` also returns a new hash when the stored one was made
+with other parameters than ``PASSWORD_HASH_METHOD``, so raising the cost
+upgrades accounts as their owners log in.
+
+``PASSWORD_HASH_WORKERS = 0`` hashes inline (CLI, tests).
+"""
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import get_context
+
+from flask import current_app
+from werkzeug.security import DEFAULT_PBKDF2_ITERATIONS, check_password_hash, generate_password_hash
+
+# Defaults werkzeug fills in for a bare method name
+SCRYPT_DEFAULTS = ('32768', '8', '1')
+PBKDF2_DEFAULTS = ('sha256', str(DEFAULT_PBKDF2_ITERATIONS))
+
+
+class HashingBusy(Exception):
+    """Too many hashes are already queued; the caller should answer 503."""
+
+
+def method_prefix(method):
+    """The parameter prefix werkzeug writes for ``method`` (``scrypt`` -> ``scrypt:32768:8:1``)."""
+    name, *params = method.split(':')
+    defaults = SCRYPT_DEFAULTS if name == 'scrypt' else PBKDF2_DEFAULTS if name == 'pbkdf2' else ()
+    return ':'.join([name, *params, *defaults[len(params):]])
+
+
+def needs_rehash(pwhash, method):
+    return pwhash.split('$', 1)[0] != method_prefix(method)
+
+
+# Run in the pool processes; module-level so they pickle by reference
+
+def _lower_priority(nice):
+    if nice:
+        os.nice(nice)
+
+
+def _verify(pwhash, password, method):
+    """Return ``(matches, new_hash)``; ``new_hash`` is set when the cost changed."""
+    if not check_password_hash(pwhash, password):
+        return False, None
+    if needs_rehash(pwhash, method):
+        return True, generate_password_hash(password, method)
+    return True, None
+
+
+class PasswordHasher:
+    def __init__(self, method='scrypt', workers=1, queue=1, timeout=10, nice=10):
+        self.method = method
+        self.workers = workers
+        self.timeout = timeout
+        self.nice = nice
+        self._slots = threading.BoundedSemaphore(workers + queue) if workers else None
+        self._executor = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def _pool(self):
+        # Created on first use, after gunicorn has forked this worker
+        with self._lock:
+            if self._executor is None or self._pid != os.getpid():
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers, mp_context=get_context('forkserver'),
+                    initializer=_lower_priority, initargs=(self.nice,),
+                )
+                self._pid = os.getpid()
+            return self._executor
+
+    def _run(self, fn, *args):
+        if not self.workers:
+            return fn(*args)
+        if not self._slots.acquire(blocking=False):
+            raise HashingBusy('Password hashing queue is full')
+        pool = None
+        try:
+            pool = self._pool()
+            return pool.submit(fn, *args).result(timeout=self.timeout)
+        except TimeoutError:
+            raise HashingBusy(f'Password hashing took over {self.timeout}s')
+        except BrokenProcessPool as e:
+            # A hashing process died; the next call starts a fresh pool and
+            # this one gets the same 503 as a full queue
+            with self._lock:
+                if self._executor is pool:
+                    self._executor = None
+            if pool is not None:
+                pool.shutdown(wait=False, cancel_futures=True)
+            raise HashingBusy('Password hashing process crashed') from e
+        finally:
+            self._slots.release()
+
+    def hash(self, password):
+        return self._run(generate_password_hash, password, self.method)
+
+    def verify(self, pwhash, password):
+        return self._run(_verify, pwhash, password, self.method)
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+
+def init_passwords(app):
+    hasher = PasswordHasher(
+        method=app.config.get('PASSWORD_HASH_METHOD', 'scrypt'),
+        workers=app.config.get('PASSWORD_HASH_WORKERS', 1),
+        queue=app.config.get('PASSWORD_HASH_QUEUE', 1),
+        timeout=app.config.get('PASSWORD_HASH_TIMEOUT', 10),
+        nice=app.config.get('PASSWORD_HASH_NICE', 10),
+    )
+    app.extensions['shopeasy_passwords'] = hasher
+    return hasher
+
+
+def get_hasher():
+    return current_app.extensions['shopeasy_passwords']
+
+
+def hash_password(password):
+    return get_hasher().hash(password)
+
+
+def verify_password(pwhash, password):
+    """``(matches, new_hash)``; store ``new_hash`` when it is not None."""
+    return get_hasher().verify(pwhash, password)
@@ -0,0 +1,183 @@
+"""Payment verification and order finalisation, run by the job queue.
+
+Checkout no longer trusts the ``payment_id`` the browser sends. The
+checkout page creates the Razorpay order on the server
+(``create_razorpay_order``) and the placed order keeps its id; the order is
+saved as ``Processing`` together with a ``verify_payment`` job. The job
+asks Razorpay for the payment (and checks the signature when the browser
+sent one), requires it to belong to that Razorpay order and not to have
+paid another order already, captures it if it is only authorised, and
+moves the order to ``Paid`` or ``Payment Failed``; a failed payment gives
+its stock back. A ``Paid`` order gets an ``order_paid`` job for the side effects
+(sales rollups, dashboard stats).
+
+Each handler checks the order's current status before acting, so running a
+job twice changes nothing. A Razorpay 4xx answer (an unknown or invalid
+payment id) rejects the payment; other Razorpay errors propagate and the
+queue retries them with backoff. When it gives up, the order fails and its
+stock comes back, so it never stays ``Processing``.
+
+Without real API keys (the ``XXXX`` placeholders in ``config.py``) the
+client is ``None`` and only the checkout page's simulated ``pay_sim_``
+payments are accepted. ``init_payments(app, client)`` installs another
+client, e.g. a stub in tests.
+"""
+import logging
+
+import razorpay
+from flask import current_app
+from razorpay.errors import BadRequestError, SignatureVerificationError
+
+from admin_service import invalidate_admin_stats
+from analytics import record_order
+from inventory import restock
+from jobs import enqueue, handler
+from models import db, Order, OrderItem, Product
+
+PROCESSING = 'Processing'
+PAID = 'Paid'
+PAYMENT_FAILED = 'Payment Failed'
+SIMULATED_PREFIX = 'pay_sim_'
+SHIPPING_FEE = 99
+FREE_SHIPPING_FROM = 999
+VERIFY_ATTEMPTS = 10  # ~1.5 hours of backoff for payments that are slow to settle
+
+logger = logging.getLogger(__name__)
+
+
+class PaymentPending(Exception):
+    """The payment has not settled yet; the job is retried later."""
+
+
+def amount_due(total):
+    """What the shopper is charged for ``total`` worth of items, shipping included."""
+    return total if total >= FREE_SHIPPING_FROM else total + SHIPPING_FEE
+
+
+def _placeholder(value):
+    return not value or 'XXXX' in value
+
+
+def init_payments(app, client=None):
+    if client is None:
+        key_id, secret = app.config.get('RAZORPAY_KEY_ID'), app.config.get('RAZORPAY_KEY_SECRET')
+        if not (_placeholder(key_id) or _placeholder(secret)):
+            client = razorpay.Client(auth=(key_id, secret))
+    app.extensions['razorpay_client'] = client
+
+
+def get_client():
+    return current_app.extensions.get('razorpay_client')
+
+
+def create_razorpay_order(total, receipt):
+    """Create the Razorpay order a checkout page pays; None when payments are simulated."""
+    client = get_client()
+    if client is None:
+        return None
+    return client.order.create({'amount': round(amount_due(total) * 100), 'currency': 'INR',
+                                'receipt': receipt})['id']
+
+
+def _paid_elsewhere(order_id, payment_id):
+    """EXISTS clause: another order has already been paid with ``payment_id``."""
+    other = db.aliased(Order)
+    return db.select(other.id).where(other.payment_id == payment_id, other.id != order_id,
+                                     other.status == PAID).exists()
+
+
+def _set_status(order_id, status, expected=PROCESSING, unless=None):
+    """Move an order on from ``expected``; False if another run got there first."""
+    query = db.update(Order).where(Order.id == order_id, Order.status == expected)
+    if unless is not None:
+        query = query.where(~unless)
+    result = db.session.execute(
+        query.values(status=status).execution_options(synchronize_session=False)
+    )
+    return result.rowcount == 1
+
+
+def mark_paid(order_id, expected=PROCESSING, payment_id=None):
+    """Mark the order Paid; with ``payment_id``, only if no other order is paid with it."""
+    unless = _paid_elsewhere(order_id, payment_id) if payment_id else None
+    if _set_status(order_id, PAID, expected, unless):
+        enqueue('order_paid', key=f'order_paid:{order_id}', order_id=order_id)
+        return True
+    return False
+
+
+def _reject(order_id, payment_id, reason):
+    if _set_status(order_id, PAYMENT_FAILED):
+        logger.warning('Payment %s for order %s rejected: %s', payment_id, order_id, reason)
+        restock(order_id)
+
+
+def _check_payment(client, order, payment_id, signature):
+    """Raise unless ``payment_id`` is a settled payment of this order's Razorpay order and amount."""
+    if not order.razorpay_order_id:
+        raise ValueError(f'Order {order.id} has no Razorpay order')
+    if signature:
+        client.utility.verify_payment_signature({
+            'razorpay_order_id': order.razorpay_order_id,
+            'razorpay_payment_id': payment_id,
+            'razorpay_signature': signature,
+        })
+    payment = client.payment.fetch(payment_id)
+    if payment.get('order_id') != order.razorpay_order_id:
+        raise ValueError(f"Payment {payment_id} belongs to Razorpay order {payment.get('order_id')}, "
+                         f'not {order.razorpay_order_id}')
+    expected = round(amount_due(order.total_amount) * 100)
+    if payment.get('currency') != 'INR' or payment.get('amount') != expected:
+        raise ValueError(f"Payment {payment_id} is for {payment.get('amount')} {payment.get('currency')}, "
+                         f'expected {expected} INR')
+    status = payment.get('status')
+    if status == 'authorized':
+        client.payment.capture(payment_id, expected, {'currency': 'INR'})
+    elif status in ('created', 'pending'):
+        raise PaymentPending(f'Payment {payment_id} is {status}')
+    elif status != 'captured':
+        raise ValueError(f'Payment {payment_id} is {status}')
+
+
+def _verification_abandoned(order_id, payment_id, signature=None):
+    _reject(order_id, payment_id, 'verification failed on every attempt')
+
+
+@handler('verify_payment', on_failure=_verification_abandoned)
+def verify_payment(order_id, payment_id, signature=None):
+    order = db.session.get(Order, order_id)
+    if order is None or order.status != PROCESSING:
+        return
+
+    client = get_client()
+    try:
+        if db.session.execute(db.select(_paid_elsewhere(order_id, payment_id))).scalar():
+            raise ValueError(f'Payment {payment_id} has already paid another order')
+        if client is None:
+            if not payment_id.startswith(SIMULATED_PREFIX):
+                raise RuntimeError('Razorpay keys are not configured')
+            logger.warning('Accepting simulated payment %s for order %s', payment_id, order_id)
+        else:
+            _check_payment(client, order, payment_id, signature)
+    except (ValueError, SignatureVerificationError, BadRequestError) as e:
+        # The payment is definitely not good (Razorpay raises BadRequestError
+        # for every 4xx answer); other API errors propagate and are retried
+        _reject(order_id, payment_id, e)
+        return
+    if not mark_paid(order_id, payment_id=payment_id):
+        # Another order's verification claimed the same payment in the meantime
+        _reject(order_id, payment_id, 'payment has already paid another order')
+
+
+@handler('order_paid')
+def order_paid(order_id):
+    order = db.session.get(Order, order_id)
+    if order is None or order.status != PAID:
+        return
+    lines = db.session.execute(
+        db.select(OrderItem.product_id, Product.category, OrderItem.quantity, OrderItem.price)
+        .outerjoin(Product, Product.id == OrderItem.product_id)
+        .where(OrderItem.order_id == order_id)
+    ).all()
+    record_order(order, lines)
+    invalidate_admin_stats()
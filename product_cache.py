@@ -0,0 +1,131 @@
+"""Versioned product cache and conditional GET for product pages.
+
+``/product/<id>`` and ``/api/product/<id>`` read a serialized product from
+the shared cache instead of the database. Entries are keyed by a
+per-product stamp (a version token plus the time it was set), which
+``touch_product`` replaces when the admin edits or deletes the product, and
+by the ``products`` namespace version, which bulk catalogue imports bump.
+Entries expire after ``PRODUCT_CACHE_TIMEOUT`` so stock taken by checkouts
+shows up within that window.
+
+Responses carry an ``ETag`` (a hash of the serialized product; for HTML
+also of the signed-in user and the page template) and a ``Last-Modified``
+from the stamp. A request whose validators still match gets a bodiless 304
+from a few cache reads, with no database access and no rendering.
+"""
+import hashlib
+import json
+import time
+import uuid
+from datetime import datetime, timezone
+
+from flask import current_app, request
+from flask_login import current_user
+from werkzeug.http import is_resource_modified
+
+from cache import bump_version, get_cache, get_version
+from models import db, Product
+
+PRODUCT_CACHE_TIMEOUT = 60
+
+# Fields of the JSON API, plus the derived ones product.html reads
+API_FIELDS = ('id', 'name', 'description', 'price', 'original_price', 'category', 'stock',
+              'featured', 'image', 'highlights', 'sizes')
+PAGE_FIELDS = ('discount_percent', 'highlights_list', 'sizes_list')
+
+
+def _stamp_key(product_id):
+    return f'product:stamp:{product_id}'
+
+
+def _new_stamp():
+    return {'version': uuid.uuid4().hex[:12], 'modified': int(time.time())}
+
+
+def product_stamp(product_id):
+    """``{'version', 'modified'}`` of a product, created on first use."""
+    cache = get_cache()
+    stamp = cache.get(_stamp_key(product_id))
+    if stamp is None:
+        stamp = _new_stamp()
+        cache.set(_stamp_key(product_id), stamp, timeout=0)
+    return stamp
+
+
+def touch_product(product_id):
+    """Invalidate one product's cached data and move its Last-Modified on."""
+    get_cache().set(_stamp_key(product_id), _new_stamp(), timeout=0)
+
+
+def invalidate_products():
+    """Invalidate every cached product (after bulk writes)."""
+    bump_version('products')
+
+
+def _serialize(product):
+    return {field: getattr(product, field) for field in API_FIELDS + PAGE_FIELDS}
+
+
+def get_product_entry(product_id, fresh=False):
+    """``{'product', 'etag', 'modified'}`` for a product, or None if it does not exist.
+
+    ``fresh`` skips the cached copy (and refreshes it), e.g. for admins
+    about to edit the product.
+    """
+    cache = get_cache()
+    stamp = product_stamp(product_id)
+    key = f"product:data:{product_id}:{get_version('products')}:{stamp['version']}"
+    entry = None if fresh else cache.get(key)
+    if entry is None:
+        product = db.session.get(Product, product_id)
+        if product is None:
+            return None
+        data = _serialize(product)
+        digest = hashlib.sha256(json.dumps(data, sort_keys=True).encode()).hexdigest()
+        entry = {'product': data, 'etag': digest[:32], 'modified': stamp['modified']}
+        cache.set(key, entry, timeout=PRODUCT_CACHE_TIMEOUT)
+    return entry
+
+
+def api_data(entry):
+    return {field: entry['product'][field] for field in API_FIELDS}
+
+
+# ──────────────── CONDITIONAL GET ────────────────
+
+def _template_token():
+    """Hash of product.html and the asset fingerprints, computed once per app."""
+    token = current_app.extensions.get('shopeasy_product_page_token')
+    if token is None:
+        env = current_app.jinja_env
+        source = env.loader.get_source(env, 'product.html')[0]
+        assets = sorted(asset.digest for asset in current_app.extensions['shopeasy_assets'].assets.values())
+        token = hashlib.sha256('\n'.join([source, *assets]).encode()).hexdigest()[:16]
+        current_app.extensions['shopeasy_product_page_token'] = token
+    return token
+
+
+def page_etag(entry):
+    """ETag of the rendered page, which also shows who is signed in."""
+    if current_user.is_authenticated:
+        viewer = f'{current_user.id}:{current_user.username}:{current_user.is_admin}'
+    else:
+        viewer = 'anonymous'
+    raw = f"{entry['etag']}|{viewer}|{_template_token()}"
+    return hashlib.sha256(raw.encode()).hexdigest()[:32]
+
+
+def with_validators(response, etag, modified, cache_control):
+    """Attach the ETag, Last-Modified and Cache-Control headers."""
+    response.set_etag(etag)
+    response.last_modified = datetime.fromtimestamp(modified, timezone.utc)
+    response.headers['Cache-Control'] = cache_control
+    return response
+
+
+def not_modified(etag, modified, cache_control):
+    """A 304 response if the request's validators match, else None."""
+    if is_resource_modified(request.environ, etag=etag,
+                            last_modified=datetime.fromtimestamp(modified, timezone.utc)):
+        return None
+    return with_validators(current_app.response_class(status=304), etag, modified, cache_control)
@@ -0,0 +1,115 @@
+"""Token-bucket rate limits shared by every gunicorn worker.
+
+A bucket holds up to ``burst`` tokens and refills at ``per_minute``; each
+attempt takes one token and is refused when none is left. Buckets live in
+the cache's SQLite file (``CACHE_PATH``, table ``rate_limit``) and are
+updated inside ``BEGIN IMMEDIATE``, so concurrent workers never both spend
+the last token. With ``CACHE_TYPE`` ``memory`` or ``null`` the buckets are
+per-process instead.
+
+The login and register routes check a bucket per client IP and, for
+logins, per account, before any password is hashed.
+"""
+import os
+import random
+import sqlite3
+import threading
+import time
+
+from flask import current_app
+
+# Buckets idle this long are full again and can be dropped
+PRUNE_AFTER = 3600
+# Fraction of attempts that also drop idle buckets
+PRUNE_PROBABILITY = 0.01
+
+
+class RateLimited(Exception):
+    def __init__(self, retry_after):
+        super().__init__(f'Rate limited; retry in {retry_after}s')
+        self.retry_after = retry_after
+
+
+def _refill(tokens, updated, now, burst, per_minute):
+    return min(burst, tokens + (now - updated) * per_minute / 60)
+
+
+def _retry_after(tokens, per_minute):
+    return max(1, int((1 - tokens) * 60 / per_minute) + 1)
+
+
+class MemoryLimiter:
+    def __init__(self):
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def take(self, key, burst, per_minute, now=None):
+        """Spend a token from ``key``; raises ``RateLimited`` when it is empty."""
+        now = time.time() if now is None else now
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (burst, now))
+            tokens = _refill(tokens, updated, now, burst, per_minute)
+            if tokens < 1:
+                self._buckets[key] = (tokens, now)
+                raise RateLimited(_retry_after(tokens, per_minute))
+            self._buckets[key] = (tokens - 1, now)
+            if random.random() < PRUNE_PROBABILITY:
+                self._buckets = {k: v for k, v in self._buckets.items() if v[1] >= now - PRUNE_AFTER}
+
+
+class SQLiteLimiter:
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or getattr(self._local, 'pid', None) != os.getpid():
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS rate_limit '
+                '(key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)'
+            )
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def take(self, key, burst, per_minute, now=None):
+        now = time.time() if now is None else now
+        conn = self._conn()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            row = conn.execute('SELECT tokens, updated FROM rate_limit WHERE key = ?', (key,)).fetchone()
+            tokens = _refill(*row, now, burst, per_minute) if row else burst
+            allowed = tokens >= 1
+            conn.execute('INSERT OR REPLACE INTO rate_limit (key, tokens, updated) VALUES (?, ?, ?)',
+                         (key, tokens - 1 if allowed else tokens, now))
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        if random.random() < PRUNE_PROBABILITY:
+            self.prune(now)
+        if not allowed:
+            raise RateLimited(_retry_after(tokens, per_minute))
+
+    def prune(self, now=None):
+        now = time.time() if now is None else now
+        self._conn().execute('DELETE FROM rate_limit WHERE updated < ?', (now - PRUNE_AFTER,))
+
+
+def init_rate_limits(app):
+    if app.config.get('CACHE_TYPE', 'sqlite') == 'sqlite':
+        limiter = SQLiteLimiter(app.config['CACHE_PATH'])
+    else:
+        limiter = MemoryLimiter()
+    app.extensions['shopeasy_rate_limiter'] = limiter
+    return limiter
+
+
+def limit(key, burst, per_minute):
+    """Spend one token of ``key`` or raise ``RateLimited``."""
+    current_app.extensions['shopeasy_rate_limiter'].take(key, burst, per_minute)
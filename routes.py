@@ -1,13 +1,42 @@
-from flask import Blueprint, render_template, redirect, url_for, request, flash, jsonify, current_app
+from flask import (Blueprint, render_template, redirect, url_for, request, flash, jsonify, current_app, session,
+                   abort, make_response, stream_with_context)
 from flask_login import login_user, logout_user, login_required, current_user
 from models import db, User, Product, CartItem, Order, OrderItem
-from werkzeug.utils import secure_filename
-import os
-import json
+from search import search_products
+from browse import (InvalidFilter, SORT_LABELS, browse_products, bucket_range, category_counts, get_facets,
+                    parse_filters, price_facets)
+from cart_service import (get_cart_items, items_total, get_cart_summary, invalidate_cart,
+                          apply_cart_operations, CartBatchError)
+import guest_cart
+from inventory import InsufficientStock, reserve_cart, commit_cart
+from jobs import enqueue
+from payments import PAID, PROCESSING, VERIFY_ATTEMPTS, create_razorpay_order
+from sqlalchemy.exc import IntegrityError
+from database import read_only
+from pagination import InvalidCursor, keyset_page, parse_limit
+from sqlalchemy.orm import load_only
+from cache import get_cache, get_version, bump_version
+from passwords import HashingBusy, hash_password, verify_password
+from ratelimit import RateLimited, limit
+from product_cache import api_data, get_product_entry, not_modified, page_etag, touch_product, with_validators
+from images import save_upload
+from user_cache import get_user_cache
+from catalog_io import FORMATS as IMPORT_FORMATS, detect_format, export_products, import_products
+from analytics import PERIODS, DIMENSIONS, default_range, sales_series, top_products
+from admin_service import (ADMIN_PAGE_SIZE, get_admin_stats, invalidate_admin_stats,
+                           product_page, order_page, user_page, product_row, order_row, user_row)
+import hmac
+import secrets
+from datetime import datetime
 
 main = Blueprint('main', __name__)
 
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'webp'}
+SEARCH_PAGE_SIZE = 24
+HOME_CACHE_TIMEOUT = 3600
+HOME_PRODUCT_FIELDS = ('id', 'name', 'price', 'image', 'category', 'discount_percent')
+PRODUCT_PAGE_CACHE_CONTROL = 'private, no-cache'  # shows the signed-in user
+PRODUCT_API_CACHE_CONTROL = 'public, no-cache'
 
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
@@ -15,36 +44,91 @@ def allowed_file(filename):
 
 # ──────────────── PAGE ROUTES ────────────────
 
+def catalog_changed():
+    """Invalidate everything cached from the product table."""
+    bump_version('catalog')
+    invalidate_admin_stats()
+
+
+def _home_data(version):
+    """Featured/latest products and categories for the home page, cached per catalog version."""
+    cache = get_cache()
+    key = f'home:data:{version}'
+    data = cache.get(key)
+    if data is None:
+        featured = Product.query.filter_by(featured=True).limit(8).all()
+        latest = Product.query.order_by(Product.created_at.desc()).limit(12).all()
+        counts = category_counts()
+        data = {
+            'featured_products': [p.to_dict(HOME_PRODUCT_FIELDS) for p in featured],
+            'all_products': [p.to_dict(HOME_PRODUCT_FIELDS) for p in latest],
+            'categories': list(counts),
+            'category_counts': counts,
+        }
+        cache.set(key, data, timeout=HOME_CACHE_TIMEOUT)
+    return data
+
+
 @main.route('/')
+@read_only
 def index():
-    featured_products = Product.query.filter_by(featured=True).limit(8).all()
-    categories = db.session.query(Product.category).distinct().all()
-    categories = [c[0] for c in categories]
-    all_products = Product.query.order_by(Product.created_at.desc()).limit(12).all()
-    return render_template('index.html', 
-                         featured_products=featured_products, 
-                         all_products=all_products,
-                         categories=categories)
+    version = get_version('catalog')
+
+    # Anonymous visitors all get the same page, so cache the rendered HTML
+    # unless there is a flash message waiting to be shown.
+    cacheable = not current_user.is_authenticated and '_flashes' not in session
+    page_key = f'home:page:{version}'
+    if cacheable:
+        html = get_cache().get(page_key)
+        if html is not None:
+            return html
+
+    html = render_template('index.html', **_home_data(version))
+    if cacheable:
+        get_cache().set(page_key, html, timeout=HOME_CACHE_TIMEOUT)
+    return html
 
 
 @main.route('/product/<int:product_id>')
+@read_only
 def product_detail(product_id):
-    product = Product.query.get_or_404(product_id)
-    related = Product.query.filter(
-        Product.category == product.category, 
-        Product.id != product.id
-    ).limit(4).all()
-    return render_template('product.html', product=product, related_products=related)
+    entry = get_product_entry(product_id)
+    if entry is None:
+        abort(404)
+    etag = page_etag(entry)
+    # A pending flash message makes this render differ from the cached one
+    if '_flashes' not in session:
+        response = not_modified(etag, entry['modified'], PRODUCT_PAGE_CACHE_CONTROL)
+        if response is not None:
+            return response
+    response = make_response(render_template('product.html', product=entry['product']))
+    response.vary.add('Cookie')
+    return with_validators(response, etag, entry['modified'], PRODUCT_PAGE_CACHE_CONTROL)
 
 
 @main.route('/cart')
-@login_required
 def cart():
-    cart_items = CartItem.query.filter_by(user_id=current_user.id).all()
-    total = sum(item.product.price * item.quantity for item in cart_items)
+    if current_user.is_authenticated:
+        cart_items = get_cart_items(current_user.id)
+    else:
+        cart_items = guest_cart.with_products()
+    total = items_total(cart_items)
     return render_template('cart.html', cart_items=cart_items, total=total)
 
 
+def _refuse(template, message, status, retry_after):
+    """Re-render an auth form with ``message`` and a ``Retry-After`` header."""
+    flash(message, 'error')
+    response = make_response(render_template(template), status)
+    response.headers['Retry-After'] = str(retry_after)
+    return response
+
+
+def _limit_ip(action):
+    config = current_app.config
+    limit(f'{action}:ip:{request.remote_addr}', config['LOGIN_IP_BURST'], config['LOGIN_IP_PER_MINUTE'])
+
+
 @main.route('/login', methods=['GET', 'POST'])
 def login():
     if current_user.is_authenticated:
@@ -55,9 +139,31 @@ def login():
         password = request.form.get('password', '')
         remember = request.form.get('remember', False)
         
+        # Throttle before hashing, so a storm of guesses costs no CPU
+        try:
+            _limit_ip('login')
+            limit(f'login:account:{email.lower()}', current_app.config['LOGIN_ACCOUNT_BURST'],
+                  current_app.config['LOGIN_ACCOUNT_PER_MINUTE'])
+        except RateLimited as e:
+            return _refuse('login.html', 'Too many sign-in attempts. Please wait a minute and try again.',
+                           429, e.retry_after)
+        
         user = User.query.filter_by(email=email).first()
-        if user and user.check_password(password):
+        matches, new_hash = False, None
+        if user:
+            try:
+                matches, new_hash = verify_password(user.password_hash, password)
+            except HashingBusy:
+                return _refuse('login.html', 'The server is busy. Please try again in a moment.', 503, 1)
+        if matches:
+            if new_hash:
+                user.password_hash = new_hash  # hashing parameters changed since it was stored
             login_user(user, remember=bool(remember))
+            merged = guest_cart.merge_into_user(user.id)
+            if merged or new_hash:
+                db.session.commit()
+            if merged:
+                invalidate_cart(user.id)
             flash('Welcome back!', 'success')
             return redirect(request.args.get('next') or url_for('main.index'))
         
@@ -77,6 +183,12 @@ def register():
         password = request.form.get('password', '')
         confirm_password = request.form.get('confirm_password', '')
         
+        try:
+            _limit_ip('register')
+        except RateLimited as e:
+            return _refuse('register.html', 'Too many attempts. Please wait a minute and try again.',
+                           429, e.retry_after)
+        
         if not username or not email or not password:
             flash('All fields are required.', 'error')
         elif password != confirm_password:
@@ -88,9 +200,14 @@ def register():
         elif User.query.filter_by(email=email).first():
             flash('Email already registered.', 'error')
         else:
-            user = User(username=username, email=email)
-            user.set_password(password)
+            try:
+                password_hash = hash_password(password)
+            except HashingBusy:
+                return _refuse('register.html', 'The server is busy. Please try again in a moment.', 503, 1)
+            user = User(username=username, email=email, password_hash=password_hash)
             db.session.add(user)
+            db.session.flush()
+            guest_cart.merge_into_user(user.id)
             db.session.commit()
             login_user(user)
             flash('Registration successful!', 'success')
@@ -109,11 +226,24 @@ def forgot_password():
 @login_required
 def checkout():
     import urllib.parse
-    cart_items = CartItem.query.filter_by(user_id=current_user.id).all()
+    cart_items = get_cart_items(current_user.id)
     if not cart_items:
         flash('Your cart is empty!', 'warning')
         return redirect(url_for('main.cart'))
-    total = sum(item.product.price * item.quantity for item in cart_items)
+    
+    # Hold the stock while the shopper fills in shipping and payment
+    try:
+        reserve_cart(current_user.id, cart_items)
+        db.session.commit()
+    except InsufficientStock as e:
+        db.session.rollback()
+        for failure in e.failures:
+            flash(f"Only {failure['available']} left of {failure['name']}.", 'error')
+        return redirect(url_for('main.cart'))
+    
+    # The commit expired the loaded rows; reload them with their products
+    cart_items = get_cart_items(current_user.id)
+    total = items_total(cart_items)
     razorpay_key = current_app.config.get('RAZORPAY_KEY_ID', '')
     
     # Generate unique QR data for UPI
@@ -123,7 +253,22 @@ def checkout():
     upi_url = f"upi://pay?pa={upi_id}&pn={upi_name}&am={total}&cu=INR&tn={transaction_note}"
     qr_data = urllib.parse.quote(upi_url)
     
-    return render_template('checkout.html', cart_items=cart_items, total=total, razorpay_key=razorpay_key, qr_data=qr_data)
+    # Sent back with the order so a retried or double-clicked submit places it once
+    idempotency_key = secrets.token_urlsafe(16)
+    
+    # The Razorpay order this page pays, created here so the amount and the
+    # order id the payment must belong to never come from the browser
+    try:
+        razorpay_order_id = create_razorpay_order(total, idempotency_key)
+    except Exception:
+        current_app.logger.exception('Could not create a Razorpay order for user %s', current_user.id)
+        flash('Online payment is unavailable right now. Please try again shortly.', 'error')
+        return redirect(url_for('main.cart'))
+    session['razorpay_order'] = {'key': idempotency_key, 'id': razorpay_order_id}
+    
+    return render_template('checkout.html', cart_items=cart_items, total=total, razorpay_key=razorpay_key,
+                           razorpay_order_id=razorpay_order_id, qr_data=qr_data,
+                           idempotency_key=idempotency_key)
 
 
 @main.route('/success')
@@ -137,35 +282,54 @@ def success():
 
 
 @main.route('/search')
+@read_only
 def search():
-    query = request.args.get('q', '')
+    query = request.args.get('q', '').strip()
+    page = request.args.get('page', 1, type=int)
     if query:
-        products = Product.query.filter(
-            db.or_(
-                Product.name.ilike(f'%{query}%'),
-                Product.description.ilike(f'%{query}%'),
-                Product.category.ilike(f'%{query}%')
-            )
-        ).all()
+        products, total = search_products(query, page=page, per_page=SEARCH_PAGE_SIZE)
     else:
-        products = []
+        products, total = [], 0
     return render_template('index.html', 
                          featured_products=products, 
                          all_products=products,
                          categories=[],
-                         search_query=query)
+                         search_query=query,
+                         page=page,
+                         total_results=total,
+                         has_next=page * SEARCH_PAGE_SIZE < total)
+
+
+def _price_facets(category, facets=None):
+    return [{'bucket': bucket, 'label': label, 'products': products,
+             'min_price': bucket_range(bucket)[0], 'max_price': bucket_range(bucket)[1]}
+            for bucket, label, products in price_facets(category, facets)]
 
 
 @main.route('/category/<category_name>')
+@read_only
 def category(category_name):
-    products = Product.query.filter_by(category=category_name).all()
-    categories = db.session.query(Product.category).distinct().all()
-    categories = [c[0] for c in categories]
+    """Filtered, sorted and paged category listing (see browse.py)."""
+    try:
+        filters = parse_filters(request.args)
+        products, next_cursor = browse_products(category_name, limit=SEARCH_PAGE_SIZE,
+                                                cursor=request.args.get('cursor'), **filters)
+    except (InvalidFilter, InvalidCursor) as e:
+        abort(400, description=str(e))
+    next_url = None
+    if next_cursor:
+        args = {k: v for k, v in request.args.items() if k != 'cursor'}
+        next_url = url_for('main.category', category_name=category_name, cursor=next_cursor, **args)
     return render_template('index.html',
                          featured_products=[],
                          all_products=products,
-                         categories=categories,
-                         search_query=category_name)
+                         categories=[],
+                         search_query=category_name,
+                         browse_category=category_name,
+                         filters=filters,
+                         price_facets=_price_facets(category_name),
+                         sort_labels=SORT_LABELS,
+                         next_url=next_url)
 
 
 # ──────────────── AUTH ROUTES ────────────────
@@ -182,11 +346,23 @@ def logout():
 
 # ──────────────── CART API ROUTES ────────────────
 
+def _guest_cart_change(operation, **reply):
+    """Apply one operation to the guest cart and answer like the logged-in routes."""
+    try:
+        lines = guest_cart.apply_operations([operation])
+    except CartBatchError as e:
+        message = e.errors[0]['message']
+        return jsonify({'success': False, 'message': message}), 404 if message.endswith('not found') else 400
+    return jsonify({'success': True, 'total': items_total(lines), 'cart_count': guest_cart.count(lines), **reply})
+
+
 @main.route('/api/cart/add', methods=['POST'])
 def add_to_cart():
-    if not current_user.is_authenticated:
-        return jsonify({'success': False, 'message': 'Please login to add items to cart'}), 401
     data = request.get_json() or request.form
+    if not current_user.is_authenticated:
+        return _guest_cart_change({'op': 'add', 'product_id': data.get('product_id'),
+                                   'quantity': data.get('quantity', 1), 'size': data.get('size')},
+                                  message='Added to cart!')
     product_id_raw = data.get('product_id')
     if not product_id_raw:
         return jsonify({'success': False, 'message': 'Product ID is required'}), 400
@@ -218,18 +394,19 @@ def add_to_cart():
         db.session.add(cart_item)
     
     db.session.commit()
+    invalidate_cart(current_user.id)
     
     # Calculate total quantity for the badge
-    cart_items = CartItem.query.filter_by(user_id=current_user.id).all()
-    cart_count = sum(item.quantity for item in cart_items)
-    return jsonify({'success': True, 'message': 'Added to cart!', 'cart_count': cart_count})
+    summary = get_cart_summary(current_user.id)
+    return jsonify({'success': True, 'message': 'Added to cart!', 'cart_count': summary['count']})
 
 
 @main.route('/api/cart/update', methods=['POST'])
 def update_cart():
-    if not current_user.is_authenticated:
-        return jsonify({'success': False, 'message': 'Unauthorized'}), 401
     data = request.get_json() or request.form
+    if not current_user.is_authenticated:
+        return _guest_cart_change({'op': 'update', 'item_id': data.get('item_id'),
+                                   'quantity': data.get('quantity', 1)})
     item_id = data.get('item_id')
     quantity = int(data.get('quantity', 1))
     
@@ -243,19 +420,17 @@ def update_cart():
         cart_item.quantity = quantity
     
     db.session.commit()
+    invalidate_cart(current_user.id)
     
-    cart_items = CartItem.query.filter_by(user_id=current_user.id).all()
-    total = sum(item.product.price * item.quantity for item in cart_items)
-    cart_count = sum(item.quantity for item in cart_items)
-    
-    return jsonify({'success': True, 'total': total, 'cart_count': cart_count})
+    summary = get_cart_summary(current_user.id)
+    return jsonify({'success': True, 'total': summary['total'], 'cart_count': summary['count']})
 
 
 @main.route('/api/cart/remove', methods=['POST'])
 def remove_from_cart():
-    if not current_user.is_authenticated:
-        return jsonify({'success': False, 'message': 'Unauthorized'}), 401
     data = request.get_json() or request.form
+    if not current_user.is_authenticated:
+        return _guest_cart_change({'op': 'remove', 'item_id': data.get('item_id')})
     item_id = data.get('item_id')
     
     cart_item = CartItem.query.filter_by(id=item_id, user_id=current_user.id).first()
@@ -264,52 +439,135 @@ def remove_from_cart():
     
     db.session.delete(cart_item)
     db.session.commit()
+    invalidate_cart(current_user.id)
     
-    cart_items = CartItem.query.filter_by(user_id=current_user.id).all()
-    total = sum(item.product.price * item.quantity for item in cart_items)
-    cart_count = sum(item.quantity for item in cart_items)
+    summary = get_cart_summary(current_user.id)
+    return jsonify({'success': True, 'total': summary['total'], 'cart_count': summary['count']})
+
+
+@main.route('/api/cart/batch', methods=['POST'])
+def cart_batch():
+    """Apply several cart operations in one transaction.
+
+    Body: ``{"operations": [{"op": "add", "product_id": 1, "quantity": 2, "size": "M"},
+    {"op": "update", "item_id": 5, "quantity": 3}, {"op": "remove", "item_id": 6}]}``.
+    All operations are applied or none are; errors are listed by operation index.
+    Guests get the same API backed by the signed cart cookie.
+    """
+    data = request.get_json(silent=True) or {}
+    try:
+        if current_user.is_authenticated:
+            lines = apply_cart_operations(current_user.id, data.get('operations'))
+        else:
+            lines = guest_cart.apply_operations(data.get('operations'))
+    except CartBatchError as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'message': 'Cart not updated', 'errors': e.errors}), 400
     
-    return jsonify({'success': True, 'total': total, 'cart_count': cart_count})
+    # Flush for the new line ids and build the reply before commit expires the rows
+    db.session.flush()
+    result = {
+        'success': True,
+        'cart_count': sum(line.quantity for line in lines),
+        'total': items_total(lines),
+        'items': [{
+            'id': line.id,
+            'product_id': line.product_id,
+            'size': line.size,
+            'quantity': line.quantity,
+            'line_total': line.product.price * line.quantity,
+        } for line in lines]
+    }
+    if current_user.is_authenticated:
+        db.session.commit()
+        invalidate_cart(current_user.id)
+    return jsonify(result)
 
 
 @main.route('/api/cart/count')
 def cart_count():
     if current_user.is_authenticated:
-        cart_items = CartItem.query.filter_by(user_id=current_user.id).all()
-        count = sum(item.quantity for item in cart_items)
+        count = get_cart_summary(current_user.id)['count']
     else:
-        count = 0
+        count = guest_cart.count()
     return jsonify({'count': count})
 
 
 # ──────────────── ORDER / CHECKOUT ROUTES ────────────────
 
+def _placed_order(order, replayed=False):
+    return jsonify({
+        'success': True,
+        'message': 'Order placed successfully!',
+        'order_id': order.id,
+        'status': order.status,
+        'replayed': replayed
+    })
+
+
 @main.route('/api/checkout', methods=['POST'])
 @login_required
 def process_checkout():
-    cart_items = CartItem.query.filter_by(user_id=current_user.id).all()
+    """Place the order. Razorpay payments are verified afterwards by a ``verify_payment`` job."""
+    data = request.get_json() or request.form
+    key = (request.headers.get('Idempotency-Key') or data.get('idempotency_key') or '')[:64] or None
+    if key:
+        existing = Order.query.filter_by(user_id=current_user.id, idempotency_key=key).first()
+        if existing:
+            return _placed_order(existing, replayed=True)
+    
+    cart_items = get_cart_items(current_user.id)
     if not cart_items:
         return jsonify({'success': False, 'message': 'Cart is empty'}), 400
     
-    data = request.get_json() or request.form
-    
-    total = sum(item.product.price * item.quantity for item in cart_items)
+    total = items_total(cart_items)
     
+    try:
+        commit_cart(current_user.id, cart_items)
+    except InsufficientStock as e:
+        db.session.rollback()
+        return jsonify({
+            'success': False,
+            'message': 'Some items are no longer in stock',
+            'failures': e.failures
+        }), 409
+    
+    payment_id = data.get('payment_id') or ''
+    # Only the Razorpay order /checkout created for this page counts, not one the client names
+    razorpay_order = session.get('razorpay_order') or {}
+    razorpay_order_id = (razorpay_order.get('id') if key and razorpay_order.get('key') == key else None) or ''
+    if payment_id:
+        status = PROCESSING
+    elif total <= 0:
+        # Only an order with nothing to pay is paid without a payment; the
+        # client's payment_method is not trusted
+        status = PAID
+    else:
+        status = 'Pending'
     order = Order(
         user_id=current_user.id,
         total_amount=total,
-        status='Pending',
+        status=status,
         full_name=data.get('full_name', ''),
         address=data.get('address', ''),
         city=data.get('city', ''),
         state=data.get('state', ''),
         zipcode=data.get('zipcode', ''),
         phone=data.get('phone', ''),
-        payment_id=data.get('payment_id', ''),
-        razorpay_order_id=data.get('razorpay_order_id', '')
+        payment_id=payment_id,
+        razorpay_order_id=razorpay_order_id,
+        idempotency_key=key
     )
     db.session.add(order)
-    db.session.flush()
+    try:
+        db.session.flush()
+    except IntegrityError:
+        # A concurrent submit with the same key won; answer with its order
+        db.session.rollback()
+        existing = Order.query.filter_by(user_id=current_user.id, idempotency_key=key).first()
+        if existing is None:
+            raise
+        return _placed_order(existing, replayed=True)
     
     for cart_item in cart_items:
         order_item = OrderItem(
@@ -321,20 +579,19 @@ def process_checkout():
         )
         db.session.add(order_item)
         
-        # Update stock
-        cart_item.product.stock -= cart_item.quantity
-        
         # Remove from cart
         db.session.delete(cart_item)
     
-    order.status = 'Paid' if (data.get('payment_id') or data.get('payment_method') == 'free') else 'Pending'
+    if payment_id:
+        enqueue('verify_payment', key=f'verify_payment:{order.id}', max_attempts=VERIFY_ATTEMPTS,
+                order_id=order.id, payment_id=payment_id, signature=data.get('razorpay_signature'))
+    elif status == PAID:
+        enqueue('order_paid', key=f'order_paid:{order.id}', order_id=order.id)
     db.session.commit()
+    invalidate_cart(current_user.id)
+    session.pop('razorpay_order', None)
     
-    return jsonify({
-        'success': True, 
-        'message': 'Order placed successfully!',
-        'order_id': order.id
-    })
+    return _placed_order(order)
 
 
 # ──────────────── ADMIN ROUTES ────────────────
@@ -346,18 +603,130 @@ def admin_dashboard():
         flash('Access denied. Admin only.', 'error')
         return redirect(url_for('main.index'))
     
-    products = Product.query.order_by(Product.created_at.desc()).all()
-    orders = Order.query.order_by(Order.created_at.desc()).limit(20).all()
-    users = User.query.all()
+    # First page of each table; the rest is fetched from the /admin/api/* endpoints
+    products, products_cursor = product_page()
+    orders, orders_cursor = order_page()
     
-    stats = {
-        'total_products': Product.query.count(),
-        'total_orders': Order.query.count(),
-        'total_users': User.query.count(),
-        'total_revenue': db.session.query(db.func.sum(Order.total_amount)).filter_by(status='Paid').scalar() or 0
-    }
+    return render_template('admin.html', products=products, orders=orders,
+                           products_cursor=products_cursor, orders_cursor=orders_cursor,
+                           stats=get_admin_stats())
+
+
+def _admin_table(page_fn, row_fn, key, **filters):
+    """JSON page of an admin table: ``{key: [...], 'next_cursor': ...}``."""
+    if not current_user.is_admin:
+        return jsonify({'success': False, 'message': 'Access denied'}), 403
+    filters = {name: value for name, value in filters.items() if value}
+    try:
+        rows, next_cursor = page_fn(limit=parse_limit(request.args.get('limit'), ADMIN_PAGE_SIZE),
+                                    cursor=request.args.get('cursor'), **filters)
+    except InvalidCursor as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    return jsonify({key: [row_fn(row) for row in rows], 'next_cursor': next_cursor})
+
+
+@main.route('/admin/api/products')
+@login_required
+def admin_api_products():
+    return _admin_table(product_page, product_row, 'products',
+                        search=request.args.get('q', '').strip(),
+                        category=request.args.get('category'))
+
+
+@main.route('/admin/api/orders')
+@login_required
+def admin_api_orders():
+    return _admin_table(order_page, order_row, 'orders',
+                        search=request.args.get('q', '').strip(),
+                        status=request.args.get('status'))
+
+
+@main.route('/admin/api/users')
+@login_required
+def admin_api_users():
+    return _admin_table(user_page, user_row, 'users',
+                        search=request.args.get('q', '').strip())
+
+
+@main.route('/admin/api/stats')
+@login_required
+def admin_api_stats():
+    if not current_user.is_admin:
+        return jsonify({'success': False, 'message': 'Access denied'}), 403
+    return jsonify(get_admin_stats())
+
+
+def _date_arg(name, default):
+    value = request.args.get(name)
+    return datetime.strptime(value, '%Y-%m-%d').date() if value else default
+
+
+@main.route('/admin/api/sales')
+@login_required
+def admin_api_sales():
+    """Sales time series from the rollups.
+
+    Query params: ``period`` (day|week), ``dimension`` (total|category|product),
+    ``key`` (category name or product id), ``start``/``end`` (YYYY-MM-DD).
+    """
+    if not current_user.is_admin:
+        return jsonify({'success': False, 'message': 'Access denied'}), 403
+    period = request.args.get('period', 'day')
+    dimension = request.args.get('dimension', 'total')
+    if period not in PERIODS or dimension not in DIMENSIONS:
+        return jsonify({'success': False, 'message': 'Unknown period or dimension'}), 400
+    key = request.args.get('key', '')
+    if dimension != 'total' and not key:
+        return jsonify({'success': False, 'message': 'key is required for this dimension'}), 400
+    start, end = default_range(period)
+    try:
+        start, end = _date_arg('start', start), _date_arg('end', end)
+    except ValueError:
+        return jsonify({'success': False, 'message': 'Dates must be YYYY-MM-DD'}), 400
+    return jsonify({
+        'period': period, 'dimension': dimension, 'key': key,
+        'start': start.isoformat(), 'end': end.isoformat(),
+        'series': sales_series(period, dimension, key if dimension != 'total' else '', start, end)
+    })
+
+
+@main.route('/admin/api/sales/top-products')
+@login_required
+def admin_api_top_products():
+    """Top-N products by ``revenue`` or ``units`` between ``start`` and ``end``."""
+    if not current_user.is_admin:
+        return jsonify({'success': False, 'message': 'Access denied'}), 403
+    start, end = default_range('day')
+    try:
+        start, end = _date_arg('start', start), _date_arg('end', end)
+    except ValueError:
+        return jsonify({'success': False, 'message': 'Dates must be YYYY-MM-DD'}), 400
+    by = 'units' if request.args.get('by') == 'units' else 'revenue'
+    return jsonify({
+        'start': start.isoformat(), 'end': end.isoformat(), 'by': by,
+        'products': top_products(start, end, limit=parse_limit(request.args.get('limit'), 10), by=by)
+    })
+
+
+@main.route('/admin/metrics')
+def admin_metrics():
+    """Prometheus metrics. Admins, or scrapers sending ``Authorization: Bearer <METRICS_TOKEN>``."""
+    registry = current_app.extensions.get('shopeasy_metrics')
+    if registry is None:
+        abort(404)
+    token = current_app.config.get('METRICS_TOKEN')
+    authorized = (token and hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}')) \
+        or (current_user.is_authenticated and current_user.is_admin)
+    if not authorized:
+        abort(403)
     
-    return render_template('admin.html', products=products, orders=orders, users=users, stats=stats)
+    user_cache = get_user_cache().stats()
+    body = registry.render(extra=[
+        ('shopeasy_user_cache_hits_total', 'counter', 'User loader cache hits.', user_cache['hits']),
+        ('shopeasy_user_cache_misses_total', 'counter', 'User loader cache misses.', user_cache['misses']),
+        ('shopeasy_user_cache_entries', 'gauge', 'Users held in the loader cache.', user_cache['size']),
+    ])
+    return current_app.response_class(body, mimetype='text/plain; version=0.0.4')
 
 
 @main.route('/admin/product/add', methods=['POST'])
@@ -381,10 +750,7 @@ def add_product():
     if 'image' in request.files:
         file = request.files['image']
         if file and file.filename and allowed_file(file.filename):
-            image_filename = secure_filename(file.filename)
-            upload_path = current_app.config['UPLOAD_FOLDER']
-            os.makedirs(upload_path, exist_ok=True)
-            file.save(os.path.join(upload_path, image_filename))
+            image_filename = save_upload(file)
     
     product = Product(
         name=name,
@@ -400,11 +766,49 @@ def add_product():
     )
     db.session.add(product)
     db.session.commit()
+    catalog_changed()
     
     flash('Product added successfully!', 'success')
     return redirect(url_for('main.admin_dashboard'))
 
 
+@main.route('/admin/products/import', methods=['POST'])
+@login_required
+def import_products_view():
+    """Bulk insert/update from an uploaded CSV or JSONL file (form field ``file``)."""
+    if not current_user.is_admin:
+        return jsonify({'success': False, 'message': 'Access denied'}), 403
+    
+    upload = request.files.get('file')
+    if not upload or not upload.filename:
+        return jsonify({'success': False, 'message': 'No file uploaded'}), 400
+    fmt = request.form.get('format') or detect_format(upload.filename, upload.mimetype)
+    if fmt not in IMPORT_FORMATS:
+        return jsonify({'success': False, 'message': 'Format must be csv or jsonl'}), 400
+    
+    report = import_products(upload.stream, fmt)
+    if report.inserted or report.updated:
+        catalog_changed()
+    return jsonify({'success': report.failed == 0, **report.to_dict()})
+
+
+@main.route('/admin/products/export')
+@login_required
+def export_products_view():
+    if not current_user.is_admin:
+        return jsonify({'success': False, 'message': 'Access denied'}), 403
+    
+    fmt = request.args.get('format', 'csv')
+    if fmt not in IMPORT_FORMATS:
+        return jsonify({'success': False, 'message': 'Format must be csv or jsonl'}), 400
+    mimetype = 'text/csv' if fmt == 'csv' else 'application/x-ndjson'
+    return current_app.response_class(
+        stream_with_context(export_products(fmt)),
+        mimetype=mimetype,
+        headers={'Content-Disposition': f'attachment; filename=products.{fmt}'}
+    )
+
+
 @main.route('/admin/product/edit/<int:product_id>', methods=['POST'])
 @login_required
 def edit_product(product_id):
@@ -427,13 +831,11 @@ def edit_product(product_id):
     if 'image' in request.files:
         file = request.files['image']
         if file and file.filename and allowed_file(file.filename):
-            image_filename = secure_filename(file.filename)
-            upload_path = current_app.config['UPLOAD_FOLDER']
-            os.makedirs(upload_path, exist_ok=True)
-            file.save(os.path.join(upload_path, image_filename))
-            product.image = image_filename
+            product.image = save_upload(file)
     
     db.session.commit()
+    touch_product(product.id)
+    catalog_changed()
     flash('Product updated successfully!', 'success')
     return redirect(url_for('main.admin_dashboard'))
 
@@ -447,6 +849,8 @@ def delete_product(product_id):
     product = Product.query.get_or_404(product_id)
     db.session.delete(product)
     db.session.commit()
+    touch_product(product_id)
+    catalog_changed()
     
     flash('Product deleted successfully!', 'success')
     return redirect(url_for('main.admin_dashboard'))
@@ -455,51 +859,95 @@ def delete_product(product_id):
 # ──────────────── API ROUTES ────────────────
 
 @main.route('/api/products')
+@read_only
 def api_products():
+    """Product listing.
+
+    Query params: ``category``, ``search``, ``fields`` (comma-separated
+    projection, e.g. ``id,name,price,image``) and ``limit``. Plain listings
+    page with the opaque ``cursor`` returned as ``next_cursor``; search
+    results are ranked, so they page with ``page`` instead.
+    """
     category = request.args.get('category')
     search = request.args.get('search')
-    
+    limit = parse_limit(request.args.get('limit', request.args.get('per_page')))
+
+    fields = [f.strip() for f in request.args.get('fields', '').split(',') if f.strip()]
+    unknown = [f for f in fields if f not in Product.API_FIELDS]
+    if unknown:
+        return jsonify({'success': False, 'message': f"Unknown fields: {', '.join(unknown)}"}), 400
+
+    if search:
+        page = request.args.get('page', 1, type=int)
+        products, total = search_products(search, page=page, per_page=limit, category=category)
+        return jsonify({
+            'products': [p.to_dict(fields) for p in products],
+            'total': total,
+            'next_page': page + 1 if page * limit < total else None
+        })
+
     query = Product.query
+    if fields:
+        query = query.options(load_only(*Product.columns_for(fields)))
     if category:
         query = query.filter_by(category=category)
-    if search:
-        query = query.filter(
-            db.or_(
-                Product.name.ilike(f'%{search}%'),
-                Product.description.ilike(f'%{search}%')
-            )
+    try:
+        products, next_cursor = keyset_page(
+            query, Product.created_at, Product.id, limit, request.args.get('cursor')
         )
-    
-    products = query.order_by(Product.created_at.desc()).all()
-    return jsonify([{
-        'id': p.id,
-        'name': p.name,
-        'description': p.description,
-        'price': p.price,
-        'original_price': p.original_price,
-        'image': p.image,
-        'category': p.category,
-        'stock': p.stock,
-        'featured': p.featured,
-        'discount_percent': p.discount_percent,
-        'highlights': p.highlights,
-        'sizes': p.sizes
-    } for p in products])
+    except InvalidCursor as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
 
+    return jsonify({
+        'products': [p.to_dict(fields) for p in products],
+        'next_cursor': next_cursor
+    })
 
-@main.route('/api/product/<int:product_id>')
-def get_product(product_id):
-    product = Product.query.get_or_404(product_id)
+
+@main.route('/api/browse')
+@read_only
+def api_browse():
+    """Faceted listing.
+
+    Query params: ``category``, ``min_price``, ``max_price``, ``in_stock``,
+    ``min_discount``, ``size``, ``sort`` (newest, price_asc, price_desc,
+    discount), ``fields``, ``limit`` and ``cursor``. Facet counts cover the
+    whole catalogue (or category), not the filtered selection.
+    """
+    category = request.args.get('category') or None
+    limit = parse_limit(request.args.get('limit'))
+    fields = [f.strip() for f in request.args.get('fields', '').split(',') if f.strip()]
+    unknown = [f for f in fields if f not in Product.API_FIELDS]
+    if unknown:
+        return jsonify({'success': False, 'message': f"Unknown fields: {', '.join(unknown)}"}), 400
+    try:
+        filters = parse_filters(request.args)
+        products, next_cursor = browse_products(category, limit=limit, cursor=request.args.get('cursor'),
+                                                fields=fields, **filters)
+    except (InvalidFilter, InvalidCursor) as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+
+    facets = get_facets()
     return jsonify({
-        'id': product.id,
-        'name': product.name,
-        'description': product.description,
-        'price': product.price,
-        'original_price': product.original_price,
-        'category': product.category,
-        'stock': product.stock,
-        'featured': product.featured,
-        'image': product.image,
-        'highlights': product.highlights,
-        'sizes': product.sizes
+        'products': [p.to_dict(fields) for p in products],
+        'next_cursor': next_cursor,
+        'facets': {
+            'categories': category_counts(facets),
+            'price': _price_facets(category, facets) if category else [],
+        },
     })
+
+
+@main.route('/api/product/<int:product_id>')
+@read_only
+def get_product(product_id):
+    # Admins load the edit form from here, so they always get current stock
+    fresh = current_user.is_authenticated and current_user.is_admin
+    entry = get_product_entry(product_id, fresh=fresh)
+    if entry is None:
+        abort(404)
+    response = not_modified(entry['etag'], entry['modified'], PRODUCT_API_CACHE_CONTROL)
+    if response is None:
+        response = with_validators(jsonify(api_data(entry)), entry['etag'], entry['modified'],
+                                   PRODUCT_API_CACHE_CONTROL)
+    return response
@@ -191,49 +191,111 @@ async function addToCartWithQty(productId) {
     }
 }
 
-async function updateCartQty(itemId, newQty) {
-    if (newQty < 1) return;
-
-    try {
-        const response = await fetch('/api/cart/update', {
-            method: 'POST',
-            headers: { 'Content-Type': 'application/json' },
-            body: JSON.stringify({ item_id: itemId, quantity: newQty })
-        });
+/**
+ * Cart page: quantity changes and removals are applied to the page at once
+ * and sent together to /api/cart/batch once the shopper pauses.
+ */
+const CART_BATCH_DELAY = 400;
+const pendingCartOps = new Map();   // item id -> latest operation for that line
+let cartBatchTimer = null;
+let cartBatchInFlight = null;
+
+function queueCartOp(itemId, op) {
+    pendingCartOps.set(String(itemId), op);
+    clearTimeout(cartBatchTimer);
+    cartBatchTimer = setTimeout(flushCartOps, CART_BATCH_DELAY);
+}
 
-        if (response.ok) {
-            window.location.reload();
-        } else {
+async function flushCartOps() {
+    clearTimeout(cartBatchTimer);
+    if (cartBatchInFlight) await cartBatchInFlight;
+    if (!pendingCartOps.size) return;
+
+    const operations = Array.from(pendingCartOps.values());
+    pendingCartOps.clear();
+    cartBatchInFlight = fetch('/api/cart/batch', {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ operations }),
+        keepalive: true
+    })
+        .then(async response => {
             const data = await response.json();
-            showToast(data.message || 'Update failed', 'error');
-        }
-    } catch (err) {
-        showToast('Failed to update quantity', 'error');
+            if (!response.ok) {
+                const detail = (data.errors || []).map(e => e.message).join(', ');
+                showToast(detail || data.message || 'Cart update failed', 'error');
+                window.location.reload();
+                return;
+            }
+            renderCartSummary(data);
+        })
+        .catch(() => showToast('Failed to update cart', 'error'))
+        .finally(() => { cartBatchInFlight = null; });
+    return cartBatchInFlight;
+}
+
+function formatRupees(amount) {
+    return '₹' + Number(amount).toFixed(2);
+}
+
+function renderCartSummary(data) {
+    data.items.forEach(item => {
+        const line = document.getElementById(`cartItem-${item.id}`);
+        if (!line) return;
+        line.querySelector('.qty-val').textContent = item.quantity;
+        line.querySelector('.cart-item-price').textContent = formatRupees(item.line_total);
+    });
+    const shipping = data.total >= 999 ? 0 : 99;
+    const set = (id, text) => { const el = document.getElementById(id); if (el) el.textContent = text; };
+    set('cartSubtotal', formatRupees(data.total));
+    set('cartShipping', shipping ? formatRupees(shipping) : 'FREE');
+    set('cartTotal', formatRupees(data.total + shipping));
+
+    const badge = document.getElementById('cartBadge');
+    if (badge) {
+        badge.textContent = data.cart_count;
+        badge.style.display = data.cart_count > 0 ? 'flex' : 'none';
     }
+    if (!data.items.length) window.location.reload();  // show the empty-cart state
 }
 
-async function removeCartItem(itemId) {
-    try {
-        const response = await fetch('/api/cart/remove', {
-            method: 'POST',
-            headers: { 'Content-Type': 'application/json' },
-            body: JSON.stringify({ item_id: itemId })
-        });
+function changeCartQty(itemId, delta) {
+    const line = document.getElementById(`cartItem-${itemId}`);
+    const qtyEl = line && line.querySelector('.qty-val');
+    if (!qtyEl) return;
+    const newQty = parseInt(qtyEl.textContent) + delta;
+    if (newQty < 1) return;
+    qtyEl.textContent = newQty;
+    const price = parseFloat(line.dataset.price);
+    if (!isNaN(price)) line.querySelector('.cart-item-price').textContent = formatRupees(price * newQty);
+    queueCartOp(itemId, { op: 'update', item_id: Number(itemId), quantity: newQty });
+}
 
-        if (response.ok) {
-            const itemElement = document.getElementById(`cartItem-${itemId}`);
-            if (itemElement) {
-                itemElement.classList.add('removing');
-                setTimeout(() => window.location.reload(), 400);
-            } else {
-                window.location.reload();
-            }
-        }
-    } catch (err) {
-        showToast('Failed to remove item', 'error');
+function updateCartQty(itemId, newQty) {
+    newQty = parseInt(newQty);
+    if (newQty < 1) return;
+    const qtyEl = document.querySelector(`#cartItem-${itemId} .qty-val`);
+    if (qtyEl) qtyEl.textContent = newQty;
+    queueCartOp(itemId, { op: 'update', item_id: Number(itemId), quantity: newQty });
+}
+
+function removeCartItem(itemId) {
+    const itemElement = document.getElementById(`cartItem-${itemId}`);
+    if (itemElement) {
+        itemElement.classList.add('removing');
+        setTimeout(() => itemElement.remove(), 400);
     }
+    queueCartOp(itemId, { op: 'remove', item_id: Number(itemId) });
+}
+
+// Send queued changes before leaving the cart page (e.g. to checkout)
+async function goToCheckout() {
+    await flushCartOps();
+    window.location.href = '/checkout';
 }
 
+window.addEventListener('pagehide', () => { if (pendingCartOps.size) flushCartOps(); });
+
 function changeDetailQty(delta) {
     const input = document.getElementById('detailQty');
     if (!input) return;
@@ -420,23 +482,28 @@ async function processPayment() {
 }
 
 function initiateRazorpay(shippingData) {
-    if (RAZORPAY_KEY.includes('XXXXX')) {
+    // Without a Razorpay order from the server the keys are not configured
+    if (!RAZORPAY_ORDER_ID) {
         showToast('Razorpay keys not set. Simulating payment...', 'warning');
         setTimeout(() => {
-            submitOrder(shippingData, 'razorpay', 'pay_sim_12345');
+            // One simulated payment id per checkout page; the server rejects a reused one
+            submitOrder(shippingData, 'razorpay', `pay_sim_${CHECKOUT_KEY}`);
         }, 1500);
         return;
     }
 
-    // This assumes RAZORPAY_KEY and ORDER_TOTAL are set in checkout.html
+    // This assumes RAZORPAY_KEY, RAZORPAY_ORDER_ID and ORDER_TOTAL are set in checkout.html
     const options = {
         "key": RAZORPAY_KEY,
+        "order_id": RAZORPAY_ORDER_ID, // created by the server for this page
         "amount": Math.round(ORDER_TOTAL * 100), // In paise
         "currency": "INR",
         "name": "ShopEasy",
         "description": "Order Purchase",
         "handler": function (response) {
-            submitOrder(shippingData, 'razorpay', response.razorpay_payment_id);
+            submitOrder(shippingData, 'razorpay', response.razorpay_payment_id, {
+                razorpay_signature: response.razorpay_signature
+            });
         },
         "prefill": {
             "name": shippingData.full_name,
@@ -448,21 +515,23 @@ function initiateRazorpay(shippingData) {
     rzp.open();
 }
 
-async function submitOrder(shippingData, paymentMethod, paymentId = null) {
+async function submitOrder(shippingData, paymentMethod, paymentId = null, extra = {}) {
     const payBtn = document.getElementById('payBtn');
     payBtn.disabled = true;
     payBtn.innerHTML = '<i class="fas fa-spinner fa-spin"></i> Processing...';
 
     const orderData = {
         ...shippingData,
+        ...extra,
         payment_method: paymentMethod,
         payment_id: paymentId
     };
 
     try {
+        // The same key on every retry from this page, so the order is only placed once
         const response = await fetch('/api/checkout', {
             method: 'POST',
-            headers: { 'Content-Type': 'application/json' },
+            headers: { 'Content-Type': 'application/json', 'Idempotency-Key': CHECKOUT_KEY },
             body: JSON.stringify(orderData)
         });
         const data = await response.json();
@@ -0,0 +1,216 @@
+"""Full-text product search backed by an SQLite FTS5 index.
+
+The ``product_fts`` virtual table mirrors the searchable columns of
+``Product`` (name, description, highlights, category) keyed by product id.
+It is kept in sync through mapper events so every insert, update or delete
+of a product - whether from the admin routes or a script - updates the
+index in the same transaction.
+
+The table is created by migration 4 (``flask init``); on databases without
+it - PostgreSQL, or SQLite built without FTS5 - search falls back to an
+``ILIKE`` scan.
+"""
+import logging
+import re
+
+from sqlalchemy import bindparam, event, inspect, text
+from sqlalchemy.exc import OperationalError
+
+from models import db, Product
+
+FTS_TABLE = 'product_fts'
+
+# bm25() column weights: name, description, highlights, category
+RANK_WEIGHTS = (10.0, 2.0, 4.0, 5.0)
+
+INDEXED_COLUMNS = ('name', 'description', 'highlights', 'category')
+
+_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+logger = logging.getLogger(__name__)
+
+# Whether each database has the FTS table, keyed by engine URL: reads may
+# go to the replica, which need not have it. Detected on first use.
+_fts_tables = {}
+
+
+def create_index(conn):
+    """Create and fill the FTS table. Returns False if SQLite lacks FTS5."""
+    try:
+        conn.execute(text(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+            "name, description, highlights, category, "
+            "tokenize = 'unicode61 remove_diacritics 2')"
+        ))
+    except OperationalError as e:  # FTS5 not compiled into this SQLite build
+        logger.warning('Search index unavailable, falling back to LIKE scans: %s', e)
+        return False
+    _rebuild(conn)
+    _fts_tables.pop(str(conn.engine.url), None)  # re-detect now that the table exists
+    return True
+
+
+def _detect(connection):
+    key = str(connection.engine.url)
+    enabled = _fts_tables.get(key)
+    if enabled is None:
+        enabled = _fts_tables[key] = connection.dialect.name == 'sqlite' and connection.execute(
+            text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"),
+            {'name': FTS_TABLE}
+        ).first() is not None
+    return enabled
+
+
+def fts_enabled(bind=None):
+    """Whether ``bind`` has the FTS table; by default the engine the session reads from."""
+    if bind is None:
+        bind = db.session.get_bind()
+    enabled = _fts_tables.get(str(bind.url))
+    if enabled is None:
+        with bind.connect() as conn:
+            enabled = _detect(conn)
+    return enabled
+
+
+def rebuild_index():
+    """Re-populate the whole index from the product table."""
+    if not fts_enabled(db.engine):
+        return
+    with db.engine.begin() as conn:
+        _rebuild(conn)
+
+
+def reindex_products(conn, ids):
+    """Refresh the index rows of ``ids`` (for bulk writes that bypass the ORM)."""
+    if not ids or not _detect(conn):
+        return
+    params = {'ids': list(ids)}
+    conn.execute(text(f'DELETE FROM {FTS_TABLE} WHERE rowid IN :ids')
+                 .bindparams(bindparam('ids', expanding=True)), params)
+    conn.execute(text(
+        f"INSERT INTO {FTS_TABLE} (rowid, name, description, highlights, category) "
+        "SELECT id, name, description, coalesce(highlights, ''), category FROM product WHERE id IN :ids"
+    ).bindparams(bindparam('ids', expanding=True)), params)
+
+
+def _rebuild(conn):
+    conn.execute(text(f'DELETE FROM {FTS_TABLE}'))
+    conn.execute(text(
+        f"INSERT INTO {FTS_TABLE} (rowid, name, description, highlights, category) "
+        "SELECT id, name, description, coalesce(highlights, ''), category FROM product"
+    ))
+
+
+def build_match_query(query):
+    """Turn free text into an FTS5 MATCH expression.
+
+    Every word must match (implicit AND) and each one is treated as a
+    prefix, so "blu sne" finds "Blue Sneakers" while the user is typing.
+    Returns None if the text contains nothing searchable.
+    """
+    tokens = _TOKEN_RE.findall(query.lower())
+    if not tokens:
+        return None
+    return ' '.join(f'"{token}"*' for token in tokens)
+
+
+def search_products(query, page=1, per_page=24, category=None):
+    """Return ``(products, total)`` for one page of ranked results."""
+    page = max(page, 1)
+    per_page = max(per_page, 1)
+
+    if not fts_enabled():
+        return _search_like(query, page, per_page, category)
+
+    match = build_match_query(query)
+    if match is None:
+        return [], 0
+
+    where = f'{FTS_TABLE} MATCH :match'
+    params = {'match': match}
+    join = ''
+    if category:
+        join = f'JOIN product ON product.id = {FTS_TABLE}.rowid'
+        where += ' AND product.category = :category'
+        params['category'] = category
+
+    total = db.session.execute(
+        text(f'SELECT count(*) FROM {FTS_TABLE} {join} WHERE {where}'), params
+    ).scalar()
+    if not total:
+        return [], 0
+
+    weights = ', '.join(str(w) for w in RANK_WEIGHTS)
+    rows = db.session.execute(
+        text(
+            f'SELECT {FTS_TABLE}.rowid FROM {FTS_TABLE} {join} WHERE {where} '
+            f'ORDER BY bm25({FTS_TABLE}, {weights}), {FTS_TABLE}.rowid '
+            'LIMIT :limit OFFSET :offset'
+        ),
+        dict(params, limit=per_page, offset=(page - 1) * per_page)
+    ).fetchall()
+    ids = [row[0] for row in rows]
+
+    by_id = {p.id: p for p in Product.query.filter(Product.id.in_(ids)).all()}
+    return [by_id[i] for i in ids if i in by_id], total
+
+
+def _search_like(query, page, per_page, category):
+    pattern = f'%{query}%'
+    q = Product.query.filter(
+        db.or_(
+            Product.name.ilike(pattern),
+            Product.description.ilike(pattern),
+            Product.highlights.ilike(pattern),
+            Product.category.ilike(pattern)
+        )
+    )
+    if category:
+        q = q.filter_by(category=category)
+    total = q.count()
+    products = q.order_by(Product.created_at.desc(), Product.id.desc()) \
+        .limit(per_page).offset((page - 1) * per_page).all()
+    return products, total
+
+
+# ──────────────── INDEX MAINTENANCE ────────────────
+
+def _index_row(connection, product, replace):
+    if not _detect(connection):
+        return
+    if replace:
+        connection.execute(text(f'DELETE FROM {FTS_TABLE} WHERE rowid = :id'), {'id': product.id})
+    connection.execute(
+        text(
+            f'INSERT INTO {FTS_TABLE} (rowid, name, description, highlights, category) '
+            'VALUES (:id, :name, :description, :highlights, :category)'
+        ),
+        {
+            'id': product.id,
+            'name': product.name,
+            'description': product.description,
+            'highlights': product.highlights or '',
+            'category': product.category,
+        }
+    )
+
+
+@event.listens_for(Product, 'after_insert')
+def _product_inserted(mapper, connection, target):
+    _index_row(connection, target, replace=False)
+
+
+@event.listens_for(Product, 'after_update')
+def _product_updated(mapper, connection, target):
+    # Stock and price changes happen on every checkout; skip the reindex
+    # unless one of the searchable columns actually changed.
+    state = inspect(target)
+    if any(state.attrs[col].history.has_changes() for col in INDEXED_COLUMNS):
+        _index_row(connection, target, replace=True)
+
+
+@event.listens_for(Product, 'after_delete')
+def _product_deleted(mapper, connection, target):
+    if not _detect(connection):
+        return
+    connection.execute(text(f'DELETE FROM {FTS_TABLE} WHERE rowid = :id'), {'id': target.id})
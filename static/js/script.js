@@ -0,0 +1,614 @@
+/**
+ * ShopEasy Main JavaScript
+ * Handles cart operations, UI animations, and checkout flow
+ */
+
+document.addEventListener('DOMContentLoaded', () => {
+    // Initialize Navbar Scroll Effect
+    const navbar = document.getElementById('navbar');
+    window.addEventListener('scroll', () => {
+        if (window.scrollY > 50) {
+            navbar.classList.add('navbar-scrolled');
+        } else {
+            navbar.classList.remove('navbar-scrolled');
+        }
+    });
+
+    // Mobile Menu Toggle
+    const mobileMenuBtn = document.getElementById('mobileMenuBtn');
+    const mobileMenu = document.getElementById('mobileMenu');
+    if (mobileMenuBtn && mobileMenu) {
+        mobileMenuBtn.addEventListener('click', () => {
+            mobileMenu.classList.toggle('active');
+            mobileMenuBtn.querySelector('i').classList.toggle('fa-bars');
+            mobileMenuBtn.querySelector('i').classList.toggle('fa-times');
+        });
+
+        // Close menu on click outside
+        document.addEventListener('click', (e) => {
+            if (!mobileMenu.contains(e.target) && !mobileMenuBtn.contains(e.target)) {
+                mobileMenu.classList.remove('active');
+                mobileMenuBtn.querySelector('i').classList.add('fa-bars');
+                mobileMenuBtn.querySelector('i').classList.remove('fa-times');
+            }
+        });
+    }
+
+    // Admin Sidebar Toggle (for mobile)
+    const adminSidebarBtn = document.getElementById('adminSidebarToggle');
+    const adminSidebar = document.querySelector('.admin-sidebar');
+    if (adminSidebarBtn && adminSidebar) {
+        adminSidebarBtn.addEventListener('click', () => {
+            adminSidebar.classList.toggle('active');
+        });
+    }
+
+    // User Dropdown
+    const userDropdownBtn = document.getElementById('userDropdownBtn');
+    const userDropdown = document.getElementById('userDropdown');
+    if (userDropdownBtn && userDropdown) {
+        userDropdownBtn.addEventListener('click', (e) => {
+            e.stopPropagation();
+            userDropdown.classList.toggle('show');
+        });
+        document.addEventListener('click', () => {
+            userDropdown.classList.remove('show');
+        });
+    }
+
+    // Initialize Cart Badge
+    updateCartBadge();
+});
+
+/**
+ * Toast Notifications
+ */
+function showToast(message, type = 'info') {
+    const container = document.getElementById('toastContainer');
+    if (!container) return;
+
+    const toast = document.createElement('div');
+    toast.className = `toast toast-${type}`;
+
+    const icon = {
+        success: 'fa-check-circle',
+        error: 'fa-exclamation-circle',
+        warning: 'fa-exclamation-triangle',
+        info: 'fa-info-circle'
+    }[type] || 'fa-info-circle';
+
+    toast.innerHTML = `
+        <i class="fas ${icon}"></i>
+        <span>${message}</span>
+    `;
+
+    container.appendChild(toast);
+
+    // Trigger animation
+    setTimeout(() => toast.classList.add('show'), 100);
+
+    // Remove after 3 seconds
+    setTimeout(() => {
+        toast.classList.remove('show');
+        setTimeout(() => toast.remove(), 500);
+    }, 3000);
+}
+
+/**
+ * Cart Operations
+ */
+async function updateCartBadge() {
+    try {
+        const response = await fetch('/api/cart/count');
+        const data = await response.json();
+        const badge = document.getElementById('cartBadge');
+        if (badge) {
+            badge.textContent = data.count || 0;
+            badge.style.display = data.count > 0 ? 'flex' : 'none';
+        }
+    } catch (err) {
+        console.error('Failed to update cart badge:', err);
+    }
+}
+
+async function addToCart(productId) {
+    try {
+        const response = await fetch('/api/cart/add', {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ product_id: productId, quantity: 1 })
+        });
+        const data = await response.json();
+
+        if (response.ok) {
+            showToast('Product added to cart!', 'success');
+            // Update badge directly from response
+            const badge = document.getElementById('cartBadge');
+            if (badge && data.cart_count !== undefined) {
+                badge.textContent = data.cart_count;
+                badge.style.display = data.cart_count > 0 ? 'flex' : 'none';
+            }
+        } else {
+            showToast(data.message || 'Failed to add to cart', 'error');
+            if (response.status === 401) {
+                setTimeout(() => window.location.href = '/login', 1500);
+            }
+        }
+    } catch (err) {
+        showToast('Something went wrong', 'error');
+    }
+}
+
+// Product Detail Size Selection
+function selectSize(btn, size) {
+    // Remove active class from all size buttons
+    document.querySelectorAll('.size-btn').forEach(b => b.classList.remove('active'));
+    // Add active class to clicked button
+    btn.classList.add('active');
+    // Set hidden input value
+    const sizeInput = document.getElementById('selectedSize');
+    if (sizeInput) sizeInput.value = size;
+}
+
+// Add to Cart from Product Page with Qty and Size
+async function addToCartWithQty(productId) {
+    const qtyInput = document.getElementById('detailQty');
+    const quantity = qtyInput ? parseInt(qtyInput.value) : 1;
+
+    const sizeInput = document.getElementById('selectedSize');
+    const size = sizeInput ? sizeInput.value : null;
+
+    // Check if size selection is required but missing
+    if (document.querySelector('.size-options') && !size) {
+        showToast('Please select a size first!', 'warning');
+        return;
+    }
+
+    try {
+        const response = await fetch('/api/cart/add', {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ product_id: productId, quantity: quantity, size: size })
+        });
+
+        const data = await response.json();
+        if (response.ok) {
+            showToast(`${quantity} item(s) added to cart!`, 'success');
+            // Update badge directly from response
+            const badge = document.getElementById('cartBadge');
+            if (badge && data.cart_count !== undefined) {
+                badge.textContent = data.cart_count;
+                badge.style.display = data.cart_count > 0 ? 'flex' : 'none';
+            }
+        } else {
+            showToast(data.message || 'Error adding to cart', 'error');
+            if (response.status === 401) {
+                setTimeout(() => window.location.href = '/login', 1500);
+            }
+        }
+    } catch (error) {
+        showToast('Something went wrong', 'error');
+    }
+}
+
+/**
+ * Cart page: quantity changes and removals are applied to the page at once
+ * and sent together to /api/cart/batch once the shopper pauses.
+ */
+const CART_BATCH_DELAY = 400;
+const pendingCartOps = new Map();   // item id -> latest operation for that line
+let cartBatchTimer = null;
+let cartBatchInFlight = null;
+
+function queueCartOp(itemId, op) {
+    pendingCartOps.set(String(itemId), op);
+    clearTimeout(cartBatchTimer);
+    cartBatchTimer = setTimeout(flushCartOps, CART_BATCH_DELAY);
+}
+
+async function flushCartOps() {
+    clearTimeout(cartBatchTimer);
+    if (cartBatchInFlight) await cartBatchInFlight;
+    if (!pendingCartOps.size) return;
+
+    const operations = Array.from(pendingCartOps.values());
+    pendingCartOps.clear();
+    cartBatchInFlight = fetch('/api/cart/batch', {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ operations }),
+        keepalive: true
+    })
+        .then(async response => {
+            const data = await response.json();
+            if (!response.ok) {
+                const detail = (data.errors || []).map(e => e.message).join(', ');
+                showToast(detail || data.message || 'Cart update failed', 'error');
+                window.location.reload();
+                return;
+            }
+            renderCartSummary(data);
+        })
+        .catch(() => showToast('Failed to update cart', 'error'))
+        .finally(() => { cartBatchInFlight = null; });
+    return cartBatchInFlight;
+}
+
+function formatRupees(amount) {
+    return '₹' + Number(amount).toFixed(2);
+}
+
+function renderCartSummary(data) {
+    data.items.forEach(item => {
+        const line = document.getElementById(`cartItem-${item.id}`);
+        if (!line) return;
+        line.querySelector('.qty-val').textContent = item.quantity;
+        line.querySelector('.cart-item-price').textContent = formatRupees(item.line_total);
+    });
+    const shipping = data.total >= 999 ? 0 : 99;
+    const set = (id, text) => { const el = document.getElementById(id); if (el) el.textContent = text; };
+    set('cartSubtotal', formatRupees(data.total));
+    set('cartShipping', shipping ? formatRupees(shipping) : 'FREE');
+    set('cartTotal', formatRupees(data.total + shipping));
+
+    const badge = document.getElementById('cartBadge');
+    if (badge) {
+        badge.textContent = data.cart_count;
+        badge.style.display = data.cart_count > 0 ? 'flex' : 'none';
+    }
+    if (!data.items.length) window.location.reload();  // show the empty-cart state
+}
+
+function changeCartQty(itemId, delta) {
+    const line = document.getElementById(`cartItem-${itemId}`);
+    const qtyEl = line && line.querySelector('.qty-val');
+    if (!qtyEl) return;
+    const newQty = parseInt(qtyEl.textContent) + delta;
+    if (newQty < 1) return;
+    qtyEl.textContent = newQty;
+    const price = parseFloat(line.dataset.price);
+    if (!isNaN(price)) line.querySelector('.cart-item-price').textContent = formatRupees(price * newQty);
+    queueCartOp(itemId, { op: 'update', item_id: Number(itemId), quantity: newQty });
+}
+
+function updateCartQty(itemId, newQty) {
+    newQty = parseInt(newQty);
+    if (newQty < 1) return;
+    const qtyEl = document.querySelector(`#cartItem-${itemId} .qty-val`);
+    if (qtyEl) qtyEl.textContent = newQty;
+    queueCartOp(itemId, { op: 'update', item_id: Number(itemId), quantity: newQty });
+}
+
+function removeCartItem(itemId) {
+    const itemElement = document.getElementById(`cartItem-${itemId}`);
+    if (itemElement) {
+        itemElement.classList.add('removing');
+        setTimeout(() => itemElement.remove(), 400);
+    }
+    queueCartOp(itemId, { op: 'remove', item_id: Number(itemId) });
+}
+
+// Send queued changes before leaving the cart page (e.g. to checkout)
+async function goToCheckout() {
+    await flushCartOps();
+    window.location.href = '/checkout';
+}
+
+window.addEventListener('pagehide', () => { if (pendingCartOps.size) flushCartOps(); });
+
+function changeDetailQty(delta) {
+    const input = document.getElementById('detailQty');
+    if (!input) return;
+    let val = parseInt(input.value) + delta;
+    if (val < 1) val = 1;
+    if (input.max && val > parseInt(input.max)) val = parseInt(input.max);
+    input.value = val;
+}
+
+async function buyNow(productId) {
+    const qtyInput = document.getElementById('detailQty');
+    const quantity = qtyInput ? parseInt(qtyInput.value) : 1;
+
+    const sizeInput = document.getElementById('selectedSize');
+    const size = sizeInput ? sizeInput.value : null;
+
+    // Check size if required
+    if (document.querySelector('.size-options') && !size) {
+        showToast('Please select a size first!', 'warning');
+        return;
+    }
+
+    try {
+        const response = await fetch('/api/cart/add', {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ product_id: productId, quantity: quantity, size: size })
+        });
+
+        if (response.ok) {
+            window.location.href = '/checkout';
+        } else {
+            const data = await response.json();
+            showToast(data.message || 'Error processing request', 'error');
+            if (response.status === 401) {
+                setTimeout(() => window.location.href = '/login', 1500);
+            }
+        }
+    } catch (error) {
+        showToast('Something went wrong', 'error');
+    }
+}
+
+/**
+ * Checkout Flow
+ */
+function goToStep(step) {
+    if (step === 2) {
+        // Validate shipping form
+        const form = document.getElementById('shippingForm');
+        if (form && !form.checkValidity()) {
+            form.reportValidity();
+            const firstInvalid = form.querySelector(':invalid');
+            if (firstInvalid) {
+                firstInvalid.focus();
+                firstInvalid.classList.add('shake');
+                setTimeout(() => firstInvalid.classList.remove('shake'), 500);
+            }
+            return;
+        }
+
+        // Fill review details
+        const details = `
+            <div class="review-details-grid">
+                <div class="review-detail-card">
+                    <i class="fas fa-user-circle"></i>
+                    <div>
+                        <span class="detail-label">Deliver to</span>
+                        <strong>${document.getElementById('fullName').value}</strong>
+                    </div>
+                </div>
+                <div class="review-detail-card">
+                    <i class="fas fa-phone-alt"></i>
+                    <div>
+                        <span class="detail-label">Phone</span>
+                        <strong>${document.getElementById('phone').value}</strong>
+                    </div>
+                </div>
+                <div class="review-detail-card full-width">
+                    <i class="fas fa-map-marker-alt"></i>
+                    <div>
+                        <span class="detail-label">Address</span>
+                        <strong>${document.getElementById('address').value}, ${document.getElementById('city').value}, ${document.getElementById('state').value} - ${document.getElementById('zipcode').value}</strong>
+                    </div>
+                </div>
+            </div>
+        `;
+        const reviewDiv = document.getElementById('reviewShippingDetails');
+        if (reviewDiv) reviewDiv.innerHTML = details;
+    }
+
+    // Update Indicators
+    document.querySelectorAll('.step').forEach((el, idx) => {
+        const s = idx + 1;
+        el.classList.remove('active', 'completed');
+        if (s === step) el.classList.add('active');
+        else if (s < step) el.classList.add('completed');
+    });
+
+    // Show Step with animation
+    const steps = document.querySelectorAll('.checkout-step');
+    steps.forEach(s => {
+        s.style.opacity = '0';
+        s.style.transform = 'translateY(20px)';
+        setTimeout(() => s.classList.add('hidden'), 300);
+    });
+
+    setTimeout(() => {
+        const nextStep = document.getElementById(`step${step}`);
+        if (nextStep) {
+            nextStep.classList.remove('hidden');
+            setTimeout(() => {
+                nextStep.style.opacity = '1';
+                nextStep.style.transform = 'translateY(0)';
+            }, 50);
+            window.scrollTo({ top: 0, behavior: 'smooth' });
+        }
+    }, 350);
+}
+
+
+
+function toggleQrCode(show) {
+    const qrSection = document.getElementById('qrCodeSection');
+    if (qrSection) {
+        if (show) {
+            qrSection.classList.remove('hidden');
+        } else {
+            qrSection.classList.add('hidden');
+        }
+    }
+}
+
+function selectPayment(method) {
+    document.querySelectorAll('.payment-option').forEach(opt => {
+        opt.classList.remove('active');
+        const radio = opt.querySelector('input[type="radio"]');
+        if (radio) {
+            if (radio.value === method) {
+                opt.classList.add('active');
+                radio.checked = true;
+                const check = opt.querySelector('.payment-check');
+                if (check) check.classList.remove('hidden');
+            } else {
+                const check = opt.querySelector('.payment-check');
+                if (check) check.classList.add('hidden');
+            }
+        }
+    });
+
+    // Toggle QR section for UPI
+    const upiSection = document.getElementById('upiQrSection');
+    if (upiSection) {
+        if (method === 'upi') {
+            upiSection.classList.remove('hidden');
+        } else {
+            upiSection.classList.add('hidden');
+        }
+    }
+}
+
+async function processPayment() {
+    const checkedRadio = document.querySelector('input[name="payment"]:checked');
+    if (!checkedRadio) return;
+
+    const paymentMethod = checkedRadio.value;
+
+    // Shipping data
+    const shippingData = {
+        full_name: document.getElementById('fullName').value,
+        phone: document.getElementById('phone').value,
+        address: document.getElementById('address').value,
+        city: document.getElementById('city').value,
+        state: document.getElementById('state').value,
+        zipcode: document.getElementById('zipcode').value,
+    };
+
+    if (paymentMethod === 'cod' || paymentMethod === 'free' || paymentMethod === 'upi') {
+        submitOrder(shippingData, paymentMethod);
+    } else {
+        // Razorpay Integration
+        initiateRazorpay(shippingData);
+    }
+}
+
+function initiateRazorpay(shippingData) {
+    if (RAZORPAY_KEY.includes('XXXXX')) {
+        showToast('Razorpay keys not set. Simulating payment...', 'warning');
+        setTimeout(() => {
+            submitOrder(shippingData, 'razorpay', 'pay_sim_12345');
+        }, 1500);
+        return;
+    }
+
+    // This assumes RAZORPAY_KEY and ORDER_TOTAL are set in checkout.html
+    const options = {
+        "key": RAZORPAY_KEY,
+        "amount": Math.round(ORDER_TOTAL * 100), // In paise
+        "currency": "INR",
+        "name": "ShopEasy",
+        "description": "Order Purchase",
+        "handler": function (response) {
+            submitOrder(shippingData, 'razorpay', response.razorpay_payment_id, {
+                razorpay_order_id: response.razorpay_order_id,
+                razorpay_signature: response.razorpay_signature
+            });
+        },
+        "prefill": {
+            "name": shippingData.full_name,
+            "contact": shippingData.phone
+        },
+        "theme": { "color": "#212121" }
+    };
+    const rzp = new Razorpay(options);
+    rzp.open();
+}
+
+async function submitOrder(shippingData, paymentMethod, paymentId = null, extra = {}) {
+    const payBtn = document.getElementById('payBtn');
+    payBtn.disabled = true;
+    payBtn.innerHTML = '<i class="fas fa-spinner fa-spin"></i> Processing...';
+
+    const orderData = {
+        ...shippingData,
+        ...extra,
+        payment_method: paymentMethod,
+        payment_id: paymentId
+    };
+
+    try {
+        // The same key on every retry from this page, so the order is only placed once
+        const response = await fetch('/api/checkout', {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json', 'Idempotency-Key': CHECKOUT_KEY },
+            body: JSON.stringify(orderData)
+        });
+        const data = await response.json();
+
+        if (response.ok) {
+            window.location.href = `/success?order_id=${data.order_id}`;
+        } else {
+            showToast(data.message || 'Order failed', 'error');
+            payBtn.disabled = false;
+            payBtn.innerHTML = 'COMPLETE PURCHASE';
+        }
+    } catch (err) {
+        showToast('Connection error', 'error');
+        payBtn.disabled = false;
+        payBtn.innerHTML = 'COMPLETE PURCHASE';
+    }
+}
+
+/**
+ * Admin Functions
+ */
+function switchAdminTab(tabName) {
+    // Update tabs
+    document.querySelectorAll('.admin-tab').forEach(tab => {
+        tab.classList.remove('active');
+        if (tab.getAttribute('onclick').includes(tabName)) tab.classList.add('active');
+    });
+
+    // Update content
+    document.querySelectorAll('.admin-content').forEach(content => {
+        content.classList.add('hidden');
+    });
+    document.getElementById(`${tabName}Tab`).classList.remove('hidden');
+}
+
+function openEditProduct(productId) {
+    const modal = document.getElementById('editModal');
+    if (!modal) return;
+
+    fetch(`/api/product/${productId}`)
+        .then(res => res.json())
+        .then(data => {
+            // Populate form fields
+            const form = document.getElementById('editForm');
+            form.action = `/admin/product/edit/${data.id}`;
+
+            document.getElementById('editName').value = data.name;
+            document.getElementById('editCategory').value = data.category;
+            document.getElementById('editDesc').value = data.description;
+            document.getElementById('editPrice').value = data.price;
+            document.getElementById('editOrigPrice').value = data.original_price || '';
+            document.getElementById('editStock').value = data.stock;
+            document.getElementById('editFeatured').checked = data.featured;
+            document.getElementById('editHighlights').value = data.highlights || '';
+            document.getElementById('editSizes').value = data.sizes || '';
+
+            modal.classList.add('active');
+        })
+        .catch(err => showToast('Failed to fetch product details', 'error'));
+}
+
+function closeEditModal() {
+    const modal = document.getElementById('editModal');
+    if (modal) modal.classList.remove('active');
+}
+
+/**
+ * Password Visibility Toggle
+ */
+function togglePassword(button) {
+    const group = button.closest('.password-group');
+    const input = group.querySelector('input');
+    const icon = button.querySelector('i');
+
+    if (input.type === 'password') {
+        input.type = 'text';
+        icon.classList.replace('fa-eye', 'fa-eye-slash');
+    } else {
+        input.type = 'password';
+        icon.classList.replace('fa-eye-slash', 'fa-eye');
+    }
+}
@@ -0,0 +1,143 @@
+"""Per-worker cache of the logged-in user.
+
+Flask-Login calls the user loader on every authenticated request, including
+each cart AJAX call and ``/api/cart/count``. Instead of loading the full
+``User`` row each time, the loader returns a ``UserPrincipal`` (id,
+username, is_admin) held in a small in-process LRU with a short TTL.
+
+Entries are keyed by the shared ``users`` version stamp, which is bumped
+when a commit changes a user's admin flag or deletes a user, so every
+worker drops its principals at once. Other updates (a new username) evict
+the entry in the worker that made them; the rest pick the change up when
+their entry expires. Views that need more than the principal (email,
+password hash, relationships) must load the ``User`` explicitly.
+"""
+import threading
+
+from flask import current_app, has_app_context
+from flask_login import UserMixin
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session, object_session
+
+from cache import MemoryCache, bump_version, get_version
+from models import db, User
+
+
+class UserPrincipal(UserMixin):
+    """The subset of ``User`` that templates and views read from ``current_user``."""
+    __slots__ = ('id', 'username', 'is_admin')
+
+    def __init__(self, id, username, is_admin):
+        self.id = id
+        self.username = username
+        self.is_admin = bool(is_admin)
+
+    def __repr__(self):
+        return f'<UserPrincipal {self.username}>'
+
+
+class UserCache:
+    """LRU/TTL cache of principals with hit/miss counters."""
+
+    def __init__(self, ttl=60, max_entries=1024):
+        self._cache = MemoryCache(default_timeout=ttl, max_entries=max_entries)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, user_id):
+        key = (user_id, get_version('users'))
+        principal = self._cache.get(key)
+        with self._lock:
+            if principal is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        if principal is None:
+            principal = _load_principal(user_id)
+            if principal is not None:
+                self._cache.set(key, principal)
+        return principal
+
+    def invalidate(self, user_id):
+        self._cache.delete((user_id, get_version('users')))
+
+    def clear(self):
+        self._cache.clear()
+
+    def stats(self):
+        with self._lock:
+            hits, misses = self.hits, self.misses
+        total = hits + misses
+        return {
+            'hits': hits,
+            'misses': misses,
+            'size': len(self._cache),
+            'hit_ratio': round(hits / total, 4) if total else 0.0,
+        }
+
+
+def _load_principal(user_id):
+    row = db.session.query(User.id, User.username, User.is_admin).filter_by(id=user_id).first()
+    return UserPrincipal(*row) if row else None
+
+
+def get_user_cache():
+    return current_app.extensions['shopeasy_user_cache']
+
+
+def init_user_cache(app, login_manager):
+    cache = UserCache(
+        ttl=app.config.get('USER_CACHE_TTL', 60),
+        max_entries=app.config.get('USER_CACHE_SIZE', 1024),
+    )
+    app.extensions['shopeasy_user_cache'] = cache
+
+    @login_manager.user_loader
+    def load_user(user_id):
+        try:
+            return cache.get(int(user_id))
+        except ValueError:
+            return None
+
+    return cache
+
+
+# ──────────────── INVALIDATION ────────────────
+
+def _evict(target):
+    if has_app_context():
+        cache = current_app.extensions.get('shopeasy_user_cache')
+        if cache is not None:
+            cache.invalidate(target.id)
+
+
+def _bump_on_commit(target):
+    # Bumped after the commit, so no worker can re-cache the old row under the new version
+    session = object_session(target)
+    if session is not None:
+        session.info['bump_users'] = True
+
+
+@event.listens_for(User, 'after_update')
+def _user_updated(mapper, connection, target):
+    _evict(target)
+    if inspect(target).attrs.is_admin.history.has_changes():
+        _bump_on_commit(target)
+
+
+@event.listens_for(User, 'after_delete')
+def _user_deleted(mapper, connection, target):
+    _evict(target)
+    _bump_on_commit(target)
+
+
+@event.listens_for(Session, 'after_commit')
+def _users_committed(session):
+    if session.info.pop('bump_users', False) and has_app_context():
+        bump_version('users')
+
+
+@event.listens_for(Session, 'after_rollback')
+def _users_rolled_back(session):
+    session.info.pop('bump_users', None)